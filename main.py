@@ -1,16 +1,272 @@
 import yaml
+import numpy as np
 import shlex
 import os
 import itertools
 import copy
+import collections
 from pathlib import Path
 import configparser
 import subprocess
 import datetime
+import re
+import sys
+import abc
+import argparse
+import concurrent.futures
+import dataclasses
+import hashlib
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+
+_step_context = threading.local()
+
+
+def current_step():
+    """Returns the Step being executed by the calling thread, or None outside the scheduler."""
+    return getattr(_step_context, "step", None)
+
+
+def _note_child_exit_code(returncode: int) -> None:
+    """Records the exit code of a step's child process on the current Step."""
+    step = current_step()
+    if step is not None:
+        step.exit_code = returncode
+
+
+def _note_step_outputs(run_dir: Path, outputs: list) -> None:
+    """Records the (absolute) output paths of the current Step."""
+    step = current_step()
+    if step is not None:
+        step.outputs = [str((Path(run_dir) / o).resolve()) for o in outputs]
+
+
+# OSKAR logs progress as "Block 3/10 ( 30%) complete. Simulation time elapsed: ..."
+# (oskar_sim_interferometer) and "Chunk 2/4, time 3/10 complete. ..."
+# (oskar_sim_beam_pattern). Only these lines are parsed, and only for OSKAR
+# steps (see run_streaming_command(parse_progress=...)).
+_PROGRESS_RE = re.compile(
+    r"\b(?:Block|Chunk)\s+(\d+)\s*/\s*(\d+)"
+    r"(?:,\s*time\s+(\d+)\s*/\s*(\d+))?"
+    r"(?:\s*\(\s*(\d+(?:\.\d+)?)\s*%\s*\))?"
+    r"\s*complete\b",
+    re.IGNORECASE,
+)
+
+
+def parse_progress_line(line: str) -> Optional[float]:
+    """
+    Extracts a progress fraction (0..1) from an OSKAR progress line, or None if
+    the line is not one.
+    """
+    match = _PROGRESS_RE.search(line)
+    if not match:
+        return None
+    if match.group(5) is not None:
+        return min(1.0, float(match.group(5)) / 100.0)
+    done, total = int(match.group(1)), int(match.group(2))
+    if total <= 0:
+        return None
+    if match.group(3) is not None and int(match.group(4)) > 0:
+        # Beam pattern: chunks are the outer loop, times the inner one
+        times_done, times_total = int(match.group(3)), int(match.group(4))
+        return min(1.0, ((done - 1) * times_total + times_done) / (total * times_total))
+    return min(1.0, done / total)
+
+
+def _note_step_output_line(step, line: str, parse_progress: bool = True) -> None:
+    """Updates a Step's last-activity time and, optionally, its parsed progress from an output line."""
+    if step is None:
+        return
+    now = datetime.datetime.now()
+    step.last_output_time = now
+    fraction = parse_progress_line(line) if parse_progress else None
+    if fraction is not None:
+        step.progress = fraction
+        step.progress_time = now
+
+
+OUTPUT_TAIL_LINES = 40
+
+
+METRICS_FILENAME = "metrics.jsonl"
+_metrics_lock = threading.Lock()
+
+
+def _wait_with_rusage(process: subprocess.Popen):
+    """
+    Reaps a child process and returns (returncode, rusage). rusage is the
+    child's own resource usage from os.wait4(), or None where wait4 is not
+    available (the process is then reaped with Popen.wait()).
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    while True:
+        try:
+            _, status, rusage = os.wait4(process.pid, 0)
+            break
+        except InterruptedError:
+            continue
+        except ChildProcessError:
+            # Already reaped elsewhere; no usage information left
+            return process.wait(), None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, rusage
+
+
+def record_child_metrics(
+    cwd_path: Path,
+    command: list,
+    start_time: datetime.datetime,
+    end_time: datetime.datetime,
+    returncode: int,
+    rusage,
+) -> dict:
+    """
+    Appends a resource-usage record for one child process to the run's
+    metrics.jsonl (next to run.log) and attaches it to the current Step.
+
+    The record holds wall-clock time, user/sys CPU seconds, peak RSS, block
+    I/O operations (and the equivalent bytes, at 512 bytes per block on Linux)
+    and voluntary/involuntary context switches.
+
+    Returns:
+        The metrics record.
+    """
+    step = current_step()
+    record = {
+        "step_id": step.step_id if step is not None else None,
+        "step": step.name if step is not None else None,
+        "command": [str(c) for c in command],
+        "start_time": start_time.isoformat(timespec="seconds"),
+        "end_time": end_time.isoformat(timespec="seconds"),
+        "exit_code": returncode,
+        "wall_sec": round((end_time - start_time).total_seconds(), 3),
+    }
+    if step is not None and step.cost_features:
+        record["cost_features"] = step.cost_features
+    if rusage is not None:
+        # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+        maxrss_bytes = rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        record.update(
+            {
+                "user_cpu_sec": round(rusage.ru_utime, 3),
+                "sys_cpu_sec": round(rusage.ru_stime, 3),
+                "max_rss_bytes": maxrss_bytes,
+                "block_input_ops": rusage.ru_inblock,
+                "block_output_ops": rusage.ru_oublock,
+                "block_input_bytes": rusage.ru_inblock * 512,
+                "block_output_bytes": rusage.ru_oublock * 512,
+                "voluntary_ctx_switches": rusage.ru_nvcsw,
+                "involuntary_ctx_switches": rusage.ru_nivcsw,
+            }
+        )
+
+    with _metrics_lock:
+        with open(Path(cwd_path) / METRICS_FILENAME, "a") as metrics_f:
+            metrics_f.write(json.dumps(record) + "\n")
+    if step is not None:
+        step.resources.append(record)
+    return record
+
+
+def run_streaming_command(
+    command: list,
+    cwd_path: Path,
+    log_f,
+    echo_output: bool = False,
+    tail_lines: int = OUTPUT_TAIL_LINES,
+    parse_progress: bool = False,
+):
+    """
+    Runs a command and tees its output line by line into an open log file.
+
+    Unlike subprocess.run(capture_output=True), the child's output is never
+    held in memory as a whole: each line is written (and flushed) to the log as
+    soon as it is produced, optionally echoed to the console, and only the last
+    tail_lines lines are kept for error reporting. stderr lines are prefixed
+    with "[stderr]" in the log. When called from a scheduled step, every line
+    also updates that step's last-activity time and, with parse_progress (OSKAR
+    children only), its progress (see parse_progress_line()). The child is reaped with its full resource usage,
+    which is appended to metrics.jsonl in cwd_path (see record_child_metrics()).
+
+    Args:
+        command: Command and arguments to execute.
+        cwd_path: Working directory for the child process.
+        log_f: Open (text, append) log file object.
+        echo_output: If True, also print each line to the console.
+        tail_lines: Number of trailing output lines to keep.
+        parse_progress: If True, parse OSKAR progress lines into the step's progress.
+
+    Returns:
+        A tuple (returncode, tail) where tail is a list of the last output lines.
+
+    Raises:
+        FileNotFoundError: If the executable does not exist.
+    """
+    start_time = datetime.datetime.now()
+    process = subprocess.Popen(
+        command,
+        cwd=str(cwd_path),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+        bufsize=1,
+    )
+    tail = collections.deque(maxlen=tail_lines)
+    write_lock = threading.Lock()
+    step = current_step()
+    console_prefix = f"[{step.step_id}] " if step is not None else ""
+
+    def _pump(stream, label):
+        with stream:
+            for line in stream:
+                text = line.rstrip("\n")
+                _note_step_output_line(step, text, parse_progress)
+                if label:
+                    text = f"[{label}] {text}"
+                with write_lock:
+                    log_f.write(text + "\n")
+                    log_f.flush()
+                    tail.append(text)
+                    if echo_output:
+                        print(f"      {console_prefix}{text}")
+
+    try:
+        stderr_thread = threading.Thread(
+            target=_pump, args=(process.stderr, "stderr"), daemon=True
+        )
+        stderr_thread.start()
+        _pump(process.stdout, None)
+        stderr_thread.join()
+    except BaseException:
+        # Never leave the child running if logging fails or we are interrupted
+        process.kill()
+        process.wait()
+        raise
+    returncode, rusage = _wait_with_rusage(process)
+    try:
+        record_child_metrics(
+            cwd_path, command, start_time, datetime.datetime.now(), returncode, rusage
+        )
+    except OSError as e:
+        print(f"    WARNING: Could not record resource usage: {e}")
+    return returncode, list(tail)
 
 
 def run_oskar_sim_interf(
-    executable_path: str, ini_file_path: Path, cwd_path: Path, is_dry_run: bool
+    executable_path: str,
+    ini_file_path: Path,
+    cwd_path: Path,
+    is_dry_run: bool,
+    echo_output: bool = False,
 ) -> bool:
     """
     Runs the OSKAR interferometer simulation using subprocess and logs its output.
@@ -20,6 +276,7 @@ def run_oskar_sim_interf(
         ini_file_path: Path object for the INI file.
         cwd_path: Path object for the directory from which to run the command AND store run.log.
         is_dry_run: If True, prints the command instead of running it and logs appropriately.
+        echo_output: If True, also echo the child's output to the console as it is produced.
 
     Returns:
         True if the simulation was successful (or if dry_run is True and INI exists), False otherwise.
@@ -77,46 +334,34 @@ def run_oskar_sim_interf(
 
             print(f"    Executing OSKAR Interferometer simulation...")
             # Actual command uses paths as defined; CWD handles relativity for OSKAR
-            process = subprocess.run(
-                command,  # command uses ini_file_path as passed (could be relative to cwd_path)
-                cwd=str(cwd_path),
-                check=False,  # We'll check returncode manually to log output regardless
-                capture_output=True,
-                text=True,
+            log_f.write("--- Output (stderr lines prefixed with [stderr]) ---\n")
+            returncode, output_tail = run_streaming_command(
+                command, cwd_path, log_f, echo_output=echo_output, parse_progress=True
             )
 
-            log_f.write(f"Exit Code: {process.returncode}\n\n")
+            _note_child_exit_code(returncode)
+            log_f.write(f"\nExit Code: {returncode}\n")
 
-            log_f.write("--- Stdout ---\n")
-            log_f.write(process.stdout if process.stdout.strip() else "<No stdout>\n")
-            log_f.write("\n--- Stderr ---\n")
-            log_f.write(process.stderr if process.stderr.strip() else "<No stderr>\n")
-
-            if process.returncode == 0:
+            if returncode == 0:
                 success_msg = (
                     "    OSKAR Interferometer simulation finished successfully."
                 )
                 print(success_msg)
                 log_f.write("\n--- Simulation Successful ---\n")
-                # Optionally print summary of stdout/stderr to console for success
-                if process.stdout.strip():
-                    print(f"      (stdout logged to {log_file_path})")
-                if process.stderr.strip():
-                    print(f"      (stderr logged to {log_file_path})")
+                # The full output is in the log; only point to it on success
+                print(f"      (output logged to {log_file_path})")
                 return True
             else:
-                error_msg_console = f"    ERROR: OSKAR Interferometer simulation failed with exit code {process.returncode}."
+                error_msg_console = f"    ERROR: OSKAR Interferometer simulation failed with exit code {returncode}."
                 print(error_msg_console)
                 log_f.write(
-                    f"\n!!! ERROR: Simulation Failed (Exit Code: {process.returncode}) !!!\n"
+                    f"\n!!! ERROR: Simulation Failed (Exit Code: {returncode}) !!!\n"
                 )
-                # Print full stdout/stderr to console on error for immediate visibility
-                if process.stdout.strip():
-                    print("    Stdout from error:")
-                    print(process.stdout)
-                if process.stderr.strip():
-                    print("    Stderr from error:")
-                    print(process.stderr)
+                # Print the tail of the output to console on error for immediate visibility
+                if output_tail:
+                    print(f"    Last {len(output_tail)} line(s) of output:")
+                    for line in output_tail:
+                        print(f"      {line}")
                 return False
 
     except FileNotFoundError:
@@ -132,7 +377,7 @@ def run_oskar_sim_interf(
             pass  # If logging fails here, we've already printed to console
         return False
     except Exception as e:  # pylint: disable=broad-except
-        # Catch any other unexpected errors during subprocess.run or logging
+        # Catch any other unexpected errors while running the command or logging
         error_msg = f"    ERROR: An unexpected error occurred: {e}"
         print(error_msg)
         try:
@@ -159,8 +404,215 @@ def run_oskar_sim_interf(
             pass
 
 
+# Paths in the interferometer settings, relative to the run directory in the INI
+_OSKAR_PATH_SETTINGS = (
+    "telescope/input_directory",
+    "sky/oskar_sky_model/file",
+    "interferometer/ms_filename",
+    "interferometer/oskar_vis_filename",
+)
+# Settings applied per run to a reused oskar.Telescope instead of being part of its identity
+_OSKAR_RUN_SETTINGS = ("interferometer/ms_filename", "interferometer/oskar_vis_filename")
+# key -> idle oskar.Telescope instances (least recently used key first). A
+# telescope is checked out by one run at a time, so concurrent runs of the
+# same model each use their own instance.
+_OSKAR_TELESCOPES = collections.OrderedDict()
+_OSKAR_TELESCOPES_LOCK = threading.Lock()
+
+
+def oskar_python_version() -> Optional[str]:
+    """Returns "oskar-python <version>" if the oskar Python package can be imported, else None (memoised)."""
+    memo_key = ("oskar_python_version",)
+    with _HASH_MEMO_LOCK:
+        if memo_key in _HASH_MEMO:
+            return _HASH_MEMO[memo_key]
+    try:
+        import oskar
+
+        version = f"oskar-python {getattr(oskar, '__version__', 'unknown')}"
+    except ImportError:
+        version = None
+    with _HASH_MEMO_LOCK:
+        _HASH_MEMO[memo_key] = version
+    return version
+
+
+def _checkout_oskar_telescope(settings, flat_settings: dict, tel_dir: Path):
+    """
+    Returns (key, telescope) for the telescope model and settings of a run:
+    an idle oskar.Telescope built earlier for the same key, or a new one.
+    Telescopes are keyed by the model directory, its file signature and every
+    telescope-related setting except the phase centre, which the caller sets
+    on its (exclusively held) instance. New instances are built without
+    holding the cache lock, so loading one large model does not block other
+    runs. Hand the telescope back with _return_oskar_telescope().
+    """
+    key = json.dumps(
+        [
+            str(tel_dir),
+            path_stat_signature(tel_dir),
+            {
+                k: v
+                for k, v in flat_settings.items()
+                if k.startswith(("telescope/", "interferometer/", "simulator/double_precision"))
+                and k not in _OSKAR_RUN_SETTINGS
+            },
+        ],
+        sort_keys=True,
+    )
+    with _OSKAR_TELESCOPES_LOCK:
+        idle = _OSKAR_TELESCOPES.get(key)
+        if idle:
+            return key, idle.pop()
+    return key, settings.to_telescope()
+
+
+def _return_oskar_telescope(key: str, telescope, max_idle: int) -> None:
+    """
+    Puts a telescope from _checkout_oskar_telescope() back for reuse, then
+    evicts the least recently used idle telescopes beyond max_idle.
+    """
+    with _OSKAR_TELESCOPES_LOCK:
+        _OSKAR_TELESCOPES.setdefault(key, []).append(telescope)
+        _OSKAR_TELESCOPES.move_to_end(key)
+        while sum(len(idle) for idle in _OSKAR_TELESCOPES.values()) > max(0, max_idle):
+            oldest_key = next(iter(_OSKAR_TELESCOPES))
+            _OSKAR_TELESCOPES[oldest_key].pop(0)
+            if not _OSKAR_TELESCOPES[oldest_key]:
+                del _OSKAR_TELESCOPES[oldest_key]
+
+
+def run_oskar_interf_in_process(
+    interf_ini_data: dict,
+    work_dir: Path,
+    is_dry_run: bool,
+    fallback: Callable[[], bool],
+    prefix: str = "",
+    consumers: Optional[list] = None,
+    write_ms: bool = True,
+    max_idle_telescopes: int = 2,
+) -> bool:
+    """
+    Runs an interferometer simulation in this process through the oskar
+    Python bindings: the settings from generate_interf_ini_data() go straight
+    into an oskar.SettingsTree (no INI file round trip) and the oskar.Telescope
+    of each telescope model and settings combination is reused by later runs
+    (only the phase centre is changed), so large models are not re-parsed for
+    every sky model, phase centre, sub-band, time chunk and sky partition.
+    Concurrent runs of the same model each get their own instance (one per
+    worker), and at most max_idle_telescopes idle instances are kept.
+
+    If consumers are given, the simulator's process_block() hands every
+    finished block to them (as a VisibilityBlock) before it is dropped; with
+    write_ms=False the blocks are not written anywhere else.
+
+    Args:
+        interf_ini_data: Settings from generate_interf_ini_data(); paths in it are
+                         relative to work_dir.
+        work_dir: The run (or chunk) directory.
+        is_dry_run: If True, only print what would be run.
+        fallback: Called instead (e.g. the oskar_sim_interferometer subprocess
+                  runner) if the oskar package is not installed.
+        prefix: Log prefix.
+        consumers: VisibilityConsumer instances fed block by block.
+        write_ms: If False, neither the MS nor the OSKAR vis file is written.
+        max_idle_telescopes: Number of idle oskar.Telescope instances kept for
+                             reuse (least recently used ones are dropped).
+
+    Returns:
+        True on success.
+    """
+    try:
+        import oskar
+    except ImportError:
+        print(
+            f"    {prefix} Warning: The oskar Python package is not installed; "
+            "running oskar_sim_interferometer instead"
+        )
+        return fallback()
+
+    flat_settings = _flatten_settings_for_configparser(interf_ini_data)
+    for key in _OSKAR_PATH_SETTINGS:
+        if key in flat_settings:
+            flat_settings[key] = str((Path(work_dir) / flat_settings[key]).resolve())
+    if not write_ms:
+        for key in _OSKAR_RUN_SETTINGS:
+            flat_settings[key] = ""
+    ms_path = flat_settings.get("interferometer/ms_filename") or "no MS"
+    if is_dry_run:
+        print(f"    {prefix} [DRY RUN] Would run the oskar Python interferometer in-process: {ms_path}")
+        return True
+
+    start_time = time.monotonic()
+    try:
+        settings = oskar.SettingsTree("oskar_sim_interferometer")
+        settings.from_dict(flat_settings)
+        tel_dir = Path(flat_settings["telescope/input_directory"])
+        times, _ = observation_time_grid(
+            flat_settings["observation/start_time_utc"],
+            flat_settings["observation/length"],
+            flat_settings["observation/num_time_steps"],
+        )
+        frequencies = float(flat_settings["observation/start_frequency_hz"]) + float(
+            flat_settings["observation/frequency_inc_hz"]
+        ) * np.arange(int(flat_settings["observation/num_channels"]))
+
+        class StreamingInterferometer(oskar.Interferometer):
+            def process_block(self, block, block_index):
+                if write_ms:
+                    self.write_block(block, block_index)
+                if consumers:
+                    _feed_oskar_vis_block(block, times, frequencies, consumers)
+
+        tel_key, telescope = _checkout_oskar_telescope(settings, flat_settings, tel_dir)
+        try:
+            telescope.set_phase_centre(
+                np.radians(float(flat_settings["observation/phase_centre_ra_deg"])),
+                np.radians(float(flat_settings["observation/phase_centre_dec_deg"])),
+            )
+            sim = StreamingInterferometer(settings=settings)
+            sim.set_telescope_model(telescope)
+            sim.run()
+        finally:
+            _return_oskar_telescope(tel_key, telescope, max_idle_telescopes)
+    except (RuntimeError, ValueError, KeyError, OSError) as e:
+        print(f"    {prefix} ERROR: In-process OSKAR simulation failed: {e}")
+        return False
+    print(f"    {prefix} In-process OSKAR simulation finished in {time.monotonic() - start_time:.1f} s: {ms_path}")
+    return True
+
+
+def _feed_oskar_vis_block(block, times: np.ndarray, frequencies: np.ndarray, consumers: list) -> None:
+    """Converts an oskar.VisBlock to a VisibilityBlock and passes it to consumers."""
+    t0, c0 = block.start_time_index, block.start_channel_index
+    n_times, n_channels = block.num_times, block.num_channels
+    # OSKAR orders cross-correlations [time, channel, baseline, polarisation]
+    vis = np.transpose(block.cross_correlations(), (0, 2, 1, 3))
+    if vis.shape[-1] == 1:  # scalar simulation: Stokes I only
+        vis = np.concatenate([vis, np.zeros_like(vis), np.zeros_like(vis), vis], axis=-1)
+    antenna1, antenna2 = np.triu_indices(block.num_stations, 1)
+    uvw = np.stack(
+        [block.baseline_uu_metres(), block.baseline_vv_metres(), block.baseline_ww_metres()], axis=-1
+    )
+    visibility_block = VisibilityBlock(
+        t0,
+        times[t0:t0 + n_times],
+        frequencies[c0:c0 + n_channels],
+        antenna1,
+        antenna2,
+        uvw[:n_times],
+        vis[:n_times],
+    )
+    for consumer in consumers:
+        consumer.consume(visibility_block)
+
+
 def run_oskar_sim_beam(
-    executable_path: str, ini_file_path: Path, cwd_path: Path, is_dry_run: bool
+    executable_path: str,
+    ini_file_path: Path,
+    cwd_path: Path,
+    is_dry_run: bool,
+    echo_output: bool = False,
 ) -> bool:
     """
     Runs the OSKAR beam pattern simulation using subprocess and logs its output.
@@ -170,6 +622,7 @@ def run_oskar_sim_beam(
         ini_file_path: Path object for the INI file.
         cwd_path: Path object for the directory from which to run the command AND store run.log.
         is_dry_run: If True, prints the command instead of running it and logs appropriately.
+        echo_output: If True, also echo the child's output to the console as it is produced.
 
     Returns:
         True if the simulation was successful (or if dry_run is True and INI exists), False otherwise.
@@ -218,42 +671,31 @@ def run_oskar_sim_beam(
                 return True
 
             print(f"    Executing OSKAR Beam Pattern simulation...")
-            process = subprocess.run(
-                command,
-                cwd=str(cwd_path),
-                check=False,  # Check returncode manually to log output regardless
-                capture_output=True,
-                text=True,
+            log_f.write("--- Output (stderr lines prefixed with [stderr]) ---\n")
+            returncode, output_tail = run_streaming_command(
+                command, cwd_path, log_f, echo_output=echo_output, parse_progress=True
             )
 
-            log_f.write(f"Exit Code: {process.returncode}\n\n")
-
-            log_f.write("--- Stdout ---\n")
-            log_f.write(process.stdout if process.stdout.strip() else "<No stdout>\n")
-            log_f.write("\n--- Stderr ---\n")
-            log_f.write(process.stderr if process.stderr.strip() else "<No stderr>\n")
+            _note_child_exit_code(returncode)
+            log_f.write(f"\nExit Code: {returncode}\n")
 
-            if process.returncode == 0:
+            if returncode == 0:
                 success_msg = "    OSKAR Beam Pattern simulation finished successfully."
                 print(success_msg)
                 log_f.write("\n--- Simulation Successful ---\n")
-                if process.stdout.strip():
-                    print(f"      (stdout logged to {log_file_path})")
-                if process.stderr.strip():
-                    print(f"      (stderr logged to {log_file_path})")
+                print(f"      (output logged to {log_file_path})")
                 return True
             else:
-                error_msg_console = f"    ERROR: OSKAR Beam Pattern simulation failed with exit code {process.returncode}."
+                error_msg_console = f"    ERROR: OSKAR Beam Pattern simulation failed with exit code {returncode}."
                 print(error_msg_console)
                 log_f.write(
-                    f"\n!!! ERROR: Simulation Failed (Exit Code: {process.returncode}) !!!\n"
+                    f"\n!!! ERROR: Simulation Failed (Exit Code: {returncode}) !!!\n"
                 )
-                if process.stdout.strip():
-                    print("    Stdout from error:")
-                    print(process.stdout)
-                if process.stderr.strip():
-                    print("    Stderr from error:")
-                    print(process.stderr)
+                # Print the tail of the output to console on error for immediate visibility
+                if output_tail:
+                    print(f"    Last {len(output_tail)} line(s) of output:")
+                    for line in output_tail:
+                        print(f"      {line}")
                 return False
 
     except FileNotFoundError:
@@ -299,6 +741,7 @@ def run_calibrate(
     global_output_cfg: dict,
     cwd_path: Path,
     is_dry_run: bool,
+    echo_output: bool = False,
 ) -> bool:
     log_file_path = (
         cwd_path / "run.log"
@@ -334,44 +777,33 @@ def run_calibrate(
                 return True
 
             print(f"    Executing Hyperdrive calibration...")
-            process = subprocess.run(
-                command,
-                cwd=str(cwd_path),
-                check=False,  # Check returncode manually to log output regardless
-                capture_output=True,
-                text=True,
+            log_f.write("--- Output (stderr lines prefixed with [stderr]) ---\n")
+            returncode, output_tail = run_streaming_command(
+                command, cwd_path, log_f, echo_output=echo_output
             )
 
-            log_f.write(f"Exit Code: {process.returncode}\n\n")
+            _note_child_exit_code(returncode)
+            log_f.write(f"\nExit Code: {returncode}\n")
 
-            log_f.write("--- Stdout ---\n")
-            log_f.write(process.stdout if process.stdout.strip() else "<No stdout>\n")
-            log_f.write("\n--- Stderr ---\n")
-            log_f.write(process.stderr if process.stderr.strip() else "<No stderr>\n")
-
-            if process.returncode == 0:
+            if returncode == 0:
                 success_msg = "    Hyperdrive finished successfully."
                 print(success_msg)
                 log_f.write("\n--- Hyperdrive Successful ---\n")
-                if process.stdout.strip():
-                    print(f"      (stdout logged to {log_file_path})")
-                if process.stderr.strip():
-                    print(f"      (stderr logged to {log_file_path})")
+                print(f"      (output logged to {log_file_path})")
                 return True
             else:
                 error_msg_console = (
-                    f"    ERROR: Hyperdrive failed with exit code {process.returncode}."
+                    f"    ERROR: Hyperdrive failed with exit code {returncode}."
                 )
                 print(error_msg_console)
                 log_f.write(
-                    f"\n!!! ERROR: Hyperdrive Failed (Exit Code: {process.returncode}) !!!\n"
+                    f"\n!!! ERROR: Hyperdrive Failed (Exit Code: {returncode}) !!!\n"
                 )
-                if process.stdout.strip():
-                    print("    Stdout from error:")
-                    print(process.stdout)
-                if process.stderr.strip():
-                    print("    Stderr from error:")
-                    print(process.stderr)
+                # Print the tail of the output to console on error for immediate visibility
+                if output_tail:
+                    print(f"    Last {len(output_tail)} line(s) of output:")
+                    for line in output_tail:
+                        print(f"      {line}")
                 return False
 
     except FileNotFoundError:
@@ -413,6 +845,7 @@ def run_plot(
     global_output_cfg: dict,
     cwd_path: Path,
     is_dry_run: bool,
+    echo_output: bool = False,
 ) -> bool:
     log_file_path = (
         cwd_path / "run.log"
@@ -439,42 +872,31 @@ def run_plot(
                 return True
 
             print(f"    Executing Hyperdrive plot ...")
-            process = subprocess.run(
-                command,
-                cwd=str(cwd_path),
-                check=False,  # Check returncode manually to log output regardless
-                capture_output=True,
-                text=True,
+            log_f.write("--- Output (stderr lines prefixed with [stderr]) ---\n")
+            returncode, output_tail = run_streaming_command(
+                command, cwd_path, log_f, echo_output=echo_output
             )
 
-            log_f.write(f"Exit Code: {process.returncode}\n\n")
-
-            log_f.write("--- Stdout ---\n")
-            log_f.write(process.stdout if process.stdout.strip() else "<No stdout>\n")
-            log_f.write("\n--- Stderr ---\n")
-            log_f.write(process.stderr if process.stderr.strip() else "<No stderr>\n")
+            _note_child_exit_code(returncode)
+            log_f.write(f"\nExit Code: {returncode}\n")
 
-            if process.returncode == 0:
+            if returncode == 0:
                 success_msg = "    Hyperdrive plot finished successfully."
                 print(success_msg)
                 log_f.write("\n--- Hyperdrive plot Successful ---\n")
-                if process.stdout.strip():
-                    print(f"      (stdout logged to {log_file_path})")
-                if process.stderr.strip():
-                    print(f"      (stderr logged to {log_file_path})")
+                print(f"      (output logged to {log_file_path})")
                 return True
             else:
-                error_msg_console = f"    ERROR: Hyperdrive plot failed with exit code {process.returncode}."
+                error_msg_console = f"    ERROR: Hyperdrive plot failed with exit code {returncode}."
                 print(error_msg_console)
                 log_f.write(
-                    f"\n!!! ERROR: Hyperdrive plot Failed (Exit Code: {process.returncode}) !!!\n"
+                    f"\n!!! ERROR: Hyperdrive plot Failed (Exit Code: {returncode}) !!!\n"
                 )
-                if process.stdout.strip():
-                    print("    Stdout from error:")
-                    print(process.stdout)
-                if process.stderr.strip():
-                    print("    Stderr from error:")
-                    print(process.stderr)
+                # Print the tail of the output to console on error for immediate visibility
+                if output_tail:
+                    print(f"    Last {len(output_tail)} line(s) of output:")
+                    for line in output_tail:
+                        print(f"      {line}")
                 return False
 
     finally:
@@ -494,6 +916,7 @@ def run_apply(
     global_output_cfg: dict,
     cwd_path: Path,
     is_dry_run: bool,
+    echo_output: bool = False,
 ) -> bool:
     log_file_path = (
         cwd_path / "run.log"
@@ -523,42 +946,31 @@ def run_apply(
                 return True
 
             print(f"    Executing Hyperdrive plot ...")
-            process = subprocess.run(
-                command,
-                cwd=str(cwd_path),
-                check=False,  # Check returncode manually to log output regardless
-                capture_output=True,
-                text=True,
+            log_f.write("--- Output (stderr lines prefixed with [stderr]) ---\n")
+            returncode, output_tail = run_streaming_command(
+                command, cwd_path, log_f, echo_output=echo_output
             )
 
-            log_f.write(f"Exit Code: {process.returncode}\n\n")
+            _note_child_exit_code(returncode)
+            log_f.write(f"\nExit Code: {returncode}\n")
 
-            log_f.write("--- Stdout ---\n")
-            log_f.write(process.stdout if process.stdout.strip() else "<No stdout>\n")
-            log_f.write("\n--- Stderr ---\n")
-            log_f.write(process.stderr if process.stderr.strip() else "<No stderr>\n")
-
-            if process.returncode == 0:
+            if returncode == 0:
                 success_msg = "    Hyperdrive apply finished successfully."
                 print(success_msg)
                 log_f.write("\n--- Hyperdrive apply Successful ---\n")
-                if process.stdout.strip():
-                    print(f"      (stdout logged to {log_file_path})")
-                if process.stderr.strip():
-                    print(f"      (stderr logged to {log_file_path})")
+                print(f"      (output logged to {log_file_path})")
                 return True
             else:
-                error_msg_console = f"    ERROR: Hyperdrive apply failed with exit code {process.returncode}."
+                error_msg_console = f"    ERROR: Hyperdrive apply failed with exit code {returncode}."
                 print(error_msg_console)
                 log_f.write(
-                    f"\n!!! ERROR: Hyperdrive apply Failed (Exit Code: {process.returncode}) !!!\n"
+                    f"\n!!! ERROR: Hyperdrive apply Failed (Exit Code: {returncode}) !!!\n"
                 )
-                if process.stdout.strip():
-                    print("    Stdout from error:")
-                    print(process.stdout)
-                if process.stderr.strip():
-                    print("    Stderr from error:")
-                    print(process.stderr)
+                # Print the tail of the output to console on error for immediate visibility
+                if output_tail:
+                    print(f"    Last {len(output_tail)} line(s) of output:")
+                    for line in output_tail:
+                        print(f"      {line}")
                 return False
 
     finally:
@@ -958,205 +1370,5313 @@ def get_sky_model_name_no_ext(sky_model_filename_basename):
     )
 
 
-def main(config_file_path):
+_HASH_MEMO = {}
+_HASH_MEMO_LOCK = threading.Lock()
+
+STEP_CACHE_DIRNAME = ".step_cache"
+
+
+def hash_file_contents(file_path: Path) -> str:
     """
-    Reads the master YAML config, iterates through combinations,
-    and generates OSKAR INI files in their respective directories.
+    Returns the SHA-256 of a file's contents, or "missing:<path>" if it does not
+    exist. Results are memoised per (path, size, mtime) for the lifetime of the
+    process, so the same sky model is only read once per campaign.
     """
+    file_path = Path(file_path).resolve()
     try:
-        with open(config_file_path, "r") as f:
-            master_config = yaml.safe_load(f)
-    except FileNotFoundError:
-        print(f"ERROR: Configuration file not found at {config_file_path}")
-        return
-    except yaml.YAMLError as e:
-        print(f"ERROR: Could not parse YAML configuration file: {e}")
-        return
+        st = file_path.stat()
+    except OSError:
+        return f"missing:{file_path}"
+
+    memo_key = ("file", str(file_path), st.st_size, st.st_mtime_ns)
+    with _HASH_MEMO_LOCK:
+        if memo_key in _HASH_MEMO:
+            return _HASH_MEMO[memo_key]
+
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _HASH_MEMO_LOCK:
+        _HASH_MEMO[memo_key] = digest
+    return digest
+
+
+def hash_directory_contents(dir_path: Path) -> str:
+    """
+    Returns a SHA-256 over the relative paths and contents of every file below
+    dir_path (e.g. a telescope model directory). Memoised per directory for the
+    lifetime of the process.
+    """
+    dir_path = Path(dir_path).resolve()
+    memo_key = ("dir", str(dir_path))
+    with _HASH_MEMO_LOCK:
+        if memo_key in _HASH_MEMO:
+            return _HASH_MEMO[memo_key]
+
+    if not dir_path.is_dir():
+        return f"missing:{dir_path}"
+
+    h = hashlib.sha256()
+    # Follow links: materialised subarray models link to the station store
+    for root, dirs, files in os.walk(dir_path, followlinks=True):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = Path(root) / name
+            h.update(str(file_path.relative_to(dir_path)).encode())
+            h.update(b"\0")
+            h.update(hash_file_contents(file_path).encode())
+    digest = h.hexdigest()
+    with _HASH_MEMO_LOCK:
+        _HASH_MEMO[memo_key] = digest
+    return digest
+
+
+def path_stat_signature(path: Path) -> list:
+    """
+    Returns a cheap fingerprint (relative path, size, mtime) of a file or of
+    every file below a directory. Used for large outputs such as Measurement
+    Sets, where hashing the contents would cost as much as re-reading them.
+    """
+    path = Path(path)
+    if path.is_file():
+        st = path.stat()
+        return [[path.name, st.st_size, st.st_mtime_ns]]
+    if not path.is_dir():
+        return [[f"missing:{path}"]]
+
+    # os.scandir rather than os.walk/Path: this runs over thousands of files
+    # (telescope models, Measurement Sets) and the per-file overhead dominates.
+    signature = []
+
+    def _scan(dir_path: str, rel_prefix: str) -> None:
+        with os.scandir(dir_path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        sub_dirs = []
+        for entry in entries:
+            if entry.is_dir():
+                sub_dirs.append(entry)
+            else:
+                st = entry.stat()
+                signature.append([rel_prefix + entry.name, st.st_size, st.st_mtime_ns])
+        for entry in sub_dirs:
+            _scan(entry.path, rel_prefix + entry.name + os.sep)
 
-    # Extract configurations
-    run_settings = master_config.get("run_settings", {})
-    output_cfg = master_config.get("output_config", {})
-    iter_params = master_config.get("iteration_parameters", {})
-    oskar_defaults = master_config.get("oskar_ini_defaults", {})
-    executables_cfg = master_config.get("executables", {})
+    _scan(str(path), "")
+    return signature
 
-    hyperdrive_cfg = master_config.get("hyperdrive_settings")
 
-    base_output_dir = Path(
-        output_cfg.get("base_output_directory", "simulation_outputs_generated")
-    )
-    images_folder_pattern = output_cfg.get(
-        "images_folder_pattern",
-        "images_{sky_name_no_ext}_{tel_name}{error_suffix}_{pc_id}",
+def get_executable_version(executable_path: str) -> str:
+    """
+    Returns the output of '<executable> --version' (memoised), falling back to
+    the resolved executable path if the version cannot be queried. Used so that
+    upgrading OSKAR or hyperdrive invalidates cached steps.
+    """
+    memo_key = ("exe", executable_path)
+    with _HASH_MEMO_LOCK:
+        if memo_key in _HASH_MEMO:
+            return _HASH_MEMO[memo_key]
+
+    try:
+        process = subprocess.run(
+            [executable_path, "--version"],
+            check=False,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        version = (process.stdout + process.stderr).strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        version = f"unavailable:{shutil.which(executable_path) or executable_path}"
+    with _HASH_MEMO_LOCK:
+        _HASH_MEMO[memo_key] = version
+    return version
+
+
+def compute_step_cache_key(step_name: str, inputs: dict) -> str:
+    """
+    Computes the content-addressed cache key of a step from its fully resolved
+    inputs (INI dict, input file/directory hashes, executable version, upstream
+    step keys, ...). Any JSON-serialisable structure is accepted.
+    """
+    payload = json.dumps(
+        {"step": step_name, "inputs": inputs}, sort_keys=True, default=str
     )
+    return hashlib.sha256(payload.encode()).hexdigest()
 
-    beam_ini_filename_template = output_cfg.get("beam_ini_filename", "beam.ini")
-    interf_ini_filename_template = output_cfg.get("interf_ini_filename", "interf.ini")
-    beam_root_path_base = output_cfg.get("beam_root_path_base", "beam_output")
-    interf_ms_base_filename = output_cfg.get("interf_ms_base_filename", "vis.ms")
 
-    # Get iterables
-    telescope_configs = iter_params.get("telescope_configs", [])
-    sky_model_configs = iter_params.get("sky_model_configs", [])
-    sky_models_base_dir_str = iter_params.get("sky_models_base_dir", "sky_models")
-    phase_centre_configs = iter_params.get("phase_centre_configs", [])
+def _step_cache_record_path(run_dir: Path, step_name: str) -> Path:
+    return Path(run_dir) / STEP_CACHE_DIRNAME / f"{step_name}.json"
+
+
+def is_step_cached(run_dir: Path, step_name: str, cache_key: str) -> bool:
+    """
+    Returns True if run_dir holds a completed record for step_name with the
+    given key and all outputs listed in that record still exist.
+    """
+    record_path = _step_cache_record_path(run_dir, step_name)
+    try:
+        with open(record_path, "r") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return False
 
-    if not all([telescope_configs, sky_model_configs, phase_centre_configs]):
+    if record.get("key") != cache_key:
+        return False
+    return all((Path(run_dir) / out).exists() for out in record.get("outputs", []))
+
+
+def save_step_cache_record(
+    run_dir: Path, step_name: str, cache_key: str, outputs: list
+) -> None:
+    """
+    Records that step_name completed in run_dir with the given key. outputs are
+    paths relative to run_dir that must exist for the record to stay valid.
+    """
+    record_path = _step_cache_record_path(run_dir, step_name)
+    record_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = record_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {
+                "key": cache_key,
+                "outputs": [str(o) for o in outputs],
+                "completed": datetime.datetime.now().isoformat(timespec="seconds"),
+            },
+            f,
+            indent=2,
+        )
+    os.replace(tmp_path, record_path)
+
+
+def clear_step_cache_record(run_dir: Path, step_name: str) -> None:
+    """Removes the cache record of a step that is about to be (re-)executed."""
+    try:
+        _step_cache_record_path(run_dir, step_name).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def execute_with_step_cache(
+    run_dir: Path,
+    step_name: str,
+    cache_inputs_fn: Callable[[], dict],
+    execute_fn: Callable[[], bool],
+    outputs_fn: Callable[[], list],
+    use_cache: bool,
+    is_dry_run: bool,
+    prefix: str = "",
+):
+    """
+    Runs execute_fn() unless run_dir holds a completed record for step_name
+    with the same input key and existing outputs.
+
+    Args:
+        run_dir: Directory the step runs in (and where its cache record lives).
+        step_name: Name of the step ("beam", "interf", ...).
+        cache_inputs_fn: Returns the step's fully resolved inputs; only called
+                         when caching is enabled, since hashing is not free.
+        execute_fn: Executes the step; returns True on success.
+        outputs_fn: Returns the step's outputs (relative to run_dir) after success.
+        use_cache: If False, always execute and never record.
+        is_dry_run: Dry runs check the cache but never record.
+        prefix: Console prefix identifying the run.
+
+    Returns:
+        A tuple (success, cache_key); cache_key is None when caching is disabled.
+    """
+    if not use_cache:
+        success = execute_fn()
+        if success and not is_dry_run:
+            _note_step_outputs(run_dir, outputs_fn())
+        return success, None
+
+    cache_key = compute_step_cache_key(step_name, cache_inputs_fn())
+    if is_step_cached(run_dir, step_name, cache_key):
         print(
-            "Warning: One or more iteration parameter lists (telescopes, skies, phase_centres) are empty. No INI files will be generated."
+            f"    {prefix} Skipping {step_name}: inputs unchanged since its last successful run (cache hit)"
         )
-        return
+        step = current_step()
+        if step is not None:
+            step.cached = True
+        if not is_dry_run:
+            _note_step_outputs(run_dir, outputs_fn())
+        return True, cache_key
 
-    run_counter = 0
-    for tel_cfg in telescope_configs:
-        for sky_cfg in sky_model_configs:
-            for pc_cfg in phase_centre_configs:
-                run_counter += 1
+    if not is_dry_run:
+        clear_step_cache_record(run_dir, step_name)
+    success = execute_fn()
+    if success and not is_dry_run:
+        outputs = outputs_fn()
+        save_step_cache_record(run_dir, step_name, cache_key, outputs)
+        _note_step_outputs(run_dir, outputs)
+    return success, cache_key
 
-                tel_name = tel_cfg.get("name", "unknown_tel")
-                sky_filename = sky_cfg.get("filename", "unknown_sky.osm")
-                pc_id = pc_cfg.get("id", "unknown_pc")
 
-                print(f"\n--- Preparing Config for Run {run_counter} ---")
-                print(
-                    f"  Telescope: {tel_name}, Sky: {sky_filename}, Phase Centre: {pc_id}"
-                )
+DEFAULT_MODEL_CACHE_DIR = Path(tempfile.gettempdir()) / "oskar_telescope_models"
 
-                # 1. Determine unique output directory for this run
-                sky_name_no_ext = get_sky_model_name_no_ext(sky_filename)
-                is_errors_globally_on = run_settings.get(
-                    "include_telescope_errors", False
-                )
-                error_suffix = "_errors_on" if is_errors_globally_on else "_errors_off"
 
-                current_run_images_folder_name = images_folder_pattern.format(
-                    sky_name_no_ext=sky_name_no_ext,
-                    tel_name=tel_name,
-                    error_suffix=error_suffix,
-                    pc_id=pc_id,
+def _read_numeric_table(file_path: Path, n_cols: int) -> np.ndarray:
+    """
+    Reads a comma- and/or whitespace-separated OSKAR text table (e.g. a
+    layout.txt) into a float64 array of shape (n_rows, n_cols). Empty and '#'
+    comment lines are skipped; missing trailing columns are filled with zeros.
+
+    Raises:
+        ValueError: If a value is not numeric or rows have different widths
+                    (the message names the file and line).
+    """
+    with open(file_path, "r") as f:
+        rows = [
+            (line_no, line.replace(",", " ").split())
+            for line_no, line in enumerate(f, start=1)
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+    if not rows:
+        return np.zeros((0, n_cols))
+    width = len(rows[0][1])
+    for line_no, row in rows:
+        if len(row) != width:
+            raise ValueError(
+                f"{file_path}:{line_no}: expected {width} columns like line {rows[0][0]}, found {len(row)}"
+            )
+    try:
+        values = np.array([v for _, row in rows for v in row], dtype=np.float64)
+    except ValueError:
+        for line_no, row in rows:
+            for v in row:
+                try:
+                    float(v)
+                except ValueError:
+                    raise ValueError(f"{file_path}:{line_no}: '{v}' is not a number") from None
+        raise
+    values = values.reshape(len(rows), width)[:, :n_cols]
+    if width < n_cols:
+        values = np.pad(values, ((0, 0), (0, n_cols - width)))
+    return values
+
+
+class TelescopeModel:
+    """
+    An OSKAR telescope model directory loaded into contiguous NumPy arrays.
+
+    Attributes:
+        directory: The (resolved) telescope model directory.
+        position: Array reference position from position.txt (lon_deg, lat_deg, alt_m).
+        station_enu: (n_stations, 3) station positions in metres (top-level layout.txt).
+        element_offsets: (n_stations + 1,) index of each station's first element in
+                         element_enu/feed_angle_deg; the elements of station i are
+                         element_enu[element_offsets[i]:element_offsets[i + 1]].
+        element_enu: (n_elements_total, 3) element positions relative to their
+                     station centre, in metres (stationNNN/layout.txt).
+        feed_angle_deg: (n_elements_total, 3) feed angles (alpha, beta, gamma) in
+                        degrees (stationNNN/feed_angle.txt; zeros if absent).
+        station_names: Names of the station directories, in station order.
+
+    Parsing a large model means opening over a thousand small files, so
+    TelescopeModel.load() keeps the arrays in a single .npz file per model
+    directory that is reused for as long as no file of the model has changed
+    (same relative paths, sizes and mtimes).
+    """
+
+    CACHE_FORMAT_VERSION = 1
+    _ARRAYS = ("position", "station_enu", "element_offsets", "element_enu", "feed_angle_deg")
+
+    def __init__(self, directory, position, station_enu, element_offsets, element_enu,
+                 feed_angle_deg, station_names):
+        self.directory = Path(directory)
+        self.position = position
+        self.station_enu = station_enu
+        self.element_offsets = element_offsets
+        self.element_enu = element_enu
+        self.feed_angle_deg = feed_angle_deg
+        self.station_names = list(station_names)
+
+    @property
+    def n_stations(self) -> int:
+        return len(self.station_enu)
+
+    @property
+    def n_elements_total(self) -> int:
+        return len(self.element_enu)
+
+    @property
+    def elements_per_station(self) -> np.ndarray:
+        return np.diff(self.element_offsets)
+
+    def station_elements(self, index: int) -> np.ndarray:
+        """Returns the (n_elements, 3) element positions of one station (a view)."""
+        return self.element_enu[self.element_offsets[index]:self.element_offsets[index + 1]]
+
+    @classmethod
+    def parse(cls, directory: Path) -> "TelescopeModel":
+        """
+        Parses a telescope model directory from its text files (no caching).
+
+        Raises:
+            OSError: If the top-level layout.txt or position.txt is missing.
+            ValueError: If any file cannot be parsed or a feed_angle.txt does not
+                        match its layout.txt; the message lists every such problem,
+                        one per line.
+        """
+        directory = Path(directory).resolve()
+        problems = []
+        position = _read_numeric_table(directory / "position.txt", 3)
+        if len(position) != 1:
+            problems.append(f"{directory / 'position.txt'}: expected exactly one position line, found {len(position)}")
+        station_enu = _read_numeric_table(directory / "layout.txt", 3)
+
+        station_dirs = sorted(p for p in directory.glob("station*") if p.is_dir())
+        element_tables, feed_tables = [], []
+        for station_dir in station_dirs:
+            try:
+                elements = _read_numeric_table(station_dir / "layout.txt", 3)
+                feed_file = station_dir / "feed_angle.txt"
+                feeds = (
+                    _read_numeric_table(feed_file, 3)
+                    if feed_file.is_file()
+                    else np.zeros((len(elements), 3))
                 )
-                current_run_output_dir = (
-                    base_output_dir / current_run_images_folder_name
+            except (OSError, ValueError) as e:
+                problems.append(str(e))
+                continue
+            if len(feeds) != len(elements):
+                problems.append(
+                    f"{feed_file}: {len(feeds)} feed angles for {len(elements)} elements in layout.txt"
                 )
-                current_run_output_dir.mkdir(parents=True, exist_ok=True)
-                print(f"  Output Directory: {current_run_output_dir.resolve()}")
-
-                project_root = Path(".").resolve()
-
-                # --- Generate Beam INI (if enabled) ---
-                if run_settings.get("run_beam_sim"):
-                    print("  Preparing Beam Simulation INI...")
-                    beam_ini_path = current_run_output_dir / beam_ini_filename_template
-                    beam_init_data = generate_beam_ini_data(
-                        oskar_defaults,
-                        tel_cfg,
-                        pc_cfg,
-                        run_settings,
-                        output_cfg,
-                        current_run_output_dir,
-                        project_root,
-                    )
+                continue
+            element_tables.append(elements)
+            feed_tables.append(feeds)
+        if problems:
+            raise ValueError("\n".join(problems))
+
+        element_offsets = np.zeros(len(station_dirs) + 1, dtype=np.int64)
+        element_offsets[1:] = np.cumsum([len(t) for t in element_tables])
+        return cls(
+            directory,
+            position[0],
+            station_enu,
+            element_offsets,
+            np.concatenate(element_tables) if element_tables else np.zeros((0, 3)),
+            np.concatenate(feed_tables) if feed_tables else np.zeros((0, 3)),
+            [p.name for p in station_dirs],
+        )
 
-                    write_ini_file_with_configparser(beam_init_data, beam_ini_path)
-                    print(f"    Generated beam INI: {beam_ini_path.resolve()}")
-
-                    print(f"    Now running simulation")
-                    success = run_oskar_sim_beam(
-                        executables_cfg.get(
-                            "oskar_sim_beam_patter", "oskar_sim_beam_pattern"
-                        ),
-                        beam_ini_path,
-                        current_run_output_dir,
-                        run_settings.get("dry_run", False),
+    @classmethod
+    def load(cls, directory: Path, cache_dir: Optional[Path] = None,
+             use_cache: bool = True) -> "TelescopeModel":
+        """
+        Loads a telescope model directory, from its .npz cache when valid.
+
+        Args:
+            directory: The OSKAR telescope model directory.
+            cache_dir: Directory holding the .npz caches (default: DEFAULT_MODEL_CACHE_DIR).
+            use_cache: If False, always parse the text files and leave the cache alone.
+
+        Raises:
+            OSError: If a required file (layout.txt, position.txt) is missing.
+            ValueError: If a file cannot be parsed.
+        """
+        directory = Path(directory).resolve()
+        if not use_cache:
+            return cls.parse(directory)
+
+        signature = hashlib.sha256(
+            json.dumps(
+                [cls.CACHE_FORMAT_VERSION, str(directory), path_stat_signature(directory)]
+            ).encode()
+        ).hexdigest()
+        memo_key = ("telescope_model", signature)
+        with _HASH_MEMO_LOCK:
+            if memo_key in _HASH_MEMO:
+                return _HASH_MEMO[memo_key]
+
+        cache_dir = Path(cache_dir) if cache_dir else DEFAULT_MODEL_CACHE_DIR
+        path_digest = hashlib.sha256(str(directory).encode()).hexdigest()[:16]
+        cache_file = cache_dir / f"{directory.name}-{path_digest}.npz"
+
+        model = None
+        try:
+            with np.load(cache_file, allow_pickle=False) as data:
+                if str(data["signature"]) == signature:
+                    model = cls(
+                        directory,
+                        *(data[name] for name in cls._ARRAYS),
+                        [str(name) for name in data["station_names"]],
                     )
+        except (OSError, KeyError, ValueError):
+            pass  # missing, stale format or corrupt: rebuild below
+
+        if model is None:
+            model = cls.parse(directory)
+            try:
+                cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_file = cache_file.with_name(f".{cache_file.name}.{os.getpid()}.tmp.npz")
+                np.savez(
+                    tmp_file,
+                    signature=np.array(signature),
+                    station_names=np.array(model.station_names, dtype=str),
+                    **{name: getattr(model, name) for name in cls._ARRAYS},
+                )
+                os.replace(tmp_file, cache_file)
+            except OSError as e:
+                print(f"Warning: Could not write telescope model cache {cache_file}: {e}")
 
-                    if success and not run_settings.get("dry_run", False):
-                        print(f"    Successfully finished OSKAR beam sim")
-
-                # --- Generate Interferometer INI (if enabled) ---
-                if run_settings.get("run_interf_sim"):
-                    print("  Preparing Interferometer Simulation INI...")
-
-                    interf_ini_data = generate_interf_ini_data(
-                        oskar_defaults,  # The 'oskar_ini_defaults' dict from master_config
-                        tel_cfg,  # Current telescope config map
-                        sky_cfg,  # Current sky model config map
-                        pc_cfg,  # Current phase centre config map
-                        run_settings,  # The 'run_settings' dict from master_config
-                        output_cfg,  # The 'output_config' dict from master_config
-                        sky_models_base_dir_str,  # The 'sky_models_base_dir' string from master_config iter_params
-                        current_run_output_dir,  # Path object for the run's output dir
-                        project_root,  # Path object for project root
-                    )
+        with _HASH_MEMO_LOCK:
+            _HASH_MEMO[memo_key] = model
+        return model
 
-                    interf_ini_path = current_run_output_dir / output_cfg.get(
-                        "interf_ini_filename", "interf.ini"
-                    )
 
-                    # Assuming write_ini_file_with_configparser is defined
-                    write_ini_file_with_configparser(interf_ini_data, interf_ini_path)
-                    print(
-                        f"    Generated Interferometer INI: {interf_ini_path.resolve()}"
-                    )
-                    print(f"    Now running simulation")
-                    success = run_oskar_sim_interf(
-                        executables_cfg.get(
-                            "oskar_sim_interferometer", "oskar_sim_interferometer"
-                        ),
-                        interf_ini_path,
-                        current_run_output_dir,
-                        run_settings.get("dry_run", False),
-                    )
+def _count_data_lines(file_path: Path) -> int:
+    """Counts non-empty, non-comment ('#') lines of a text file; 0 if missing."""
+    try:
+        with open(file_path, "r") as f:
+            return sum(1 for line in f if line.strip() and not line.lstrip().startswith("#"))
+    except OSError:
+        return 0
 
-                    if success and not run_settings.get("dry_run", False):
-                        print(f"    Successfully finished OSKAR sim")
 
-                if run_settings.get("run_hyperdrive"):
-                    success = run_calibrate(
-                        executables_cfg.get("hyperdrive", "hyperdrive"),
-                        hyperdrive_cfg,
-                        output_cfg,
-                        current_run_output_dir,
-                        run_settings.get("dry_run", False),
-                    )
+def count_telescope_model(tel_dir: Path) -> dict:
+    """
+    Reads the size of an OSKAR telescope model directory: the number of
+    stations (lines of the top-level layout.txt) and the number of elements
+    of each station (lines of stationNNN/layout.txt). Missing or unreadable
+    models count as empty.
 
-                    if success and not run_settings.get("dry_run", False):
-                        print(f"    Successfully finished Hyperdrive di-calibrate")
-                        run_plot(
-                            executables_cfg.get("hyperdrive", "hyperdrive"),
-                            hyperdrive_cfg,
-                            output_cfg,
-                            current_run_output_dir,
-                            run_settings.get("dry_run", False),
-                        )
+    Returns:
+        A dictionary with "n_stations", "n_elements_total" and "n_elements_max".
+    """
+    try:
+        model = TelescopeModel.load(tel_dir)
+    except (OSError, ValueError):
+        return {"n_stations": 0, "n_elements_total": 0, "n_elements_max": 0}
+    per_station = model.elements_per_station
+    return {
+        "n_stations": model.n_stations,
+        "n_elements_total": model.n_elements_total,
+        "n_elements_max": int(per_station.max()) if len(per_station) else 0,
+    }
+
+
+def count_sky_model_sources(sky_file: Path) -> int:
+    """Returns the number of sources in an OSKAR sky model file (memoised)."""
+    sky_file = Path(sky_file).resolve()
+    try:
+        st = sky_file.stat()
+    except OSError:
+        return 0
+    memo_key = ("sky_sources", str(sky_file), st.st_size, st.st_mtime_ns)
+    with _HASH_MEMO_LOCK:
+        if memo_key in _HASH_MEMO:
+            return _HASH_MEMO[memo_key]
+    n_sources = _count_data_lines(sky_file)
+    with _HASH_MEMO_LOCK:
+        _HASH_MEMO[memo_key] = n_sources
+    return n_sources
+
+
+# Columns of an OSKAR sky model (.osm) file, in file order; only RA, Dec and
+# Stokes I are mandatory.
+SKY_MODEL_COLUMNS = (
+    "ra_deg", "dec_deg", "stokes_i", "stokes_q", "stokes_u", "stokes_v",
+    "ref_freq_hz", "spectral_index", "rotation_measure",
+    "major_axis_arcsec", "minor_axis_arcsec", "position_angle_deg",
+)
+SIDEREAL_DEG_PER_SEC = 360.98564736629 / 86400.0
+_SKY_LOAD_LOCK = threading.Lock()
+
+
+def load_sky_model(sky_file: Path) -> np.ndarray:
+    """
+    Loads an OSKAR sky model file into a NumPy structured array with one float64
+    field per column present in the file (named after SKY_MODEL_COLUMNS; rows
+    with fewer columns than the widest row are padded with zeros, as OSKAR
+    does). The result is memoised per file (path, size, mtime), so a catalogue
+    shared by many runs is parsed once per campaign.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If a value is not numeric, a row has fewer than 3 or more
+                    than 12 columns (the message names the file and line).
+    """
+    sky_file = Path(sky_file).resolve()
+    st = sky_file.stat()
+    memo_key = ("sky_model", str(sky_file), st.st_size, st.st_mtime_ns)
+    with _SKY_LOAD_LOCK:  # concurrent runs of the same sky wait for one parse
+        with _HASH_MEMO_LOCK:
+            if memo_key in _HASH_MEMO:
+                return _HASH_MEMO[memo_key]
+
+        line_nos, lines = [], []
+        with open(sky_file, "r") as f:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip() and not line.lstrip().startswith("#"):
+                    line_nos.append(line_no)
+                    lines.append(line.replace(",", " "))
+        widths = np.fromiter((len(line.split()) for line in lines), dtype=np.int64, count=len(lines))
+        bad = np.flatnonzero((widths < 3) | (widths > len(SKY_MODEL_COLUMNS)))
+        if bad.size:
+            raise ValueError(
+                f"{sky_file}:{line_nos[bad[0]]}: expected 3 to {len(SKY_MODEL_COLUMNS)} "
+                f"columns, found {widths[bad[0]]}"
+            )
+        width = int(widths.max()) if lines else 3
+        try:
+            if lines and (widths == width).all():
+                table = np.fromstring(" ".join(lines), dtype=np.float64, sep=" ")
+                if table.size != len(lines) * width:
+                    raise ValueError("non-numeric value")
+                table = table.reshape(len(lines), width)
+            else:
+                table = np.zeros((len(lines), width))
+                for i, line in enumerate(lines):
+                    row = line.split()
+                    table[i, : len(row)] = [float(v) for v in row]
+        except ValueError:
+            for line_no, line in zip(line_nos, lines):
+                for v in line.split():
+                    try:
+                        float(v)
+                    except ValueError:
+                        raise ValueError(f"{sky_file}:{line_no}: '{v}' is not a number") from None
+            raise
+
+        sources = np.empty(
+            len(lines), dtype=[(name, np.float64) for name in SKY_MODEL_COLUMNS[:width]]
+        )
+        for i, name in enumerate(sources.dtype.names):
+            sources[name] = table[:, i]
+        with _HASH_MEMO_LOCK:
+            _HASH_MEMO[memo_key] = sources
+    return sources
+
+
+def write_sky_model(sources: np.ndarray, out_path: Path, header: str = "") -> None:
+    """Writes a structured array from load_sky_model() as an OSKAR sky model file (atomically)."""
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    columns = np.column_stack([sources[name] for name in sources.dtype.names])
+    fmt = ["%.12g"] * len(sources.dtype.names)
+    fmt[:2] = ["%.10f", "%.10f"]  # RA/Dec to ~0.4 mas
+    # An empty selection (e.g. every source below the horizon) gives a header-only file
+    np.savetxt(tmp_path, columns.reshape(len(sources), len(fmt)), fmt=fmt, header=header)
+    os.replace(tmp_path, out_path)
+
+
+def local_sidereal_time_deg(utc, lon_deg: float) -> float:
+    """
+    Local (mean) sidereal time in degrees at longitude lon_deg for a UTC time
+    (datetime or OSKAR start_time_utc string), using the IAU 1982 GMST
+    expression in its linear form (accurate to well below an arcminute over
+    decades, ample for horizon cuts).
+    """
+    if not isinstance(utc, datetime.datetime):
+        utc = _parse_utc(utc)
+    jd = 2440587.5 + (utc - datetime.datetime(1970, 1, 1)).total_seconds() / 86400.0
+    gmst = 280.46061837 + 360.98564736629 * (jd - 2451545.0)
+    return (gmst + lon_deg) % 360.0
+
+
+def angular_distance_deg(ra_deg, dec_deg, ra0_deg: float, dec0_deg: float) -> np.ndarray:
+    """Great-circle distance in degrees from (ra0, dec0) to arrays of positions (haversine form)."""
+    ra, dec = np.radians(ra_deg), np.radians(dec_deg)
+    ra0, dec0 = np.radians(ra0_deg), np.radians(dec0_deg)
+    hav = (
+        np.sin((dec - dec0) / 2.0) ** 2
+        + np.cos(dec) * np.cos(dec0) * np.sin((ra - ra0) / 2.0) ** 2
+    )
+    return np.degrees(2.0 * np.arcsin(np.sqrt(np.clip(hav, 0.0, 1.0))))
 
-                        run_apply(
-                            executables_cfg.get("hyperdrive", "hyperdrive"),
-                            hyperdrive_cfg,
-                            output_cfg,
-                            current_run_output_dir,
-                            run_settings.get("dry_run", False),
-                        )
 
-    print(
-        f"\nGenerated configuration for {run_counter} runs in base directory: {base_output_dir.resolve()}"
+def max_elevation_deg(
+    ra_deg, dec_deg, lat_deg: float, lst_start_deg: float, duration_sec: float
+) -> np.ndarray:
+    """
+    Highest elevation in degrees reached by each source during an observation
+    starting at local sidereal time lst_start_deg and lasting duration_sec.
+    The elevation only depends on the hour angle through cos(HA), so the
+    maximum is at the hour angle of the observed window closest to 0.
+    """
+    span = duration_sec * SIDEREAL_DEG_PER_SEC
+    ha_start = (lst_start_deg - np.asarray(ra_deg) + 180.0) % 360.0 - 180.0  # [-180, 180)
+    ha_end = ha_start + span
+    ha_end_wrapped = (ha_end + 180.0) % 360.0 - 180.0
+    ha_best = np.where(
+        ((ha_start <= 0.0) & (ha_end >= 0.0)) | (ha_end >= 360.0),
+        0.0,
+        np.minimum(np.abs(ha_start), np.abs(ha_end_wrapped)),
     )
+    lat, dec = np.radians(lat_deg), np.radians(dec_deg)
+    sin_el = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(np.radians(ha_best))
+    return np.degrees(np.arcsin(np.clip(sin_el, -1.0, 1.0)))
+
+
+def prefilter_sky_model(
+    sky_file: Path,
+    cache_dir: Path,
+    observation: dict,
+    filter_cfg: dict,
+    array_position: Optional[tuple] = None,
+) -> Path:
+    """
+    Writes (or reuses) the subset of a sky model that OSKAR would simulate for
+    one observation: the sources between filter radius_inner_deg and
+    radius_outer_deg of the phase centre and, if array_position (lon_deg,
+    lat_deg) is given, above the horizon at some time during the observation.
+    OSKAR applies the same radius filter itself, so the visibilities are
+    unchanged; it just no longer parses the whole catalogue for every run.
 
+    The file is cached in cache_dir under a key of the sky model contents, the
+    phase centre, the radii and (for the horizon cut) the array position and
+    observation window, so every run with the same pointing shares it.
 
-if __name__ == "__main__":
-    # Create a dummy master_simulation_config.yaml for testing if it doesn't exist
-    # In a real scenario, this file would be manually created by the user.
-    dummy_config_path = "config.yaml"
-    if not Path(dummy_config_path).exists():
-        print(
-            f"Warning: '{dummy_config_path}' not found. Please create it based on the provided template."
+    Args:
+        sky_file: The full OSKAR sky model.
+        cache_dir: Directory holding the filtered sky models.
+        observation: The [observation] INI section (phase_centre_ra_deg,
+                     phase_centre_dec_deg, start_time_utc, length).
+        filter_cfg: The [sky] oskar_sky_model/filter INI section.
+        array_position: (lon_deg, lat_deg) of the array, or None to skip the
+                        horizon cut.
+
+    Returns:
+        Path of the filtered sky model.
+
+    Raises:
+        OSError, ValueError: If the sky model cannot be read or parsed.
+    """
+    sky_file = Path(sky_file).resolve()
+    ra0 = float(observation["phase_centre_ra_deg"])
+    dec0 = float(observation["phase_centre_dec_deg"])
+    radius_inner = float(filter_cfg.get("radius_inner_deg") or 0.0)
+    radius_outer = float(filter_cfg.get("radius_outer_deg") or 180.0)
+    key_inputs = {
+        "sky_model": hash_file_contents(sky_file),
+        "phase_centre": [ra0, dec0],
+        "radius_deg": [radius_inner, radius_outer],
+    }
+    if array_position is not None:
+        key_inputs["horizon"] = {
+            "lon_lat_deg": [float(array_position[0]), float(array_position[1])],
+            "start_time_utc": _parse_utc(observation["start_time_utc"]).isoformat(),
+            "length_sec": _parse_duration_sec(observation["length"]),
+        }
+    cache_key = compute_step_cache_key("sky_filter", key_inputs)
+    out_path = Path(cache_dir) / f"{sky_file.stem}-{cache_key[:16]}.osm"
+    if out_path.exists():
+        return out_path
+
+    sources = load_sky_model(sky_file)
+    distance = angular_distance_deg(sources["ra_deg"], sources["dec_deg"], ra0, dec0)
+    keep = (distance >= radius_inner) & (distance <= radius_outer)
+    description = f"within {radius_inner:g}-{radius_outer:g} deg of ({ra0:g}, {dec0:g})"
+    if array_position is not None:
+        horizon = key_inputs["horizon"]
+        lst_start = local_sidereal_time_deg(
+            _parse_utc(observation["start_time_utc"]), horizon["lon_lat_deg"][0]
         )
-        print("You can get the template from the previous assistant message.")
+        keep &= max_elevation_deg(
+            sources["ra_deg"], sources["dec_deg"], horizon["lon_lat_deg"][1],
+            lst_start, horizon["length_sec"],
+        ) > 0.0
+        description += f", above the horizon from {observation['start_time_utc']} for {observation['length']}"
+    write_sky_model(
+        sources[keep],
+        out_path,
+        header=f"{np.count_nonzero(keep)} of {len(sources)} sources of {sky_file} {description}",
+    )
+    return out_path
 
-    # --- IMPORTANT: Replace this with the actual path to your YAML configuration file ---
-    config_file_to_use = dummy_config_path  # Or your actual file path
 
-    if Path(config_file_to_use).exists():
-        main(config_file_to_use)
+def partition_sky_model(sky_file: Path, cache_dir: Path, n_parts: int, index: int) -> Path:
+    """
+    Writes (or reuses) part `index` of `n_parts` disjoint, equally sized parts
+    of a sky model. Sources are dealt out round-robin rather than in
+    contiguous blocks, so catalogues ordered by flux, position or source type
+    still give parts of similar simulation cost. Visibilities are linear in
+    the sky brightness, so the sum of the parts' visibilities is that of the
+    whole model.
+
+    The parts are cached in cache_dir under a key of the sky model contents
+    and n_parts.
+
+    Returns:
+        Path of the part's sky model file.
+
+    Raises:
+        OSError, ValueError: If the sky model cannot be read or parsed, or has
+                             fewer sources than n_parts.
+    """
+    sky_file = Path(sky_file).resolve()
+    cache_key = compute_step_cache_key(
+        "sky_partition", {"sky_model": hash_file_contents(sky_file), "parts": n_parts}
+    )
+    out_path = Path(cache_dir) / f"{sky_file.stem}-{cache_key[:16]}-part{index:03d}of{n_parts:03d}.osm"
+    if out_path.exists():
+        return out_path
+
+    sources = load_sky_model(sky_file)
+    if len(sources) < n_parts:
+        raise ValueError(
+            f"{sky_file} has {len(sources)} sources, too few for {n_parts} sky partitions"
+        )
+    write_sky_model(
+        sources[index::n_parts],
+        out_path,
+        header=f"Sky partition {index + 1}/{n_parts} of {sky_file}",
+    )
+    return out_path
+
+
+# Bytes per Measurement Set row and per (row, channel, polarisation): OSKAR
+# writes DATA as complex64 plus a boolean FLAG per visibility; the per-row
+# overhead covers UVW, TIME, ANTENNA1/2, WEIGHT/SIGMA etc.
+MS_BYTES_PER_VIS = 8 + 1
+MS_BYTES_PER_ROW = 120
+
+
+def estimate_step_features(
+    tel_cfg: dict,
+    sky_cfg: dict,
+    master_config: dict,
+    project_root: Path,
+) -> dict:
+    """
+    Computes the size-dependent features the cost model uses for the steps of
+    a run, from the telescope model, the observation settings and the sky model.
+
+    Returns:
+        A dictionary with one feature dictionary per step kind ("beam",
+        "interf", "hyperdrive"). Each holds a "work" figure (proportional to
+        run time), a "mem_units" figure (proportional to peak memory) and the
+        descriptive inputs, plus "ms_bytes" for the interferometer step and
+        "output_bytes" (expected size on disk) for beam and interferometer.
+    """
+    oskar_defaults = master_config.get("oskar_ini_defaults", {})
+    iter_params = master_config.get("iteration_parameters", {})
+    obs = oskar_defaults.get("observation", {})
+    beam_image = (
+        oskar_defaults.get("beam_pattern_module", {})
+        .get("beam_pattern", {})
+        .get("beam_image", {})
+    )
+
+    tel_counts = count_telescope_model(project_root / tel_cfg["oskar_input_directory"])
+    n_stations = tel_counts["n_stations"]
+    n_baselines = n_stations * (n_stations - 1) // 2
+    n_channels = int(obs.get("num_channels", 1) or 1)
+    n_times = int(obs.get("num_time_steps", 1) or 1)
+    n_pixels = int(beam_image.get("size", 256)) ** 2  # OSKAR's default image size is 256
+    sky_file = (
+        project_root
+        / iter_params.get("sky_models_base_dir", "sky_models")
+        / sky_cfg.get("filename", "")
+    )
+    n_sources = count_sky_model_sources(sky_file)
+
+    n_rows = n_baselines * n_times
+    ms_bytes = n_rows * (n_channels * 4 * MS_BYTES_PER_VIS + MS_BYTES_PER_ROW)
+    common = {
+        "n_stations": n_stations,
+        "n_baselines": n_baselines,
+        "n_elements_total": tel_counts["n_elements_total"],
+        "n_channels": n_channels,
+        "n_times": n_times,
+    }
+    return {
+        "beam": dict(
+            common,
+            n_pixels=n_pixels,
+            # One float32 FITS amplitude cube (pixels x channels x times)
+            output_bytes=n_pixels * n_channels * n_times * 4,
+            # Array factor of the largest station per pixel, channel and time
+            work=tel_counts["n_elements_max"] * n_pixels * n_channels * n_times,
+            mem_units=n_pixels * n_channels,
+        ),
+        "interf": dict(
+            common,
+            n_sources=n_sources,
+            ms_bytes=ms_bytes,
+            output_bytes=ms_bytes,
+            # Station beams for every source plus the correlation of every baseline
+            work=n_channels
+            * n_times
+            * max(1, n_sources)
+            * (n_baselines + tel_counts["n_elements_total"]),
+            mem_units=max(1, n_sources) * n_stations + n_baselines * n_channels,
+        ),
+        "hyperdrive": dict(common, ms_bytes=ms_bytes, work=ms_bytes, mem_units=ms_bytes),
+    }
+
+
+class CostModel:
+    """
+    Predicts the wall time and peak memory of a step from its cost features.
+
+    For each step kind the model is linear in the feature's "work" (wall time)
+    and "mem_units" (peak RSS). Coefficients are fitted by least squares from
+    the metrics.jsonl records of earlier runs below the base output directory;
+    step kinds without history fall back to DEFAULT_COST_COEFFICIENTS, and
+    predictions based on those are marked as uncalibrated.
+    """
+
+    # (intercept_sec, sec_per_work, intercept_bytes, bytes_per_mem_unit)
+    DEFAULT_COST_COEFFICIENTS = {
+        "beam": (10.0, 2e-9, 500e6, 16.0),
+        "interf": (10.0, 1e-9, 1e9, 64.0),
+        "calibrate": (30.0, 2e-8, 1e9, 2.0),
+        "plot": (5.0, 0.0, 200e6, 0.0),
+        "apply": (10.0, 5e-9, 500e6, 1.0),
+        "realise": (5.0, 1e-8, 200e6, 1.0),
+        "concat": (5.0, 1e-8, 200e6, 2.0),
+    }
+
+    def __init__(self, coefficients: dict = None, calibrated: set = None):
+        self.coefficients = dict(self.DEFAULT_COST_COEFFICIENTS)
+        self.coefficients.update(coefficients or {})
+        self.calibrated = set(calibrated or ())
+
+    @staticmethod
+    def _fit_linear(xs: list, ys: list):
+        """Least-squares (intercept, slope); through the origin for a single point."""
+        n = len(xs)
+        mean_x = sum(xs) / n
+        mean_y = sum(ys) / n
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if n < 2 or var_x == 0:
+            return (0.0, mean_y / mean_x) if mean_x > 0 else (mean_y, 0.0)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+        intercept = mean_y - slope * mean_x
+        if slope < 0:  # noisy history; never predict less for bigger runs
+            return mean_y, 0.0
+        return max(0.0, intercept), slope
+
+    @classmethod
+    def from_history(cls, base_output_dir: Path) -> "CostModel":
+        """Fits a model from every metrics.jsonl below base_output_dir."""
+        samples = collections.defaultdict(list)
+        for metrics_file in Path(base_output_dir).rglob(METRICS_FILENAME):
+            try:
+                with open(metrics_file, "r") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        features = record.get("cost_features")
+                        if record.get("exit_code") != 0 or not features:
+                            continue
+                        samples[record.get("step")].append((features, record))
+            except OSError:
+                continue
+
+        coefficients = {}
+        for step_name, entries in samples.items():
+            t0, t1 = cls._fit_linear(
+                [e[0]["work"] for e in entries], [e[1]["wall_sec"] for e in entries]
+            )
+            with_rss = [e for e in entries if "max_rss_bytes" in e[1]]
+            if with_rss:
+                m0, m1 = cls._fit_linear(
+                    [e[0]["mem_units"] for e in with_rss],
+                    [e[1]["max_rss_bytes"] for e in with_rss],
+                )
+            else:
+                _, _, m0, m1 = cls.DEFAULT_COST_COEFFICIENTS.get(step_name, (0, 0, 0, 0))
+            coefficients[step_name] = (t0, t1, m0, m1)
+        return cls(coefficients, calibrated=set(coefficients))
+
+    def predict(self, step_name: str, features: dict) -> dict:
+        """
+        Returns the predicted "wall_sec" and "peak_rss_bytes" of a step, and
+        whether the prediction is "calibrated" from history.
+        """
+        t0, t1, m0, m1 = self.coefficients.get(step_name, (0.0, 0.0, 0.0, 0.0))
+        return {
+            "wall_sec": t0 + t1 * features.get("work", 0),
+            "peak_rss_bytes": m0 + m1 * features.get("mem_units", 0),
+            "calibrated": step_name in self.calibrated,
+        }
+
+
+def _format_bytes(num_bytes: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(num_bytes) < 1024 or unit == "TB":
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024.0
+
+
+def parse_station_indices(spec) -> list:
+    """
+    Parses a subarray station selection into a list of 0-based station indices.
+
+    Accepts a list of integers or a string of comma-separated indices and
+    inclusive ranges, e.g. "422-427,500-509".
+    """
+    if isinstance(spec, (list, tuple)):
+        return [int(i) for i in spec]
+
+    indices = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = (int(p) for p in part.split("-", 1))
+            if last < first:
+                raise ValueError(f"Invalid station index range '{part}'")
+            indices.extend(range(first, last + 1))
+        else:
+            indices.append(int(part))
+    return indices
+
+
+def _link_into_model(src_path: Path, dst_path: Path, link_mode: str) -> None:
+    """Places src_path at dst_path as a symlink, hardlink(s) or copy."""
+    if link_mode == "copy":
+        if src_path.is_dir():
+            shutil.copytree(src_path, dst_path)
+        else:
+            shutil.copy2(src_path, dst_path)
+        return
+    if link_mode == "hardlink":
+        try:
+            if src_path.is_dir():
+                dst_path.mkdir()
+                for child in sorted(src_path.iterdir()):
+                    _link_into_model(child, dst_path / child.name, link_mode)
+            else:
+                os.link(src_path, dst_path)
+            return
+        except OSError:
+            # e.g. cache directory on a different filesystem than the store
+            if dst_path.is_dir():
+                shutil.rmtree(dst_path)
+    os.symlink(src_path.resolve(), dst_path)
+
+
+def materialise_subarray_model(
+    store_dir: Path,
+    station_indices: list,
+    cache_dir: Path,
+    name: str,
+    link_mode: str = "symlink",
+) -> Path:
+    """
+    Materialises an OSKAR telescope model directory for a subarray of the
+    canonical station store.
+
+    The generated directory holds the selected lines of the store's layout.txt
+    (in the given order), links to its other top-level files (position.txt,
+    ...) and stationNNN entries, renumbered from 000, that link to the store's
+    station directories. Directories are named by a hash of the store layout,
+    the selection and the link mode, so they are built once per node and
+    reused afterwards.
+
+    Args:
+        store_dir: The canonical OSKAR telescope model holding every station.
+        station_indices: 0-based indices of the stations (lines of layout.txt).
+        cache_dir: (Node-local) directory to materialise models in.
+        name: Subarray name, used as a readable prefix of the directory name.
+        link_mode: "symlink", "hardlink" (falls back to symlinks) or "copy".
+
+    Returns:
+        Path to the materialised telescope model directory.
+
+    Raises:
+        ValueError: If an index is outside the store.
+    """
+    store_dir = Path(store_dir).resolve()
+    with open(store_dir / "layout.txt", "r") as f:
+        store_layout = [line for line in f if line.strip()]
+    station_dirs = sorted(p for p in store_dir.glob("station*") if p.is_dir())
+    for idx in station_indices:
+        if not 0 <= idx < min(len(store_layout), len(station_dirs)):
+            raise ValueError(
+                f"Station index {idx} of subarray '{name}' is outside the station store {store_dir} "
+                f"({len(store_layout)} stations)"
+            )
+
+    digest = compute_step_cache_key(
+        "subarray",
+        {
+            "store": str(store_dir),
+            "layout": hash_file_contents(store_dir / "layout.txt"),
+            "indices": list(station_indices),
+            "link_mode": link_mode,
+        },
+    )
+    model_dir = Path(cache_dir) / f"{name}-{digest[:12]}"
+    if model_dir.is_dir():
+        return model_dir
+
+    # Build in a temporary directory and rename, so concurrent campaigns on the
+    # same node never see a half-built model.
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{name}-", dir=cache_dir))
+    try:
+        with open(tmp_dir / "layout.txt", "w") as f:
+            f.writelines(store_layout[idx] for idx in station_indices)
+        for item in sorted(store_dir.iterdir()):
+            if item.is_file() and item.name != "layout.txt":
+                _link_into_model(item, tmp_dir / item.name, link_mode)
+        for new_idx, idx in enumerate(station_indices):
+            _link_into_model(
+                station_dirs[idx], tmp_dir / f"station{new_idx:03d}", link_mode
+            )
+        os.rename(tmp_dir, model_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not model_dir.is_dir():  # not just lost a race with another process
+            raise
+    return model_dir
+
+
+def resolve_telescope_configs(master_config: dict, project_root: Path) -> None:
+    """
+    Resolves telescope configs that select stations from the canonical station
+    store (iteration_parameters.station_store) into OSKAR model directories.
+
+    A telescope config may give either "oskar_input_directory" (used as is),
+    "subarray" (a name from station_store.subarrays) or "stations" (an explicit
+    index list/range string). For the latter two, the model is materialised
+    with materialise_subarray_model() and its path is stored in the config's
+    "oskar_input_directory", so all later steps see a regular model directory.
+
+    Raises:
+        ValueError: If a subarray is unknown or no station store is configured.
+    """
+    iter_params = master_config.get("iteration_parameters", {})
+    store_cfg = iter_params.get("station_store") or {}
+    subarrays = store_cfg.get("subarrays") or {}
+
+    for tel_cfg in iter_params.get("telescope_configs", []):
+        if "subarray" in tel_cfg:
+            if tel_cfg["subarray"] not in subarrays:
+                raise ValueError(
+                    f"Unknown subarray '{tel_cfg['subarray']}' for telescope '{tel_cfg.get('name')}'"
+                )
+            selection = subarrays[tel_cfg["subarray"]]
+        elif "stations" in tel_cfg:
+            selection = tel_cfg["stations"]
+        else:
+            continue
+
+        if not store_cfg.get("directory"):
+            raise ValueError(
+                f"Telescope '{tel_cfg.get('name')}' selects stations but no station_store.directory is configured"
+            )
+        name = tel_cfg.get("name", tel_cfg.get("subarray", "subarray"))
+        model_dir = materialise_subarray_model(
+            project_root / store_cfg["directory"],
+            parse_station_indices(selection),
+            Path(store_cfg.get("cache_directory", DEFAULT_MODEL_CACHE_DIR)),
+            name,
+            store_cfg.get("link_mode", "symlink"),
+        )
+        tel_cfg["oskar_input_directory"] = str(model_dir)
+        print(f"Telescope '{name}': materialised subarray model at {model_dir}")
+
+
+MAX_STATION_DISTANCE_M = 1.0e6  # from the array reference position
+MAX_ELEMENT_DISTANCE_M = 1.0e3  # from the station centre
+VALIDATION_MAX_EXAMPLES = 5
+
+
+def _format_examples(items: list) -> str:
+    shown = ", ".join(str(i) for i in items[:VALIDATION_MAX_EXAMPLES])
+    if len(items) > VALIDATION_MAX_EXAMPLES:
+        shown += f", ... ({len(items)} in total)"
+    return shown
+
+
+def validate_telescope_model(directory: Path) -> list:
+    """
+    Checks an OSKAR telescope model directory for problems that would make
+    OSKAR fail (or silently simulate the wrong array) after it has started.
+
+    Checks: every file parses as numbers; feed_angle.txt line counts match
+    their layout.txt; the number of station directories is 1 or matches the
+    stations in layout.txt; no station is empty; all values are finite;
+    reference position, station and element coordinates are within sane
+    ranges; no duplicate element positions within a station (to 1 mm); no
+    two stations whose footprints overlap. The checks on coordinates run
+    vectorised over the arrays of TelescopeModel.
+
+    Returns:
+        A list of problem descriptions (empty if the model is valid).
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return [f"{directory}: telescope model directory not found"]
+    try:
+        model = TelescopeModel.load(directory)
+    except (OSError, ValueError) as e:
+        return str(e).splitlines()
+
+    problems = []
+    n_dirs = len(model.station_names)
+    if n_dirs == 0:
+        problems.append(f"{directory}: no station directories")
+    elif n_dirs not in (1, model.n_stations):
+        problems.append(
+            f"{directory / 'layout.txt'}: {model.n_stations} stations, but {n_dirs} station directories"
+        )
+
+    per_station = model.elements_per_station
+    empty = np.flatnonzero(per_station == 0)
+    if len(empty):
+        problems.append(
+            f"{directory}: stations without elements: " + _format_examples([model.station_names[i] for i in empty])
+        )
+
+    for name, values in (
+        ("position.txt", model.position[None, :]),
+        ("layout.txt", model.station_enu),
+        ("station element layouts", model.element_enu),
+        ("feed angles", model.feed_angle_deg),
+    ):
+        bad_rows = np.flatnonzero(~np.isfinite(values).all(axis=1))
+        if len(bad_rows):
+            problems.append(f"{name}: non-finite values in rows {_format_examples(bad_rows.tolist())}")
+
+    lon, lat, alt = model.position
+    if not (-180.0 <= lon <= 360.0 and -90.0 <= lat <= 90.0 and -1.0e3 <= alt <= 1.0e4):
+        problems.append(
+            f"{directory / 'position.txt'}: implausible reference position (lon={lon}, lat={lat}, alt={alt})"
+        )
+
+    station_dist = np.linalg.norm(model.station_enu, axis=1)
+    far = np.flatnonzero(station_dist > MAX_STATION_DISTANCE_M)
+    if len(far):
+        problems.append(
+            f"{directory / 'layout.txt'}: stations more than {MAX_STATION_DISTANCE_M:g} m from the "
+            f"reference position (wrong units?): lines {_format_examples((far + 1).tolist())}"
+        )
+
+    if model.n_elements_total and len(empty) == 0:
+        station_of_element = np.repeat(np.arange(n_dirs), per_station)
+        element_dist = np.linalg.norm(model.element_enu, axis=1)
+        far = np.unique(station_of_element[element_dist > MAX_ELEMENT_DISTANCE_M])
+        if len(far):
+            problems.append(
+                f"{directory}: elements more than {MAX_ELEMENT_DISTANCE_M:g} m from their station centre in "
+                + _format_examples([model.station_names[i] for i in far])
+            )
+
+        # Duplicate element positions: identical (station, x, y, z) rows at 1 mm
+        keys = np.column_stack(
+            [station_of_element, np.round(model.element_enu * 1.0e3).astype(np.int64)]
+        )
+        _, first_index, counts = np.unique(keys, axis=0, return_index=True, return_counts=True)
+        dup = first_index[counts > 1]
+        if len(dup):
+            problems.append(
+                f"{directory}: duplicate element positions (within 1 mm) in "
+                + _format_examples(sorted({model.station_names[station_of_element[i]] for i in dup}))
+            )
+
+        # Station overlap: footprints (radius of the furthest element) intersect
+        element_radius = np.linalg.norm(model.element_enu[:, :2], axis=1)
+        if n_dirs == model.n_stations:
+            radius = np.maximum.reduceat(element_radius, model.element_offsets[:-1])
+        elif n_dirs == 1:
+            radius = np.full(model.n_stations, element_radius.max())
+        else:
+            radius = None
+        if radius is not None:
+            xy = model.station_enu[:, :2]
+            i, j = np.triu_indices(model.n_stations, k=1)
+            gap = np.linalg.norm(xy[i] - xy[j], axis=1) - (radius[i] + radius[j])
+            overlapping = np.flatnonzero(gap < 0)
+            if len(overlapping):
+                problems.append(
+                    f"{directory / 'layout.txt'}: overlapping stations (line pairs) "
+                    + _format_examples([f"{i[k] + 1}/{j[k] + 1}" for k in overlapping])
+                )
+
+    return problems
+
+
+def validate_telescope_configs(master_config: dict, project_root: Path) -> bool:
+    """
+    Validates the telescope model of every entry of telescope_configs and
+    prints a report.
+
+    Returns:
+        True if all models are valid.
+    """
+    print("\n=== Telescope Model Validation ===")
+    all_valid = True
+    checked = {}
+    for tel_cfg in master_config.get("iteration_parameters", {}).get("telescope_configs", []):
+        tel_dir = (project_root / tel_cfg["oskar_input_directory"]).resolve()
+        if tel_dir not in checked:
+            checked[tel_dir] = validate_telescope_model(tel_dir)
+        problems = checked[tel_dir]
+        name = tel_cfg.get("name", tel_dir.name)
+        if not problems:
+            counts = count_telescope_model(tel_dir)
+            print(f"  {name}: OK ({counts['n_stations']} stations, {counts['n_elements_total']} elements) [{tel_dir}]")
+            continue
+        all_valid = False
+        print(f"  {name}: {len(problems)} problem(s) [{tel_dir}]")
+        for problem in problems:
+            print(f"      - {problem}")
+    return all_valid
+
+
+# Config sections (and the per-run phase centre) that sweep axes may vary
+SWEEP_ROOTS = ("oskar_ini_defaults", "hyperdrive_settings", "wsclean_settings", "phase_centre")
+
+
+def _sweep_label_value(value) -> str:
+    return re.sub(r"[^A-Za-z0-9.+-]", "", str(value)) or "x"
+
+
+def parse_sweep_axes(sweep_cfg: dict) -> list:
+    """
+    Parses the axes of the sweep config section. Every axis is one of
+        {name, path, values: [...]}           one dotted path, one value per point
+        {name, zip: {path: [...], ...}}       several paths varied in lockstep
+        {name, list: [{path: value, ...}]}    explicit points setting several paths
+    and the axes are combined as a product with each other and with the
+    telescope x sky model x phase centre configs.
+
+    Returns:
+        A list of (axis name, points) tuples, where points is a list of
+        (label, overrides) tuples and overrides maps dotted paths to values.
+
+    Raises:
+        ValueError: If an axis is malformed or a path is outside SWEEP_ROOTS.
+    """
+    axes = []
+    for i, axis in enumerate((sweep_cfg or {}).get("axes", [])):
+        if "values" in axis:
+            paths = [axis.get("path")]
+            name = axis.get("name") or str(axis.get("path", "")).split(".")[-1]
+            points = [
+                (f"{name}-{_sweep_label_value(v)}", {axis.get("path"): v})
+                for v in axis["values"]
+            ]
+        elif "zip" in axis:
+            paths = list(axis["zip"])
+            lengths = {len(values) for values in axis["zip"].values()}
+            if len(lengths) > 1:
+                raise ValueError(f"Sweep axis {i}: zip lists have different lengths {sorted(lengths)}")
+            name = axis.get("name") or f"zip{i}"
+            points = [
+                (f"{name}-{j}", dict(zip(paths, values)))
+                for j, values in enumerate(zip(*axis["zip"].values()))
+            ]
+        elif "list" in axis:
+            paths = [p for entry in axis["list"] for p in entry]
+            name = axis.get("name") or f"list{i}"
+            points = [(f"{name}-{j}", dict(entry)) for j, entry in enumerate(axis["list"])]
+        else:
+            raise ValueError(f"Sweep axis {i} needs one of 'values', 'zip' or 'list'")
+
+        for path in paths:
+            if not path or str(path).split(".")[0] not in SWEEP_ROOTS or "." not in str(path):
+                raise ValueError(
+                    f"Sweep axis '{name}': path '{path}' must be a dotted path below one of {', '.join(SWEEP_ROOTS)}"
+                )
+        if not points:
+            raise ValueError(f"Sweep axis '{name}' has no values")
+        axes.append((name, points))
+    return axes
+
+
+def apply_config_overrides(config: dict, overrides: dict) -> dict:
+    """
+    Returns config with the dotted-path overrides applied. Only the dicts along
+    the overridden paths are copied; everything else is shared with config.
+    """
+    if not overrides:
+        return config
+    result = dict(config)
+    for path, value in overrides.items():
+        keys = path.split(".")
+        node = result
+        for key in keys[:-1]:
+            child = node.get(key)
+            child = dict(child) if isinstance(child, dict) else {}
+            node[key] = child
+            node = child
+        node[keys[-1]] = value
+    return result
+
+
+def _parse_sweep_selectors(selectors: list) -> list:
+    """Normalises include/exclude selectors to {key: set of str values}."""
+    return [
+        {
+            key: {str(v) for v in (wanted if isinstance(wanted, list) else [wanted])}
+            for key, wanted in selector.items()
+        }
+        for selector in selectors or []
+    ]
+
+
+def _sweep_point_matches(point: dict, selector: dict) -> bool:
+    """True if every key of a (normalised) include/exclude selector matches the point."""
+    return all(key in point and str(point[key]) in options for key, options in selector.items())
+
+
+def iter_sweep_points(master_config: dict):
+    """
+    Lazily expands the telescope x sky model x phase centre configs and the
+    axes of the sweep section into sweep points, applying its include/exclude
+    filters. Filters are lists of selectors {key: value or [values]}, where a
+    key is "telescope", "sky", "phase_centre" (matched against name, filename
+    and id), an axis name (matched against the point label) or a dotted path.
+    A point is kept if it matches any include selector (or none are given)
+    and no exclude selector.
+
+    Yields:
+        Tuples (tel_cfg, sky_cfg, pc_cfg, overrides, labels), where overrides
+        maps dotted paths to values and labels are the axis point labels.
+    """
+    iter_params = master_config.get("iteration_parameters", {})
+    sweep_cfg = master_config.get("sweep") or {}
+    axes = parse_sweep_axes(sweep_cfg)
+    includes = _parse_sweep_selectors(sweep_cfg.get("include"))
+    excludes = _parse_sweep_selectors(sweep_cfg.get("exclude"))
+
+    for tel_cfg, sky_cfg, pc_cfg, *axis_points in itertools.product(
+        iter_params.get("telescope_configs", []),
+        iter_params.get("sky_model_configs", []),
+        iter_params.get("phase_centre_configs", []),
+        *(points for _, points in axes),
+    ):
+        overrides = {}
+        for _, point_overrides in axis_points:
+            overrides.update(point_overrides)
+        labels = [label for label, _ in axis_points]
+
+        if includes or excludes:
+            point = {
+                "telescope": tel_cfg.get("name"),
+                "sky": sky_cfg.get("filename"),
+                "phase_centre": pc_cfg.get("id"),
+                **overrides,
+            }
+            for (name, _), label in zip(axes, labels):
+                point[name] = label[len(name) + 1:]
+            if includes and not any(_sweep_point_matches(point, sel) for sel in includes):
+                continue
+            if any(_sweep_point_matches(point, sel) for sel in excludes):
+                continue
+        yield tel_cfg, sky_cfg, pc_cfg, overrides, labels
+
+
+def iter_run_specs(master_config: dict):
+    """
+    Lazily yields one run specification per sweep point (see
+    iter_sweep_points()). Without a sweep section these are the runs of the
+    telescope x sky model x phase centre product.
+
+    Yields:
+        Dictionaries holding the run number, a label, the telescope/sky/phase
+        centre configs, the run's output directory and "config", the master
+        config with the point's overrides applied (the master config itself
+        if there are none). Overrides of "phase_centre.*" paths are applied
+        to the run's copy of the phase centre config instead.
+    """
+    run_settings = master_config.get("run_settings", {})
+    output_cfg = master_config.get("output_config", {})
+
+    base_output_dir = Path(
+        output_cfg.get("base_output_directory", "simulation_outputs_generated")
+    )
+    images_folder_pattern = output_cfg.get(
+        "images_folder_pattern",
+        "images_{sky_name_no_ext}_{tel_name}{error_suffix}_{pc_id}{sweep_suffix}",
+    )
+    if "{sweep_suffix}" not in images_folder_pattern:
+        # Keep sweep points apart even with an older folder pattern
+        images_folder_pattern += "{sweep_suffix}"
+
+    is_errors_globally_on = run_settings.get("include_telescope_errors", False)
+    error_suffix = "_errors_on" if is_errors_globally_on else "_errors_off"
+
+    points = iter_sweep_points(master_config)
+    for run_counter, (tel_cfg, sky_cfg, pc_cfg, overrides, labels) in enumerate(points, start=1):
+        config_overrides = {}
+        for path, value in overrides.items():
+            if path.startswith("phase_centre."):
+                pc_cfg = apply_config_overrides(pc_cfg, {path.split(".", 1)[1]: value})
+            else:
+                config_overrides[path] = value
+
+        tel_name = tel_cfg.get("name", "unknown_tel")
+        sky_filename = sky_cfg.get("filename", "unknown_sky.osm")
+        pc_id = pc_cfg.get("id", "unknown_pc")
+        sweep_suffix = "".join(f"_{label}" for label in labels)
+
+        current_run_images_folder_name = images_folder_pattern.format(
+            sky_name_no_ext=get_sky_model_name_no_ext(sky_filename),
+            tel_name=tel_name,
+            error_suffix=error_suffix,
+            pc_id=pc_id,
+            sweep_suffix=sweep_suffix,
+        )
+        label = f"{tel_name}/{sky_filename}/{pc_id}"
+        if labels:
+            label += f" [{', '.join(labels)}]"
+        yield {
+            "run_id": run_counter,
+            "label": label,
+            "tel_cfg": tel_cfg,
+            "sky_cfg": sky_cfg,
+            "pc_cfg": pc_cfg,
+            "output_dir": base_output_dir / current_run_images_folder_name,
+            "config": apply_config_overrides(master_config, config_overrides),
+        }
+
+
+@dataclasses.dataclass
+class Step:
+    """
+    A single node of the step dependency graph.
+
+    Attributes:
+        step_id: Unique identifier of the step within the campaign (e.g. "3:interf").
+        run_id: The run this step belongs to (used for scheduling priority and summaries).
+        name: Short step name ("beam", "interf", "calibrate", "plot", "apply").
+        action: Zero-argument callable executing the step; returns True on success.
+        deps: step_ids that must have succeeded before this step may start.
+        status: One of "pending", "running", "succeeded", "failed", "skipped".
+        start_time / end_time: Wall-clock timestamps set by the scheduler.
+        exit_code: Exit code of the step's child process, if it launched one.
+        outputs: Absolute paths of the outputs the step produced.
+        cached: True if the step was satisfied from the step cache.
+        progress / progress_time: Last parsed progress fraction and when it was seen.
+        last_output_time: When the step's child process last produced output.
+        resources: Resource-usage records of the child processes the step ran.
+        cost_features: Size features used by the CostModel (see estimate_step_features()).
+        disk_bytes: Expected size of the step's output on disk (for DiskSpaceGate).
+    """
+
+    step_id: str
+    run_id: int
+    name: str
+    action: Callable[[], bool]
+    deps: list = dataclasses.field(default_factory=list)
+    status: str = "pending"
+    start_time: Optional[datetime.datetime] = None
+    end_time: Optional[datetime.datetime] = None
+    exit_code: Optional[int] = None
+    outputs: list = dataclasses.field(default_factory=list)
+    cached: bool = False
+    progress: Optional[float] = None
+    progress_time: Optional[datetime.datetime] = None
+    last_output_time: Optional[datetime.datetime] = None
+    resources: list = dataclasses.field(default_factory=list)
+    cost_features: dict = dataclasses.field(default_factory=dict)
+    disk_bytes: int = 0
+
+
+def realisations_enabled(master_config: dict, pc_cfg: dict) -> bool:
+    """
+    Whether the telescope errors of a run are applied post hoc as error
+    realisations (see error_realisations in the config) instead of by OSKAR.
+    """
+    if not master_config.get("error_realisations", {}).get("enabled", False):
+        return False
+    if not master_config.get("run_settings", {}).get("include_telescope_errors", False):
+        return False
+    return (
+        float(pc_cfg.get("gain_error_std", 0.0)) > 0.0
+        or float(pc_cfg.get("phase_error_std", 0.0)) > 0.0
+    )
+
+
+def draw_station_gains(
+    rng: np.random.Generator,
+    n_times: int,
+    n_stations: int,
+    gain_std: float,
+    phase_std_deg: float,
+) -> np.ndarray:
+    """
+    Draws direction-independent complex station gains
+        g = (1 + N(0, gain_std)) * exp(i * N(0, phase_std_deg) [deg])
+    independently per time step, station and polarisation (X, Y).
+
+    Returns:
+        A complex array of shape (n_times, n_stations, 2).
+    """
+    shape = (n_times, n_stations, 2)
+    amplitude = 1.0 + gain_std * rng.standard_normal(shape)
+    phase = np.deg2rad(phase_std_deg) * rng.standard_normal(shape)
+    return amplitude * np.exp(1j * phase)
+
+
+# Polarisation of station p / station q for each correlation (XX, XY, YX, YY)
+_CORR_POLS = {
+    4: (np.array([0, 0, 1, 1]), np.array([0, 1, 0, 1])),
+    2: (np.array([0, 1]), np.array([0, 1])),
+    1: (np.array([0]), np.array([0])),
+}
+
+
+def corrupt_visibilities(vis: np.ndarray, gains_p: np.ndarray, gains_q: np.ndarray) -> np.ndarray:
+    """
+    Applies station gains to a block of visibilities: V'_pq = g_p V_pq conj(g_q).
+
+    Args:
+        vis: Visibilities of shape (n_rows, n_channels, n_corr), n_corr in (1, 2, 4).
+        gains_p: Gains (n_rows, 2) of the first station (ANTENNA1) of each row.
+        gains_q: Gains (n_rows, 2) of the second station (ANTENNA2) of each row.
+    """
+    pol_p, pol_q = _CORR_POLS[vis.shape[2]]
+    factor = gains_p[:, pol_p] * np.conj(gains_q[:, pol_q])
+    return vis * factor[:, None, :]
+
+
+def run_error_realisations(
+    ms_path: Path,
+    run_dir: Path,
+    realisations_cfg: dict,
+    gain_std: float,
+    phase_std_deg: float,
+    is_dry_run: bool,
+    prefix: str = "",
+) -> bool:
+    """
+    Writes Monte Carlo telescope error realisations of an error-free
+    Measurement Set. Each realisation is a copy of the MS whose DATA column is
+    corrupted with its own seeded draw of station gains (draw_station_gains()),
+    processed in blocks of chunk_rows rows x chunk_channels channels. The gains
+    of realisation i are saved next to its MS as <ms>.gains.npy, with shape
+    (n_times, n_stations, 2).
+
+    Args:
+        ms_path: The error-free Measurement Set.
+        run_dir: The run directory that error_realisations.ms_pattern is relative to.
+        realisations_cfg: The error_realisations section of the config.
+        gain_std: Standard deviation of the station gain amplitude (relative).
+        phase_std_deg: Standard deviation of the station gain phase in degrees.
+        is_dry_run: If True, only print what would be done.
+        prefix: Prefix for console messages.
+
+    Returns:
+        True if all realisations were written.
+    """
+    count = int(realisations_cfg.get("count", 1))
+    seed = int(realisations_cfg.get("seed", 0))
+    pattern = realisations_cfg.get("ms_pattern", "realisations/sim_{index:04d}.ms")
+    chunk_rows = int(realisations_cfg.get("chunk_rows", 50000))
+    chunk_channels = int(realisations_cfg.get("chunk_channels", 64))
+
+    if is_dry_run:
+        print(
+            f"    {prefix} [DRY RUN] Would write {count} error realisations of {ms_path} "
+            f"(gain std {gain_std}, phase std {phase_std_deg} deg) to {run_dir / pattern}"
+        )
+        return True
+
+    try:
+        import casacore.tables as pt
+    except ImportError:
+        print(f"    {prefix} ERROR: Error realisations need python-casacore (pip install python-casacore)")
+        return False
+
+    try:
+        with pt.table(str(ms_path), ack=False) as base:
+            times = base.getcol("TIME")
+            n_rows = base.nrows()
+        with pt.table(str(ms_path / "ANTENNA"), ack=False) as antennas:
+            n_stations = antennas.nrows()
+        unique_times = np.unique(times)
+        del times
+
+        for index in range(count):
+            out_ms = Path(run_dir) / pattern.format(index=index)
+            rng = np.random.default_rng([seed, index])
+            gains = draw_station_gains(rng, len(unique_times), n_stations, gain_std, phase_std_deg)
+
+            out_ms.parent.mkdir(parents=True, exist_ok=True)
+            if out_ms.exists():
+                shutil.rmtree(out_ms)
+            tmp_ms = out_ms.with_name(f".{out_ms.name}.tmp")
+            if tmp_ms.exists():
+                shutil.rmtree(tmp_ms)
+            shutil.copytree(ms_path, tmp_ms, symlinks=True)
+
+            with pt.table(str(tmp_ms), readonly=False, ack=False) as out:
+                n_chan, n_corr = out.getcell("DATA", 0).shape if n_rows else (0, 0)
+                for row0 in range(0, n_rows, chunk_rows):
+                    nrow = min(chunk_rows, n_rows - row0)
+                    time_idx = np.searchsorted(unique_times, out.getcol("TIME", row0, nrow))
+                    gains_p = gains[time_idx, out.getcol("ANTENNA1", row0, nrow)]
+                    gains_q = gains[time_idx, out.getcol("ANTENNA2", row0, nrow)]
+                    for chan0 in range(0, n_chan, chunk_channels):
+                        chan1 = min(chan0 + chunk_channels, n_chan) - 1
+                        blc, trc = [chan0, 0], [chan1, n_corr - 1]
+                        vis = out.getcolslice("DATA", blc, trc, [], row0, nrow)
+                        out.putcolslice(
+                            "DATA", corrupt_visibilities(vis, gains_p, gains_q), blc, trc, [], row0, nrow
+                        )
+            os.rename(tmp_ms, out_ms)
+            np.save(out_ms.with_name(out_ms.name + ".gains.npy"), gains)
+            print(f"    {prefix} Wrote error realisation {index + 1}/{count}: {out_ms}")
+    except (OSError, RuntimeError) as e:
+        print(f"    {prefix} ERROR: Writing error realisations of {ms_path} failed: {e}")
+        return False
+    return True
+
+
+def plan_frequency_subbands(
+    start_frequency_hz: float, frequency_inc_hz: float, num_channels: int, n_subbands: int
+) -> list:
+    """
+    Splits an observation's channels into (at most) n_subbands contiguous,
+    near-equal sub-bands.
+
+    Returns:
+        A list of observation settings {"start_frequency_hz", "num_channels"},
+        one per sub-band, with the values formatted for an OSKAR INI.
+    """
+    num_channels = int(num_channels)
+    n_subbands = max(1, min(int(n_subbands), num_channels))
+    subbands = []
+    first_channel = 0
+    for channels in np.array_split(np.arange(num_channels), n_subbands):
+        start = float(start_frequency_hz) + first_channel * float(frequency_inc_hz)
+        subbands.append({"start_frequency_hz": f"{start:.15g}", "num_channels": len(channels)})
+        first_channel += len(channels)
+    return subbands
+
+
+_UTC_FORMATS = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M:%S.%f", "%d-%m-%Y %H:%M:%S")
+
+
+def _parse_utc(value: str) -> datetime.datetime:
+    for fmt in _UTC_FORMATS:
+        try:
+            return datetime.datetime.strptime(str(value).strip(), fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unsupported start_time_utc '{value}' (expected 'YYYY-MM-DD hh:mm:ss[.sss]')")
+
+
+def _parse_duration_sec(value) -> float:
+    """Parses an OSKAR observation length: seconds, or 'hh:mm:ss[.s]'."""
+    text = str(value).strip()
+    if ":" not in text:
+        return float(text)
+    hours, minutes, seconds = text.split(":")
+    return int(hours) * 3600.0 + int(minutes) * 60.0 + float(seconds)
+
+
+def _format_duration_hms(seconds: float) -> str:
+    hours, rest = divmod(seconds, 3600.0)
+    minutes, rest = divmod(rest, 60.0)
+    return f"{int(hours):02d}:{int(minutes):02d}:{rest:06.3f}"
+
+
+def plan_time_chunks(start_time_utc: str, length, num_time_steps: int, n_chunks: int) -> list:
+    """
+    Splits an observation's time steps into (at most) n_chunks contiguous,
+    near-equal chunks on the same time grid (step = length / num_time_steps).
+
+    Returns:
+        A list of observation settings {"start_time_utc", "length",
+        "num_time_steps"}, one per chunk, formatted for an OSKAR INI.
+
+    Raises:
+        ValueError: If the start time or length cannot be parsed.
+    """
+    num_time_steps = int(num_time_steps)
+    n_chunks = max(1, min(int(n_chunks), num_time_steps))
+    if n_chunks == 1:
+        return [{}]
+    start = _parse_utc(start_time_utc)
+    step_sec = _parse_duration_sec(length) / num_time_steps
+    chunks = []
+    first_step = 0
+    for steps in np.array_split(np.arange(num_time_steps), n_chunks):
+        chunk_start = start + datetime.timedelta(seconds=first_step * step_sec)
+        chunks.append(
+            {
+                "start_time_utc": chunk_start.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                "length": _format_duration_hms(len(steps) * step_sec),
+                "num_time_steps": len(steps),
+            }
+        )
+        first_step += len(steps)
+    return chunks
+
+
+def _replace_array_column(table, column: str, cell_shape: list, dminfo: dict = None) -> None:
+    """Replaces a fixed-shape array column by an empty one with a new cell shape."""
+    import casacore.tables as pt
+
+    desc = table.getcoldesc(column)
+    table.removecols(column)
+    desc["shape"] = list(cell_shape)
+    desc["ndim"] = len(cell_shape)
+    desc["option"] = 4  # FixedShape
+    desc.pop("dataManagerType", None)
+    desc.pop("dataManagerGroup", None)
+    table.addcols(pt.maketabdesc(pt.makecoldesc(column, desc)), dminfo or {})
+
+
+def concat_ms_channels(ms_paths: list, out_ms: Path, chunk_rows: int = 20000) -> None:
+    """
+    Concatenates Measurement Sets of contiguous frequency sub-bands (same rows:
+    times and baselines, one spectral window each) into one MS along the
+    channel axis. The output is a copy of the first MS with every per-channel
+    column (DATA, FLAG, WEIGHT_SPECTRUM, ...) widened and filled in blocks of
+    chunk_rows rows, and its SPECTRAL_WINDOW updated to the full band.
+
+    Raises:
+        ImportError: If python-casacore is not installed.
+        ValueError: If the inputs do not have matching rows.
+        RuntimeError: On casacore errors.
+    """
+    import casacore.tables as pt
+
+    out_ms = Path(out_ms)
+    tmp_ms = out_ms.with_name(f".{out_ms.name}.tmp")
+    if tmp_ms.exists():
+        shutil.rmtree(tmp_ms)
+
+    inputs = [pt.table(str(p), ack=False) for p in ms_paths]
+    try:
+        n_rows = inputs[0].nrows()
+        for path, t in zip(ms_paths, inputs):
+            if t.nrows() != n_rows:
+                raise ValueError(f"{path} has {t.nrows()} rows, {ms_paths[0]} has {n_rows}")
+        spws = []
+        for path in ms_paths:
+            with pt.table(str(Path(path) / "SPECTRAL_WINDOW"), ack=False) as spw:
+                spws.append({c: spw.getcol(c) for c in ("CHAN_FREQ", "CHAN_WIDTH", "EFFECTIVE_BW", "RESOLUTION")})
+        n_chan_first = spws[0]["CHAN_FREQ"].shape[1]
+        total_chan = sum(s["CHAN_FREQ"].shape[1] for s in spws)
+
+        spectral_columns = []
+        for column in inputs[0].colnames():
+            try:
+                shape = np.shape(inputs[0].getcell(column, 0)) if n_rows else ()
+            except RuntimeError:  # undefined cells, e.g. FLAG_CATEGORY
+                continue
+            if len(shape) == 2 and shape[0] == n_chan_first:
+                spectral_columns.append((column, shape[1]))
+
+        inputs[0].copy(str(tmp_ms), deep=True, valuecopy=True).close()
+        with pt.table(str(tmp_ms), readonly=False, ack=False) as out:
+            for column, n_corr in spectral_columns:
+                _replace_array_column(
+                    out,
+                    column,
+                    [total_chan, n_corr],
+                    {
+                        "TYPE": "TiledColumnStMan",
+                        "NAME": f"{column}_tiled",
+                        "SPEC": {"DEFAULTTILESHAPE": np.array([n_corr, min(total_chan, 64), 128], dtype=np.int32)},
+                    },
+                )
+            for row0 in range(0, n_rows, chunk_rows):
+                nrow = min(chunk_rows, n_rows - row0)
+                reference = [inputs[0].getcol(c, row0, nrow) for c in ("TIME", "ANTENNA1", "ANTENNA2")]
+                for path, t in zip(ms_paths[1:], inputs[1:]):
+                    for c, ref in zip(("TIME", "ANTENNA1", "ANTENNA2"), reference):
+                        if not np.array_equal(t.getcol(c, row0, nrow), ref):
+                            raise ValueError(f"{path}: {c} of rows {row0}-{row0 + nrow - 1} differs from {ms_paths[0]}")
+                for column, _ in spectral_columns:
+                    out.putcol(
+                        column,
+                        np.concatenate([t.getcol(column, row0, nrow) for t in inputs], axis=1),
+                        row0,
+                        nrow,
+                    )
+
+        with pt.table(str(tmp_ms / "SPECTRAL_WINDOW"), readonly=False, ack=False) as spw:
+            for column in ("CHAN_FREQ", "CHAN_WIDTH", "EFFECTIVE_BW", "RESOLUTION"):
+                values = np.concatenate([s[column] for s in spws], axis=1)
+                if "shape" in spw.getcoldesc(column):
+                    _replace_array_column(spw, column, [total_chan])
+                spw.putcol(column, values)
+            spw.putcol("NUM_CHAN", np.full(spw.nrows(), total_chan, dtype=np.int32))
+            spw.putcol("TOTAL_BANDWIDTH", np.abs(spw.getcol("CHAN_WIDTH")).sum(axis=1))
+    finally:
+        for t in inputs:
+            t.close()
+
+    if out_ms.exists():
+        shutil.rmtree(out_ms)
+    os.rename(tmp_ms, out_ms)
+
+
+def concat_ms_time(ms_paths: list, out_ms: Path) -> None:
+    """
+    Concatenates Measurement Sets of consecutive time chunks (same stations
+    and channels, given in time order) into one MS by appending the rows of
+    each chunk to a copy of the first. The OBSERVATION time range is updated
+    to the full track.
+
+    Raises:
+        ImportError: If python-casacore is not installed.
+        ValueError: If the chunks have different channel/polarisation shapes.
+        RuntimeError: On casacore errors.
+    """
+    import casacore.tables as pt
+
+    out_ms = Path(out_ms)
+    tmp_ms = out_ms.with_name(f".{out_ms.name}.tmp")
+    if tmp_ms.exists():
+        shutil.rmtree(tmp_ms)
+
+    with pt.table(str(ms_paths[0]), ack=False) as first:
+        first.copy(str(tmp_ms), deep=True, valuecopy=True).close()
+    time_range = None
+    with pt.table(str(tmp_ms), readonly=False, ack=False) as out:
+        cell_shape = np.shape(out.getcell("DATA", 0)) if out.nrows() else None
+        for path in ms_paths[1:]:
+            with pt.table(str(path), ack=False) as chunk:
+                if chunk.nrows() == 0:
+                    continue
+                shape = np.shape(chunk.getcell("DATA", 0))
+                if cell_shape is not None and shape != cell_shape:
+                    raise ValueError(f"{path}: DATA cells have shape {shape}, {ms_paths[0]} has {cell_shape}")
+                cell_shape = shape
+                chunk.copyrows(out)
+        if out.nrows():
+            times = out.getcol("TIME")
+            half_interval = out.getcol("INTERVAL") / 2.0
+            time_range = [float((times - half_interval).min()), float((times + half_interval).max())]
+    if time_range is not None:
+        with pt.table(str(tmp_ms / "OBSERVATION"), readonly=False, ack=False) as obs:
+            if obs.nrows():
+                obs.putcol("TIME_RANGE", np.tile(time_range, (obs.nrows(), 1)))
+
+    if out_ms.exists():
+        shutil.rmtree(out_ms)
+    os.rename(tmp_ms, out_ms)
+
+
+def sum_ms_visibilities(ms_paths: list, out_ms: Path, chunk_rows: int = 20000) -> None:
+    """
+    Sums Measurement Sets simulated from disjoint parts of one sky model (same
+    rows, channels and polarisations) into one MS: a copy of the first with its
+    visibility columns (DATA, and MODEL_DATA / CORRECTED_DATA if present)
+    replaced by the sum over all inputs, accumulated in double precision in
+    blocks of chunk_rows rows.
+
+    Raises:
+        ImportError: If python-casacore is not installed.
+        ValueError: If the inputs do not have matching rows or cell shapes.
+        RuntimeError: On casacore errors.
+    """
+    import casacore.tables as pt
+
+    out_ms = Path(out_ms)
+    tmp_ms = out_ms.with_name(f".{out_ms.name}.tmp")
+    if tmp_ms.exists():
+        shutil.rmtree(tmp_ms)
+
+    inputs = [pt.table(str(p), ack=False) for p in ms_paths]
+    try:
+        n_rows = inputs[0].nrows()
+        for path, t in zip(ms_paths, inputs):
+            if t.nrows() != n_rows:
+                raise ValueError(f"{path} has {t.nrows()} rows, {ms_paths[0]} has {n_rows}")
+        data_columns = [
+            c for c in ("DATA", "MODEL_DATA", "CORRECTED_DATA") if c in inputs[0].colnames()
+        ]
+        inputs[0].copy(str(tmp_ms), deep=True, valuecopy=True).close()
+        with pt.table(str(tmp_ms), readonly=False, ack=False) as out:
+            for row0 in range(0, n_rows, chunk_rows):
+                nrow = min(chunk_rows, n_rows - row0)
+                reference = [inputs[0].getcol(c, row0, nrow) for c in ("TIME", "ANTENNA1", "ANTENNA2")]
+                for path, t in zip(ms_paths[1:], inputs[1:]):
+                    for c, ref in zip(("TIME", "ANTENNA1", "ANTENNA2"), reference):
+                        if not np.array_equal(t.getcol(c, row0, nrow), ref):
+                            raise ValueError(f"{path}: {c} of rows {row0}-{row0 + nrow - 1} differs from {ms_paths[0]}")
+                for column in data_columns:
+                    first = inputs[0].getcol(column, row0, nrow)
+                    total = first.astype(np.complex128)
+                    for path, t in zip(ms_paths[1:], inputs[1:]):
+                        part = t.getcol(column, row0, nrow)
+                        if part.shape != total.shape:
+                            raise ValueError(f"{path}: {column} has shape {part.shape[1:]}, {ms_paths[0]} has {total.shape[1:]}")
+                        total += part
+                    out.putcol(column, total.astype(first.dtype), row0, nrow)
+    finally:
+        for t in inputs:
+            t.close()
+
+    if out_ms.exists():
+        shutil.rmtree(out_ms)
+    os.rename(tmp_ms, out_ms)
+
+
+def concat_fits_frequency(fits_paths: list, out_path: Path) -> None:
+    """
+    Concatenates FITS images of contiguous frequency sub-bands (e.g. OSKAR
+    beam pattern cubes) along their FREQ axis (the last axis if none is
+    labelled FREQ). The header, including the frequency reference, is taken
+    from the first (lowest) sub-band.
+
+    Raises:
+        ImportError: If astropy is not installed.
+        ValueError: If the images do not match apart from the frequency axis.
+    """
+    from astropy.io import fits
+
+    header = fits.getheader(fits_paths[0])
+    naxis = header["NAXIS"]
+    freq_axis = next(
+        (i for i in range(1, naxis + 1) if str(header.get(f"CTYPE{i}", "")).upper().startswith("FREQ")),
+        naxis,
+    )
+    # FITS axis n is NumPy axis NAXIS - n
+    data = np.concatenate([fits.getdata(p) for p in fits_paths], axis=naxis - freq_axis)
+    tmp_path = Path(out_path).with_name(f".{Path(out_path).name}.tmp")
+    fits.PrimaryHDU(data, header).writeto(tmp_path, overwrite=True)
+    os.replace(tmp_path, out_path)
+
+
+def run_chunk_concat(
+    chunk_dirs: list,
+    out_dir: Path,
+    names: list,
+    axis: str,
+    chunk_rows: int,
+    is_dry_run: bool,
+    prefix: str = "",
+) -> bool:
+    """
+    Concatenates the outputs of the chunks of a split run into out_dir.
+
+    Along "frequency" (sub-bands) every name ending in .ms is concatenated
+    with concat_ms_channels() and .fits with concat_fits_frequency(); along
+    "time" (time chunks, in time order) .ms outputs with concat_ms_time();
+    along "sky" (sky model partitions) the .ms outputs are summed with
+    sum_ms_visibilities().
+
+    Returns:
+        True on success.
+    """
+    if is_dry_run:
+        print(
+            f"    {prefix} [DRY RUN] Would concatenate {', '.join(names) or 'outputs'} "
+            f"of {len(chunk_dirs)} {axis} chunks into {out_dir}"
+        )
+        return True
+    if not names:
+        print(f"    {prefix} ERROR: No chunk outputs found in {chunk_dirs[0]}")
+        return False
+
+    try:
+        for name in names:
+            inputs = [Path(d) / name for d in chunk_dirs]
+            missing = [str(p) for p in inputs if not p.exists()]
+            if missing:
+                raise ValueError(f"missing chunk outputs: {', '.join(missing)}")
+            if name.endswith(".ms") and axis == "frequency":
+                concat_ms_channels(inputs, Path(out_dir) / name, chunk_rows)
+            elif name.endswith(".ms") and axis == "time":
+                concat_ms_time(inputs, Path(out_dir) / name)
+            elif name.endswith(".ms") and axis == "sky":
+                sum_ms_visibilities(inputs, Path(out_dir) / name, chunk_rows)
+            elif name.endswith(".fits") and axis == "frequency":
+                concat_fits_frequency(inputs, Path(out_dir) / name)
+            else:
+                raise ValueError(f"don't know how to concatenate '{name}' along {axis}")
+            action = "Summed" if axis == "sky" else "Concatenated"
+            print(f"    {prefix} {action} {len(inputs)} {axis} chunks into {Path(out_dir) / name}")
+    except ImportError as e:
+        print(f"    {prefix} ERROR: Concatenating chunks needs python-casacore and astropy: {e}")
+        return False
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"    {prefix} ERROR: Concatenating chunks failed: {e}")
+        return False
+    return True
+
+
+SPEED_OF_LIGHT_M_S = 299792458.0
+EARTH_ROTATION_RAD_S = 7.2921150e-5
+MJD_UNIX_EPOCH_SEC = 40587.0 * 86400.0  # MJD of 1970-01-01, in seconds
+WGS84_A_M = 6378137.0
+WGS84_F = 1.0 / 298.257223563
+DFT_BACKEND_VERSION = "numpy-dft-1"
+INTERF_BACKENDS = ("oskar", "oskar-python", "dft")
+ARRAY_FACTOR_BEAM_VERSION = "numpy-array-factor-2"
+BEAM_BACKENDS = ("oskar", "array-factor")
+
+
+def observation_time_grid(start_time_utc, length, num_time_steps: int):
+    """
+    Returns (mjd_sec, dt_sec): the centres of the num_time_steps integrations
+    of an observation as UTC MJD seconds (the Measurement Set TIME
+    convention), and the integration length.
+    """
+    n_times = max(1, int(num_time_steps))
+    dt = _parse_duration_sec(length) / n_times
+    start_sec = (_parse_utc(start_time_utc) - datetime.datetime(1970, 1, 1)).total_seconds()
+    return MJD_UNIX_EPOCH_SEC + start_sec + (np.arange(n_times) + 0.5) * dt, dt
+
+
+def enu_to_equatorial_xyz(enu: np.ndarray, lat_deg: float) -> np.ndarray:
+    """
+    Rotates local (east, north, up) offsets in metres at latitude lat_deg into
+    the equatorial frame used for uvw: X towards hour angle 0 on the celestial
+    equator, Y towards hour angle -6h (east), Z towards the celestial pole.
+    """
+    lat = np.radians(lat_deg)
+    e, n, u = np.asarray(enu, dtype=np.float64)[..., :3].T
+    return np.stack(
+        [-np.sin(lat) * n + np.cos(lat) * u, e, np.cos(lat) * n + np.sin(lat) * u], axis=-1
+    )
+
+
+def station_uvw(xyz: np.ndarray, ha_deg, dec0_deg: float) -> np.ndarray:
+    """
+    uvw coordinates in metres of positions xyz (N, 3) in the equatorial frame
+    (see enu_to_equatorial_xyz()) for hour angles ha_deg (T,) of a phase
+    centre at declination dec0_deg; returns (T, N, 3). A baseline's uvw is the
+    difference of its two stations' (second minus first, the Measurement Set
+    convention), so per-station uvw is all that has to be evaluated.
+    """
+    ha = np.radians(np.atleast_1d(ha_deg))[:, None]
+    dec0 = np.radians(dec0_deg)
+    x, y, z = (np.asarray(xyz)[None, :, i] for i in range(3))
+    sin_ha, cos_ha = np.sin(ha), np.cos(ha)
+    u = sin_ha * x + cos_ha * y
+    v = -np.sin(dec0) * cos_ha * x + np.sin(dec0) * sin_ha * y + np.cos(dec0) * z
+    w = np.cos(dec0) * cos_ha * x - np.cos(dec0) * sin_ha * y + np.sin(dec0) * z
+    return np.stack([u, v, w], axis=-1)
+
+
+def enu_to_ecef(enu: np.ndarray, lon_deg: float, lat_deg: float, alt_m: float) -> np.ndarray:
+    """ITRF/ECEF (WGS84) positions in metres of (east, north, up) offsets from a geodetic reference point."""
+    lon, lat = np.radians(lon_deg), np.radians(lat_deg)
+    e2 = WGS84_F * (2.0 - WGS84_F)
+    radius = WGS84_A_M / np.sqrt(1.0 - e2 * np.sin(lat) ** 2)
+    origin = np.array([
+        (radius + alt_m) * np.cos(lat) * np.cos(lon),
+        (radius + alt_m) * np.cos(lat) * np.sin(lon),
+        (radius * (1.0 - e2) + alt_m) * np.sin(lat),
+    ])
+    e, n, u = np.asarray(enu, dtype=np.float64)[..., :3].T
+    offsets = np.stack([
+        -np.sin(lon) * e - np.sin(lat) * np.cos(lon) * n + np.cos(lat) * np.cos(lon) * u,
+        np.cos(lon) * e - np.sin(lat) * np.sin(lon) * n + np.cos(lat) * np.sin(lon) * u,
+        np.cos(lat) * n + np.sin(lat) * u,
+    ], axis=-1)
+    return origin + offsets
+
+
+def source_lmn(ra_deg, dec_deg, ra0_deg: float, dec0_deg: float) -> np.ndarray:
+    """Direction cosines (l, m, n) of sources relative to a phase centre; returns (S, 3)."""
+    ra, dec = np.radians(ra_deg), np.radians(dec_deg)
+    ra0, dec0 = np.radians(ra0_deg), np.radians(dec0_deg)
+    l = np.cos(dec) * np.sin(ra - ra0)
+    m = np.sin(dec) * np.cos(dec0) - np.cos(dec) * np.sin(dec0) * np.cos(ra - ra0)
+    n = np.sin(dec) * np.sin(dec0) + np.cos(dec) * np.cos(dec0) * np.cos(ra - ra0)
+    return np.stack([l, m, n], axis=-1)
+
+
+def predict_visibilities_dft(
+    uvw: np.ndarray,
+    sources: np.ndarray,
+    ra0_deg: float,
+    dec0_deg: float,
+    lat_deg: float,
+    lst_deg: np.ndarray,
+    frequencies_hz: np.ndarray,
+    max_chunk_bytes: int = 256 * 1024 ** 2,
+):
+    """
+    Predicts the cross-correlation visibilities of a point-source sky with a
+    direct Fourier transform, assuming ideal (unit, unpolarised) station
+    beams, no bandwidth/time smearing and no Faraday rotation:
+        V_pq = sum_s B_s exp(-2 pi i f/c (uvw_q - uvw_p) . (l, m, n - 1)_s)
+    with B the linear-feed brightness (XX = I + Q, XY = U + iV, YX = U - iV,
+    YY = I - Q), Stokes scaled by (f / ref_freq_hz) ** spectral_index, and
+    sources below the horizon at a time step left out (as OSKAR does).
+
+    The sum over sources is evaluated per station rather than per baseline:
+    with K_p = exp(-2 pi i f/c uvw_p . lmn') the visibility matrix is
+    K^H diag(B) K, a batched matrix product, so the cost is
+    O(times x channels x sources x stations^2) and the transcendental work
+    only O(times x channels x sources x stations). Times, channels and
+    sources are processed in chunks so that the temporaries stay within
+    about max_chunk_bytes.
+
+    Args:
+        uvw: (T, N, 3) station uvw in metres, from station_uvw().
+        sources: Structured array from load_sky_model().
+        ra0_deg, dec0_deg: Phase centre.
+        lat_deg: Array latitude, for the horizon test.
+        lst_deg: (T,) local sidereal time of each time step.
+        frequencies_hz: (C,) channel centre frequencies.
+        max_chunk_bytes: Memory budget of the temporaries.
+
+    Yields:
+        (t0, t1, vis): complex64 visibilities of time steps t0..t1-1, shape
+        (t1 - t0, n_baselines, C, 4), baselines ordered (0, 1), (0, 2), ...
+    """
+    n_times, n_stations, _ = uvw.shape
+    n_chan = len(frequencies_hz)
+    n_src = len(sources)
+    ant1, ant2 = np.triu_indices(n_stations, 1)
+    names = sources.dtype.names
+
+    def _column(name):
+        return sources[name] if name in names else np.zeros(n_src)
+
+    stokes = np.stack([_column(c) for c in ("stokes_i", "stokes_q", "stokes_u", "stokes_v")])
+    brightness = np.stack([
+        stokes[0] + stokes[1],
+        stokes[2] + 1j * stokes[3],
+        stokes[2] - 1j * stokes[3],
+        stokes[0] - stokes[1],
+    ])  # (4, S)
+    ref_freq, spix = _column("ref_freq_hz"), _column("spectral_index")
+    scale = np.where(
+        ref_freq[:, None] > 0.0,
+        (np.asarray(frequencies_hz)[None, :] / np.where(ref_freq > 0.0, ref_freq, 1.0)[:, None]) ** spix[:, None],
+        1.0,
+    )  # (S, C)
+    lmn = source_lmn(_column("ra_deg"), _column("dec_deg"), ra0_deg, dec0_deg)
+    lmn[:, 2] -= 1.0
+    sin_lat, cos_lat = np.sin(np.radians(lat_deg)), np.cos(np.radians(lat_deg))
+    sin_dec, cos_dec = np.sin(np.radians(sources["dec_deg"])), np.cos(np.radians(sources["dec_deg"]))
+    wavenumber = 2.0 * np.pi * np.asarray(frequencies_hz) / SPEED_OF_LIGHT_M_S  # (C,)
+
+    matrix_bytes = 4 * n_stations * n_stations * 16  # per (time, channel)
+    chan_chunk = int(min(n_chan, max(1, max_chunk_bytes // (2 * matrix_bytes))))
+    time_chunk = int(min(n_times, max(1, max_chunk_bytes // (2 * matrix_bytes * chan_chunk))))
+    src_chunk = int(min(max(n_src, 1), max(1, max_chunk_bytes // (3 * 16 * time_chunk * chan_chunk * n_stations))))
+
+    for t0 in range(0, n_times, time_chunk):
+        t1 = min(n_times, t0 + time_chunk)
+        vis = np.zeros((t1 - t0, len(ant1), n_chan, 4), dtype=np.complex64)
+        ha = np.radians(lst_deg[t0:t1, None] - sources["ra_deg"][None, :])  # (Tc, S)
+        visible = sin_lat * sin_dec + cos_lat * cos_dec * np.cos(ha) > 0.0
+        for c0 in range(0, n_chan, chan_chunk):
+            c1 = min(n_chan, c0 + chan_chunk)
+            acc = np.zeros((4, t1 - t0, c1 - c0, n_stations, n_stations), dtype=np.complex128)
+            for s0 in range(0, n_src, src_chunk):
+                s1 = min(n_src, s0 + src_chunk)
+                delay = np.einsum("tnk,sk->tsn", uvw[t0:t1], lmn[s0:s1])  # (Tc, Sc, N) metres
+                k = np.exp(-1j * delay[:, None, :, :] * wavenumber[None, c0:c1, None, None])  # (Tc, Cc, Sc, N)
+                k_h = np.swapaxes(k.conj(), -1, -2)  # (Tc, Cc, N, Sc)
+                weight = visible[:, None, s0:s1] * scale[None, s0:s1, c0:c1].swapaxes(1, 2)  # (Tc, Cc, Sc)
+                for pol in range(4):
+                    acc[pol] += (k_h * (weight * brightness[pol, None, None, s0:s1])[:, :, None, :]) @ k
+            vis[:, :, c0:c1, :] = np.moveaxis(acc[:, :, :, ant1, ant2], 0, -1).swapaxes(1, 2)
+        yield t0, t1, vis
+
+
+def create_visibility_ms(
+    ms_path: Path,
+    station_ecef: np.ndarray,
+    station_names: list,
+    station_diameter_m: float,
+    ra0_deg: float,
+    dec0_deg: float,
+    times_mjd_sec: np.ndarray,
+    dt_sec: float,
+    frequencies_hz: np.ndarray,
+    channel_width_hz: float,
+    telescope_name: str = "SKA-LOW",
+):
+    """
+    Creates a Measurement Set laid out like OSKAR's: one row per (time,
+    baseline) with ANTENNA1 < ANTENNA2, time-major, four linear correlations
+    (XX, XY, YX, YY), one field and one spectral window. TIME, UVW etc. are
+    filled by the caller; DATA is zero and FLAG false until then.
+
+    Returns:
+        The open, writable casacore table of the main table.
+
+    Raises:
+        ImportError: If python-casacore is not installed.
+    """
+    import casacore.tables as pt
+
+    n_stations, n_chan, n_times = len(station_ecef), len(frequencies_hz), len(times_mjd_sec)
+    ant1, ant2 = np.triu_indices(n_stations, 1)
+    n_rows = n_times * len(ant1)
+    desc = pt.maketabdesc([
+        pt.makearrcoldesc("DATA", 0j, ndim=2, shape=[n_chan, 4], valuetype="complex"),
+    ])
+    dminfo = {
+        "*1": {
+            "TYPE": "TiledColumnStMan",
+            "NAME": "data_tiled",
+            "SPEC": {"DEFAULTTILESHAPE": np.array([4, min(n_chan, 64), 128], dtype=np.int32)},
+            "COLUMNS": ["DATA"],
+        }
+    }
+    ms = pt.default_ms(str(ms_path), desc, dminfo)
+    ms.addrows(n_rows)
+    ms.putcol("TIME", np.repeat(times_mjd_sec, len(ant1)))
+    ms.putcol("TIME_CENTROID", np.repeat(times_mjd_sec, len(ant1)))
+    ms.putcol("INTERVAL", np.full(n_rows, dt_sec))
+    ms.putcol("EXPOSURE", np.full(n_rows, dt_sec))
+    ms.putcol("ANTENNA1", np.tile(ant1, n_times).astype(np.int32))
+    ms.putcol("ANTENNA2", np.tile(ant2, n_times).astype(np.int32))
+    ms.putcol("FLAG", np.zeros((n_rows, n_chan, 4), dtype=bool))
+    ms.putcol("WEIGHT", np.ones((n_rows, 4), dtype=np.float32))
+    ms.putcol("SIGMA", np.ones((n_rows, 4), dtype=np.float32))
+
+    phase_dir = np.radians([[ra0_deg, dec0_deg]])
+    with pt.table(str(Path(ms_path) / "ANTENNA"), readonly=False, ack=False) as ant:
+        ant.addrows(n_stations)
+        ant.putcol("NAME", list(station_names))
+        ant.putcol("STATION", list(station_names))
+        ant.putcol("TYPE", ["GROUND-BASED"] * n_stations)
+        ant.putcol("MOUNT", ["X-Y"] * n_stations)
+        ant.putcol("POSITION", station_ecef)
+        ant.putcol("OFFSET", np.zeros((n_stations, 3)))
+        ant.putcol("DISH_DIAMETER", np.full(n_stations, station_diameter_m))
+    with pt.table(str(Path(ms_path) / "FEED"), readonly=False, ack=False) as feed:
+        feed.addrows(n_stations)
+        feed.putcol("ANTENNA_ID", np.arange(n_stations, dtype=np.int32))
+        feed.putcol("SPECTRAL_WINDOW_ID", np.full(n_stations, -1, dtype=np.int32))
+        feed.putcol("BEAM_ID", np.full(n_stations, -1, dtype=np.int32))
+        feed.putcol("NUM_RECEPTORS", np.full(n_stations, 2, dtype=np.int32))
+        feed.putcol("TIME", np.full(n_stations, times_mjd_sec[0]))
+        feed.putcol("INTERVAL", np.full(n_stations, 1e30))
+        feed.putcol("POSITION", np.zeros((n_stations, 3)))
+        feed.putcol("BEAM_OFFSET", np.zeros((n_stations, 2, 2)))
+        feed.putcol("POLARIZATION_TYPE", np.array([["X", "Y"]] * n_stations))
+        feed.putcol("POL_RESPONSE", np.tile(np.eye(2, dtype=np.complex64), (n_stations, 1, 1)))
+        feed.putcol("RECEPTOR_ANGLE", np.tile([0.0, np.pi / 2.0], (n_stations, 1)))
+    with pt.table(str(Path(ms_path) / "SPECTRAL_WINDOW"), readonly=False, ack=False) as spw:
+        spw.addrows(1)
+        spw.putcell("NAME", 0, "SPW0")
+        spw.putcell("CHAN_FREQ", 0, np.asarray(frequencies_hz, dtype=np.float64))
+        for column in ("CHAN_WIDTH", "EFFECTIVE_BW", "RESOLUTION"):
+            spw.putcell(column, 0, np.full(n_chan, channel_width_hz))
+        spw.putcell("NUM_CHAN", 0, n_chan)
+        spw.putcell("TOTAL_BANDWIDTH", 0, n_chan * channel_width_hz)
+        spw.putcell("REF_FREQUENCY", 0, float(frequencies_hz[0]))
+        spw.putcell("MEAS_FREQ_REF", 0, 5)  # TOPO
+    with pt.table(str(Path(ms_path) / "POLARIZATION"), readonly=False, ack=False) as pol:
+        pol.addrows(1)
+        pol.putcell("NUM_CORR", 0, 4)
+        pol.putcell("CORR_TYPE", 0, np.array([9, 10, 11, 12], dtype=np.int32))  # XX XY YX YY
+        pol.putcell("CORR_PRODUCT", 0, np.array([[0, 0], [0, 1], [1, 0], [1, 1]], dtype=np.int32))
+    with pt.table(str(Path(ms_path) / "DATA_DESCRIPTION"), readonly=False, ack=False) as dd:
+        dd.addrows(1)
+        dd.putcell("SPECTRAL_WINDOW_ID", 0, 0)
+        dd.putcell("POLARIZATION_ID", 0, 0)
+    with pt.table(str(Path(ms_path) / "FIELD"), readonly=False, ack=False) as field:
+        field.addrows(1)
+        field.putcell("NAME", 0, "PHASE_CENTRE")
+        field.putcell("TIME", 0, times_mjd_sec[0])
+        for column in ("PHASE_DIR", "DELAY_DIR", "REFERENCE_DIR"):
+            field.putcell(column, 0, phase_dir)
+    with pt.table(str(Path(ms_path) / "OBSERVATION"), readonly=False, ack=False) as obs:
+        obs.addrows(1)
+        obs.putcell("TELESCOPE_NAME", 0, telescope_name)
+        obs.putcell("TIME_RANGE", 0, np.array([times_mjd_sec[0] - dt_sec / 2.0, times_mjd_sec[-1] + dt_sec / 2.0]))
+    return ms
+
+
+def run_dft_interf(
+    interf_ini_data: dict,
+    work_dir: Path,
+    max_chunk_mb: float = 256,
+    is_dry_run: bool = False,
+    prefix: str = "",
+    consumers: Optional[list] = None,
+    write_ms: bool = True,
+) -> bool:
+    """
+    Runs the interferometer simulation described by the INI settings of
+    generate_interf_ini_data() with predict_visibilities_dft() instead of
+    oskar_sim_interferometer, writing the Measurement Set named by
+    interferometer/ms_filename in work_dir. Meant for quick looks with small
+    arrays and point-source skies: station and element beams, telescope
+    errors, smearing, Faraday rotation and source extent are not modelled.
+
+    Each predicted block is also passed to consumers (VisibilityConsumer) as
+    it is produced; with write_ms=False no MS is written at all.
+
+    Returns:
+        True on success.
+    """
+    obs = interf_ini_data["observation"]
+    sky_sec = interf_ini_data["sky"]["oskar_sky_model"]
+    ms_path = Path(work_dir) / interf_ini_data["interferometer"]["ms_filename"]
+    if is_dry_run:
+        print(f"    {prefix} [DRY RUN] Would predict {ms_path if write_ms else 'visibilities'} with the NumPy DFT backend")
+        return True
+
+    start_time = time.monotonic()
+    try:
+        model = TelescopeModel.load(Path(work_dir) / interf_ini_data["telescope"]["input_directory"])
+        sources = load_sky_model(Path(work_dir) / sky_sec["file"])
+        ra0, dec0 = float(obs["phase_centre_ra_deg"]), float(obs["phase_centre_dec_deg"])
+        filter_cfg = sky_sec.get("filter", {})
+        distance = angular_distance_deg(sources["ra_deg"], sources["dec_deg"], ra0, dec0)
+        sources = sources[
+            (distance >= float(filter_cfg.get("radius_inner_deg") or 0.0))
+            & (distance <= float(filter_cfg.get("radius_outer_deg") or 180.0))
+        ]
+        ignored = [
+            f"{np.count_nonzero(sources[name])} sources with {label}"
+            for name, label in (("major_axis_arcsec", "extent"), ("rotation_measure", "rotation measure"))
+            if name in sources.dtype.names and np.any(sources[name])
+        ]
+        if ignored:
+            print(f"    {prefix} Warning: DFT backend treats {', '.join(ignored)} as plain point sources")
+
+        lon, lat, alt = (float(v) for v in model.position[:3])
+        times, dt = observation_time_grid(obs["start_time_utc"], obs["length"], obs["num_time_steps"])
+        lst = local_sidereal_time_deg(obs["start_time_utc"], lon) + (
+            (times - times[0] + dt / 2.0) * SIDEREAL_DEG_PER_SEC
+        )
+        n_chan = int(obs["num_channels"])
+        frequencies = float(obs["start_frequency_hz"]) + float(obs["frequency_inc_hz"]) * np.arange(n_chan)
+        channel_width = float(
+            interf_ini_data["interferometer"].get("channel_bandwidth_hz") or obs["frequency_inc_hz"]
+        )
+        uvw = station_uvw(enu_to_equatorial_xyz(model.station_enu, lat), lst - ra0, dec0)
+        ant1, ant2 = np.triu_indices(model.n_stations, 1)
+        station_radius = max(
+            (float(np.hypot(*model.station_elements(i)[:, :2].T).max()) for i in range(model.n_stations)
+             if len(model.station_elements(i))),
+            default=0.0,
+        )
+
+        baseline_uvw = uvw[:, ant2] - uvw[:, ant1]
+
+        ms = None
+        tmp_ms = ms_path.with_name(f".{ms_path.name}.tmp")
+        if write_ms:
+            if tmp_ms.exists():
+                shutil.rmtree(tmp_ms)
+            ms = create_visibility_ms(
+                tmp_ms,
+                enu_to_ecef(model.station_enu, lon, lat, alt),
+                model.station_names or [f"s{i:04d}" for i in range(model.n_stations)],
+                2.0 * station_radius,
+                ra0, dec0, times, dt, frequencies, channel_width,
+            )
+        try:
+            if ms is not None:
+                ms.putcol("UVW", baseline_uvw.reshape(-1, 3))
+            for t0, t1, vis in predict_visibilities_dft(
+                uvw, sources, ra0, dec0, lat, lst, frequencies, int(max_chunk_mb * 1024 ** 2)
+            ):
+                if ms is not None:
+                    ms.putcol("DATA", vis.reshape(-1, n_chan, 4), t0 * len(ant1), (t1 - t0) * len(ant1))
+                if consumers:
+                    block = VisibilityBlock(t0, times[t0:t1], frequencies, ant1, ant2, baseline_uvw[t0:t1], vis)
+                    for consumer in consumers:
+                        consumer.consume(block)
+        finally:
+            if ms is not None:
+                ms.close()
+        if write_ms:
+            if ms_path.exists():
+                shutil.rmtree(ms_path)
+            os.rename(tmp_ms, ms_path)
+    except ImportError as e:
+        print(f"    {prefix} ERROR: The DFT backend needs python-casacore to write the MS: {e}")
+        return False
+    except (OSError, RuntimeError, ValueError, KeyError) as e:
+        print(f"    {prefix} ERROR: DFT visibility prediction failed: {e}")
+        return False
+    print(
+        f"    {prefix} Predicted {len(sources)} sources x {len(ant1)} baselines x "
+        f"{len(times)} times x {n_chan} channels in {time.monotonic() - start_time:.1f} s"
+        + (f": {ms_path}" if write_ms else "")
+    )
+    return True
+
+
+def compare_ms_visibilities(reference_ms: Path, test_ms: Path, column: str = "DATA") -> dict:
+    """
+    Compares the visibilities of two Measurement Sets with the same rows
+    (e.g. an OSKAR run and the DFT backend for the same settings).
+
+    Returns:
+        Dict with "rows", "max_abs_diff", "max_abs_ref" (peak |reference|),
+        "rms_diff" and "max_uvw_diff_m".
+
+    Raises:
+        ImportError: If python-casacore is not installed.
+        ValueError: If the row counts or shapes differ.
+    """
+    import casacore.tables as pt
+
+    with pt.table(str(reference_ms), ack=False) as ref, pt.table(str(test_ms), ack=False) as test:
+        if ref.nrows() != test.nrows():
+            raise ValueError(f"{test_ms} has {test.nrows()} rows, {reference_ms} has {ref.nrows()}")
+        ref_vis, test_vis = ref.getcol(column), test.getcol(column)
+        if ref_vis.shape != test_vis.shape:
+            raise ValueError(f"{column} shapes differ: {ref_vis.shape} vs {test_vis.shape}")
+        diff = np.abs(ref_vis.astype(np.complex128) - test_vis)
+        return {
+            "rows": ref.nrows(),
+            "max_abs_diff": float(diff.max()) if diff.size else 0.0,
+            "max_abs_ref": float(np.abs(ref_vis).max()) if ref_vis.size else 0.0,
+            "rms_diff": float(np.sqrt(np.mean(diff ** 2))) if diff.size else 0.0,
+            "max_uvw_diff_m": float(np.abs(ref.getcol("UVW") - test.getcol("UVW")).max()) if ref.nrows() else 0.0,
+        }
+
+
+def equatorial_to_enu(ra_deg, dec_deg, lst_deg, lat_deg: float) -> np.ndarray:
+    """
+    Unit (east, north, up) vectors of the directions (ra, dec) at local
+    sidereal times lst_deg and latitude lat_deg (ra/dec broadcast against
+    lst); returns (..., 3).
+    """
+    ha = np.radians(np.asarray(lst_deg) - np.asarray(ra_deg))
+    dec, lat = np.radians(dec_deg), np.radians(lat_deg)
+    east = -np.cos(dec) * np.sin(ha)
+    north = np.sin(dec) * np.cos(lat) - np.cos(dec) * np.sin(lat) * np.cos(ha)
+    up = np.sin(dec) * np.sin(lat) + np.cos(dec) * np.cos(lat) * np.cos(ha)
+    return np.stack(np.broadcast_arrays(east, north, up), axis=-1)
+
+
+def station_beam_array_factor(
+    element_enu: np.ndarray,
+    feed_angle_deg: np.ndarray,
+    directions: np.ndarray,
+    pointing: np.ndarray,
+    frequencies_hz: np.ndarray,
+    max_chunk_bytes: int = 256 * 1024 ** 2,
+) -> np.ndarray:
+    """
+    Stokes I amplitude response of an aperture-array station beamformed
+    towards `pointing`, modelling each element as a pair of crossed short
+    dipoles in the horizontal plane, the X dipole at feed angle alpha from
+    east towards north (beta/gamma tilts are ignored), with uniform weights:
+        J_X(d) = P - d (P . d),  P = (1/N) sum_e exp(i k r_e . (d - d0)) (cos a_e, sin a_e, 0)
+    (J_Y likewise with the dipoles turned by 90 degrees) and the returned
+    amplitude sqrt((|J_X|^2 + |J_Y|^2) / 2), which is 1 at the zenith for a
+    zenith pointing if all feed angles are equal. Directions below the
+    horizon get 0.
+
+    The per-element phasors are the only large temporaries: pixels are
+    processed in chunks that keep them within about max_chunk_bytes, and
+    on a uniform channel grid successive channels are reached by multiplying
+    with a constant phasor step instead of re-evaluating the exponentials.
+
+    Args:
+        element_enu: (E, 3) element positions relative to the station centre, metres.
+        feed_angle_deg: (E,) or (E, 3) feed angles; only alpha (the first column) is used.
+        directions: (P, 3) unit ENU vectors to evaluate the beam at.
+        pointing: (3,) unit ENU vector of the beam direction.
+        frequencies_hz: (C,) frequencies.
+        max_chunk_bytes: Memory budget of the temporaries.
+
+    Returns:
+        (P, C) float64 amplitudes.
+    """
+    element_enu = np.asarray(element_enu, dtype=np.float64)[:, :3]
+    alpha = np.radians(np.asarray(feed_angle_deg, dtype=np.float64).reshape(len(element_enu), -1)[:, 0])
+    feeds = np.stack([np.cos(alpha), np.sin(alpha)], axis=-1) / max(len(element_enu), 1)  # (E, 2)
+    directions = np.asarray(directions, dtype=np.float64)
+    frequencies = np.atleast_1d(np.asarray(frequencies_hz, dtype=np.float64))
+    wavenumber = 2.0 * np.pi * frequencies / SPEED_OF_LIGHT_M_S
+    n_chan = len(frequencies)
+    step = np.diff(wavenumber)
+    uniform = n_chan > 1 and np.allclose(step, step[0], rtol=1e-9, atol=0.0)
+    refresh = 32  # channels between exact re-evaluations on a uniform grid
+
+    out = np.zeros((len(directions), n_chan))
+    pix_chunk = int(max(1, max_chunk_bytes // (4 * 16 * max(len(element_enu), 1))))
+    for p0 in range(0, len(directions), pix_chunk):
+        d = directions[p0:p0 + pix_chunk]
+        path = (d - pointing) @ element_enu.T  # (Pc, E) metres
+        phasor = delta = None
+        for c in range(n_chan):
+            if not uniform or c % refresh == 0:
+                phasor = np.exp(1j * wavenumber[c] * path)
+                if uniform:
+                    delta = np.exp(1j * step[0] * path)
+            else:
+                phasor *= delta
+            a_cos, a_sin = (phasor @ feeds).T  # (Pc,) each
+            along_x = a_cos * d[:, 0] + a_sin * d[:, 1]
+            along_y = -a_sin * d[:, 0] + a_cos * d[:, 1]
+            power = 2.0 * (np.abs(a_cos) ** 2 + np.abs(a_sin) ** 2) - np.abs(along_x) ** 2 - np.abs(along_y) ** 2
+            out[p0:p0 + pix_chunk, c] = np.sqrt(np.clip(0.5 * power, 0.0, None))
+        out[p0:p0 + pix_chunk][d[:, 2] < 0.0] = 0.0
+    return out
+
+
+def beam_image_radec(ra0_deg: float, dec0_deg: float, fov_deg: float, size: int):
+    """
+    (ra_deg, dec_deg) of the pixel centres of a size x size orthographic (SIN)
+    image of field of view fov_deg centred on (ra0, dec0), as written by
+    write_beam_fits() (RA increasing to the left); pixels outside the
+    projection are NaN. Returns two (size, size) arrays indexed [y, x].
+    """
+    cell = 2.0 * np.sin(np.radians(min(float(fov_deg), 180.0)) / 2.0) / size
+    offsets = (np.arange(size) - size // 2) * cell
+    l = -offsets[None, :]
+    m = offsets[:, None]
+    with np.errstate(invalid="ignore"):
+        n = np.sqrt(1.0 - l ** 2 - m ** 2)
+    ra0, dec0 = np.radians(ra0_deg), np.radians(dec0_deg)
+    dec = np.arcsin(np.clip(m * np.cos(dec0) + n * np.sin(dec0), -1.0, 1.0))
+    ra = ra0 + np.arctan2(l, n * np.cos(dec0) - m * np.sin(dec0))
+    invalid = ~np.isfinite(n)
+    return (
+        np.where(invalid, np.nan, np.degrees(ra) % 360.0),
+        np.where(invalid, np.nan, np.degrees(dec)),
+    )
+
+
+def evaluate_station_beam(
+    model: "TelescopeModel",
+    station: int,
+    ra_deg: np.ndarray,
+    dec_deg: np.ndarray,
+    ra0_deg: float,
+    dec0_deg: float,
+    lst_deg: np.ndarray,
+    frequencies_hz: np.ndarray,
+    max_chunk_bytes: int = 256 * 1024 ** 2,
+) -> np.ndarray:
+    """
+    Array-factor Stokes I amplitude (station_beam_array_factor()) of one
+    station of a TelescopeModel, tracking (ra0, dec0), at the directions
+    (ra_deg, dec_deg) (any shape; NaN entries give NaN) for every local
+    sidereal time and frequency. All stations are taken to be at the array
+    latitude. Returns (C, T) + ra_deg.shape float32.
+    """
+    ra, dec = np.asarray(ra_deg, dtype=np.float64), np.asarray(dec_deg, dtype=np.float64)
+    lat = float(model.position[1])
+    lo, hi = model.element_offsets[station], model.element_offsets[station + 1]
+    valid = np.isfinite(ra) & np.isfinite(dec)
+    lst = np.atleast_1d(lst_deg)
+    out = np.full((len(np.atleast_1d(frequencies_hz)), len(lst), ra.size), np.nan, dtype=np.float32)
+    for t, lst_t in enumerate(lst):
+        beam = station_beam_array_factor(
+            model.element_enu[lo:hi],
+            model.feed_angle_deg[lo:hi],
+            equatorial_to_enu(ra[valid], dec[valid], lst_t, lat),
+            equatorial_to_enu(ra0_deg, dec0_deg, lst_t, lat),
+            frequencies_hz,
+            max_chunk_bytes,
+        )
+        out[:, t, valid.ravel()] = beam.T
+    return out.reshape(out.shape[:2] + ra.shape)
+
+
+def write_beam_fits(
+    out_path: Path,
+    cube: np.ndarray,
+    ra0_deg: float,
+    dec0_deg: float,
+    fov_deg: float,
+    start_time_utc: str,
+    dt_sec: float,
+    frequencies_hz: np.ndarray,
+) -> None:
+    """
+    Writes a (C, T, size, size) beam cube on the beam_image_radec() grid as a
+    FITS image with axes RA---SIN, DEC--SIN, UTC (seconds from
+    start_time_utc) and FREQ, like the station beam images of
+    oskar_sim_beam_pattern.
+
+    Raises:
+        ImportError: If astropy is not installed.
+    """
+    from astropy.io import fits
+
+    size = cube.shape[-1]
+    cell_deg = np.degrees(2.0 * np.sin(np.radians(min(float(fov_deg), 180.0)) / 2.0) / size)
+    hdu = fits.PrimaryHDU(np.ascontiguousarray(cube, dtype=np.float32))
+    header = hdu.header
+    for axis, (ctype, crval, cdelt, crpix) in enumerate(
+        [
+            ("RA---SIN", ra0_deg, -cell_deg, size // 2 + 1),
+            ("DEC--SIN", dec0_deg, cell_deg, size // 2 + 1),
+            ("UTC", 0.5 * dt_sec, dt_sec, 1),
+            ("FREQ", float(frequencies_hz[0]),
+             float(frequencies_hz[1] - frequencies_hz[0]) if len(frequencies_hz) > 1 else 1.0, 1),
+        ],
+        start=1,
+    ):
+        header[f"CTYPE{axis}"] = ctype
+        header[f"CRVAL{axis}"] = crval
+        header[f"CDELT{axis}"] = cdelt
+        header[f"CRPIX{axis}"] = crpix
+    header["CUNIT1"] = header["CUNIT2"] = "deg"
+    header["CUNIT3"], header["CUNIT4"] = "s", "Hz"
+    header["DATE-OBS"] = _parse_utc(start_time_utc).isoformat()
+    header["BUNIT"] = "beam power"
+    header["ORIGIN"] = ARRAY_FACTOR_BEAM_VERSION
+    out_path = Path(out_path)
+    tmp_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    hdu.writeto(tmp_path, overwrite=True)
+    os.replace(tmp_path, out_path)
+
+
+def run_array_factor_beam(
+    beam_ini_data: dict,
+    beam_dir: Path,
+    cache_dir: Path,
+    max_chunk_mb: float = 256,
+    is_dry_run: bool = False,
+    prefix: str = "",
+) -> bool:
+    """
+    Computes the station beam images described by the INI settings of
+    generate_beam_ini_data() with the NumPy array factor
+    (evaluate_station_beam()) instead of oskar_sim_beam_pattern, for quick
+    looks: one FITS cube per station in beam_pattern/station_ids (or every
+    station with beam_pattern/all_stations), of beam_image/size pixels
+    (default 256) across beam_image/fov_deg, per time step and channel.
+    Each holds the Stokes I auto-power (the squared array-factor amplitude,
+    1 at the zenith) under the name oskar_sim_beam_pattern gives its Stokes I
+    auto-power station output,
+    <root_path>_S<station>_TIME_SEP_CHAN_SEP_AUTO_POWER_AMP_I_I.fits in
+    beam_dir, whatever beam_pattern/station_outputs requests. Element
+    patterns other than ideal dipoles, element errors and station
+    apodisation are not modelled.
+
+    Each station's cube is cached in cache_dir under a key of its element
+    layout and feed angles, the pointing, time grid, image grid and
+    frequencies, so stations shared between telescope models (sub-arrays)
+    or re-run campaigns are computed once.
+
+    Returns:
+        True on success.
+    """
+    obs = beam_ini_data["observation"]
+    pattern = beam_ini_data["beam_pattern"]
+    image = pattern.get("beam_image", {})
+    fov = float(image.get("fov_deg") or 180.0)
+    size = int(image.get("size") or 256)
+    root = Path(beam_dir) / pattern["root_path"]
+    if is_dry_run:
+        print(f"    {prefix} [DRY RUN] Would compute array-factor station beams: {root}_S*.fits")
+        return True
+
+    start_time = time.monotonic()
+    try:
+        model = TelescopeModel.load(Path(beam_dir) / beam_ini_data["telescope"]["input_directory"])
+        if str(pattern.get("all_stations", "false")).lower() == "true":
+            station_ids = list(range(model.n_stations))
+        else:
+            station_ids = [int(s) for s in str(pattern.get("station_ids", "0")).replace(",", " ").split()]
+        bad = [s for s in station_ids if not 0 <= s < model.n_stations]
+        if bad:
+            raise ValueError(f"station ids {bad} out of range for {model.n_stations} stations")
+        ra0, dec0 = float(obs["phase_centre_ra_deg"]), float(obs["phase_centre_dec_deg"])
+        times, dt = observation_time_grid(obs["start_time_utc"], obs["length"], obs["num_time_steps"])
+        lst = local_sidereal_time_deg(obs["start_time_utc"], float(model.position[0])) + (
+            (times - times[0] + dt / 2.0) * SIDEREAL_DEG_PER_SEC
+        )
+        frequencies = float(obs["start_frequency_hz"]) + float(obs["frequency_inc_hz"]) * np.arange(
+            int(obs["num_channels"])
+        )
+        ra, dec = beam_image_radec(ra0, dec0, fov, size)
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        n_cached = 0
+        for station in station_ids:
+            lo, hi = model.element_offsets[station], model.element_offsets[station + 1]
+            layout = hashlib.sha256(
+                np.ascontiguousarray(model.element_enu[lo:hi]).tobytes()
+                + np.ascontiguousarray(model.feed_angle_deg[lo:hi]).tobytes()
+            ).hexdigest()
+            cache_key = compute_step_cache_key(
+                "array_factor_beam",
+                {
+                    "version": ARRAY_FACTOR_BEAM_VERSION,
+                    "layout": layout,
+                    "latitude": float(model.position[1]),
+                    "pointing": [ra0, dec0],
+                    "lst": lst.tolist(),
+                    "image": [fov, size],
+                    "frequencies": frequencies.tolist(),
+                },
+            )
+            cache_path = Path(cache_dir) / f"{cache_key[:32]}.npy"
+            if cache_path.is_file():
+                cube = np.load(cache_path)
+                n_cached += 1
+            else:
+                cube = evaluate_station_beam(
+                    model, station, ra, dec, ra0, dec0, lst, frequencies, int(max_chunk_mb * 1024 ** 2)
+                )
+                tmp_path = cache_path.with_name(f".{cache_path.stem}.{os.getpid()}.{threading.get_ident()}.npy")
+                np.save(tmp_path, cube)
+                os.replace(tmp_path, cache_path)
+            write_beam_fits(
+                Path(f"{root}_S{station:04d}_TIME_SEP_CHAN_SEP_AUTO_POWER_AMP_I_I.fits"),
+                np.square(cube), ra0, dec0, fov, obs["start_time_utc"], dt, frequencies,
+            )
+    except ImportError as e:
+        print(f"    {prefix} ERROR: The array-factor beam backend needs astropy to write FITS: {e}")
+        return False
+    except (OSError, ValueError, KeyError) as e:
+        print(f"    {prefix} ERROR: Array-factor beam computation failed: {e}")
+        return False
+    print(
+        f"    {prefix} Computed array-factor beams of {len(station_ids)} station(s) ({n_cached} cached), "
+        f"{size}x{size} pixels x {len(lst)} times x {len(frequencies)} channels "
+        f"in {time.monotonic() - start_time:.1f} s: {root}_S*.fits"
+    )
+    return True
+
+
+def _next_fft_size(n: int) -> int:
+    """Smallest even integer >= n whose only prime factors are 2, 3, 5 and 7."""
+    size = max(2, int(np.ceil(n)))
+    while True:
+        if size % 2 == 0:
+            rest = size
+            for prime in (2, 3, 5, 7):
+                while rest % prime == 0:
+                    rest //= prime
+            if rest == 1:
+                return size
+        size += 1
+
+
+def observation_baseline_uv(
+    model: "TelescopeModel",
+    ra0_deg: float,
+    dec0_deg: float,
+    observation: dict,
+    max_chunk_bytes: int = 256 * 1024 ** 2,
+):
+    """
+    Yields the projected (u, v) in metres of every baseline of a telescope
+    model (top-level layout.txt and position.txt) tracking (ra0, dec0) over
+    the time steps of an observation ([observation] settings start_time_utc,
+    length, num_time_steps), as (n, 2) arrays of whole blocks of time steps
+    (baselines vary fastest) sized to stay within about max_chunk_bytes.
+    """
+    lon, lat = float(model.position[0]), float(model.position[1])
+    times, dt = observation_time_grid(
+        observation["start_time_utc"], observation["length"], observation["num_time_steps"]
+    )
+    lst = local_sidereal_time_deg(observation["start_time_utc"], lon) + (
+        (times - times[0] + dt / 2.0) * SIDEREAL_DEG_PER_SEC
+    )
+    xyz = enu_to_equatorial_xyz(model.station_enu, lat)
+    ant1, ant2 = np.triu_indices(model.n_stations, 1)
+    time_chunk = int(max(1, min(len(times), max_chunk_bytes // (6 * 8 * max(len(ant1), 1)))))
+    for t0 in range(0, len(times), time_chunk):
+        uvw = station_uvw(xyz, lst[t0:t0 + time_chunk] - ra0_deg, dec0_deg)
+        yield (uvw[:, ant2, :2] - uvw[:, ant1, :2]).reshape(-1, 2)
+
+
+def grid_uv_samples(
+    uv_blocks,
+    frequencies_hz: np.ndarray,
+    grid_size: int,
+    cell_wavelengths: float,
+    sample_channels: int = 16,
+) -> np.ndarray:
+    """
+    Counts the (u, v) and (-u, -v) samples of uv_blocks (iterable of (n, 2)
+    arrays in metres, e.g. observation_baseline_uv()) on a grid_size x
+    grid_size grid of cell_wavelengths cells (indexed [v, u], zero at
+    grid_size // 2; samples beyond the edge land on it). Up to
+    sample_channels evenly spaced channels are gridded, each standing in for
+    its share of the band.
+    """
+    frequencies = np.asarray(frequencies_hz, dtype=np.float64)
+    n_chan = len(frequencies)
+    picks = np.unique(np.round(np.linspace(0, n_chan - 1, min(n_chan, max(1, int(sample_channels))))).astype(int))
+    counts = np.zeros(grid_size * grid_size)
+    for uv in uv_blocks:
+        for frequency in frequencies[picks]:
+            scaled = uv * (frequency / SPEED_OF_LIGHT_M_S / cell_wavelengths)
+            for sign in (1.0, -1.0):
+                index = np.floor(sign * scaled + 0.5).astype(np.int64) + grid_size // 2
+                np.clip(index, 0, grid_size - 1, out=index)
+                counts += np.bincount(index[:, 1] * grid_size + index[:, 0], minlength=grid_size * grid_size)
+    return counts.reshape(grid_size, grid_size) * (n_chan / len(picks))
+
+
+def _observation_frequencies(observation: dict) -> np.ndarray:
+    return float(observation["start_frequency_hz"]) + float(observation["frequency_inc_hz"]) * np.arange(
+        int(observation["num_channels"])
+    )
+
+
+def compute_uv_coverage(
+    model: "TelescopeModel",
+    ra0_deg: float,
+    dec0_deg: float,
+    observation: dict,
+    grid_size: int = 512,
+    density_channels: int = 16,
+    max_chunk_bytes: int = 256 * 1024 ** 2,
+) -> dict:
+    """
+    Computes the uvw of every baseline of a telescope model at every time
+    step of an observation tracking (ra0, dec0) (observation_baseline_uv(),
+    evaluated in bulk per block of time steps) and summarises its uv
+    coverage; the density grid is filled from up to density_channels evenly
+    spaced channels (grid_uv_samples()).
+
+    Returns:
+        Dict with the counts "n_stations", "n_baselines", "n_times",
+        "n_channels"; "frequencies_hz"; "min_baseline_m" / "max_baseline_m"
+        (physical lengths), "max_uv_m" (longest projected uv distance),
+        "max_uv_wavelengths" (at the highest frequency), "resolution_arcsec"
+        (1 / max_uv_wavelengths), "station_diameter_m" (median over stations);
+        "density" (grid_size x grid_size counts of (u, v) and (-u, -v) samples,
+        indexed [v, u], u increasing with index, zero at grid_size // 2) and
+        its "cell_wavelengths".
+    """
+    frequencies = _observation_frequencies(observation)
+    ant1, ant2 = np.triu_indices(model.n_stations, 1)
+    lengths = np.linalg.norm(model.station_enu[ant2] - model.station_enu[ant1], axis=-1)
+    diameters = [
+        2.0 * float(np.hypot(*model.station_elements(i)[:, :2].T).max())
+        for i in range(model.n_stations)
+        if len(model.station_elements(i))
+    ]
+
+    def _uv_blocks():
+        return observation_baseline_uv(model, ra0_deg, dec0_deg, observation, max_chunk_bytes)
+
+    max_uv_m = max((float(np.sqrt((uv ** 2).sum(axis=-1)).max(initial=0.0)) for uv in _uv_blocks()), default=0.0)
+    max_uv_wavelengths = max_uv_m * frequencies.max() / SPEED_OF_LIGHT_M_S
+    cell = 2.0 * max(max_uv_wavelengths, 1e-9) * (1.0 + 1e-6) / (grid_size - 1)
+
+    return {
+        "n_stations": model.n_stations,
+        "n_baselines": len(ant1),
+        "n_times": max(1, int(observation["num_time_steps"])),
+        "n_channels": len(frequencies),
+        "frequencies_hz": frequencies,
+        "min_baseline_m": float(lengths.min()) if len(lengths) else 0.0,
+        "max_baseline_m": float(lengths.max(initial=0.0)),
+        "max_uv_m": max_uv_m,
+        "max_uv_wavelengths": max_uv_wavelengths,
+        "resolution_arcsec": np.degrees(1.0 / max_uv_wavelengths) * 3600.0 if max_uv_wavelengths else np.inf,
+        "station_diameter_m": float(np.median(diameters)) if diameters else 0.0,
+        "density": grid_uv_samples(_uv_blocks(), frequencies, grid_size, cell, density_channels),
+        "cell_wavelengths": cell,
+    }
+
+
+def recommend_imaging_parameters(
+    coverage: dict,
+    smearing_loss: float = 0.01,
+    pixels_per_beam: float = 3.0,
+    field_of_view_deg: Optional[float] = None,
+) -> dict:
+    """
+    Derives averaging and imaging parameters from compute_uv_coverage():
+      - field of view: field_of_view_deg, else twice the station primary-beam
+        FWHM (1.22 lambda / D) at the lowest frequency;
+      - pixel scale: the resolution over pixels_per_beam, and the image size
+        covering the field (even, FFT-friendly);
+      - the longest integration and channel width keeping time and bandwidth
+        smearing at the field edge on the longest baseline below smearing_loss
+        (fractional amplitude loss; a phase ramp phi across a sample loses
+        about phi^2 / 24).
+
+    Returns:
+        Dict with "field_of_view_deg", "pixel_scale_arcsec", "image_size",
+        "max_time_average_sec" and "max_channel_width_hz".
+    """
+    frequencies = coverage["frequencies_hz"]
+    if field_of_view_deg is None:
+        diameter = coverage["station_diameter_m"] or 1.0
+        field_of_view_deg = 2.0 * np.degrees(1.22 * SPEED_OF_LIGHT_M_S / frequencies.min() / diameter)
+    field_of_view_deg = min(float(field_of_view_deg), 180.0)
+    pixel_scale_arcsec = coverage["resolution_arcsec"] / float(pixels_per_beam)
+    l_max = np.sin(np.radians(field_of_view_deg) / 2.0)
+    phase_tolerance = np.sqrt(24.0 * float(smearing_loss))
+    phase_rate = 2.0 * np.pi * coverage["max_uv_wavelengths"] * l_max  # rad per unit of u
+    return {
+        "field_of_view_deg": field_of_view_deg,
+        "pixel_scale_arcsec": pixel_scale_arcsec,
+        "image_size": _next_fft_size(field_of_view_deg * 3600.0 / pixel_scale_arcsec),
+        "max_time_average_sec": phase_tolerance / (phase_rate * EARTH_ROTATION_RAD_S) if phase_rate else np.inf,
+        "max_channel_width_hz": phase_tolerance * frequencies.max() / phase_rate if phase_rate else np.inf,
+    }
+
+
+def _connected_region(mask: np.ndarray, seed: tuple) -> np.ndarray:
+    """The 4-connected component of boolean image mask containing pixel seed (empty if seed is not set)."""
+    region = np.zeros_like(mask)
+    if not mask[seed]:
+        return region
+    region[seed] = True
+    while True:
+        grown = region.copy()
+        grown[1:, :] |= region[:-1, :]
+        grown[:-1, :] |= region[1:, :]
+        grown[:, 1:] |= region[:, :-1]
+        grown[:, :-1] |= region[:, 1:]
+        grown &= mask
+        if np.array_equal(grown, region):
+            return region
+        region = grown
+
+
+def parse_weighting(weighting: str):
+    """Parses a WSClean-style weighting ("natural", "uniform", "briggs <robust>") into (mode, robust)."""
+    parts = str(weighting).split()
+    mode = parts[0].lower() if parts else ""
+    if mode in ("natural", "uniform") and len(parts) == 1:
+        return mode, None
+    if mode == "briggs" and len(parts) <= 2:
+        try:
+            return mode, float(parts[1]) if len(parts) == 2 else 0.0
+        except ValueError:
+            pass
+    raise ValueError(f"Unknown weighting '{weighting}' (expected natural, uniform or 'briggs <robust>')")
+
+
+def estimate_psf(counts: np.ndarray, cell_arcsec: float, weighting: str = "natural") -> dict:
+    """
+    Estimates the synthesised beam (PSF) of an observation from its gridded
+    uv sample counts (grid_uv_samples() on the uv grid of an image of
+    counts.shape pixels of cell_arcsec, i.e. uv cells of
+    1 / (size * cell) wavelengths) with a NumPy FFT, for WSClean-style
+    weighting: "natural", "uniform" or "briggs <robust>"
+    (w = 1 / (1 + W f^2), f^2 = (5 * 10^-robust)^2 / (sum W^2 / sum W), with
+    W the count per cell).
+
+    The FWHM is measured on a finely resampled copy of the PSF peak
+    (evaluated directly from the weights, independent of the image pixel
+    size) from the second moments of the region above half maximum, which
+    for an elliptical Gaussian are (HWHM / 2)^2 along each axis. Sidelobes
+    are everything outside the main lobe: the region around the peak down to
+    the first null, at most twice the FWHM from the centre.
+
+    Returns:
+        Dict with "psf" (the normalised PSF image, peak 1 at size // 2),
+        "fwhm_major_arcsec", "fwhm_minor_arcsec", "position_angle_deg"
+        (east of north), "max_sidelobe" (largest positive), "min_sidelobe"
+        (most negative) and "rms_sidelobe".
+    """
+    mode, robust = parse_weighting(weighting)
+    counts = np.asarray(counts, dtype=np.float64)
+    if mode == "natural":
+        weights = counts
+    elif mode == "uniform":
+        weights = (counts > 0).astype(np.float64)
+    else:
+        f2 = (5.0 * 10.0 ** -robust) ** 2 / max((counts ** 2).sum() / max(counts.sum(), 1e-300), 1e-300)
+        weights = counts / (1.0 + counts * f2)
+    if not weights.any():
+        raise ValueError("No uv samples on the grid")
+    size = counts.shape[0]
+    centre = size // 2
+    # The grid holds (u, v) with zero at the centre: shift it to the origin,
+    # transform, and shift the image back (l increasing to the left like an image).
+    psf = np.fft.fftshift(np.fft.ifft2(np.fft.ifftshift(weights))).real[:, ::-1]
+    if size % 2 == 0:
+        psf = np.roll(psf, 1, axis=1)
+    psf /= psf[centre, centre]
+
+    # Half-maximum region resampled 16x finer by direct evaluation: PSF = E W E^T
+    cell_rad = np.radians(cell_arcsec / 3600.0)
+    uv = (np.arange(size) - centre) / (size * cell_rad)  # wavelengths
+    lobe_rows, lobe_cols = np.nonzero(_connected_region(psf >= 0.5, (centre, centre)))
+    half_width = int(max(np.abs(lobe_rows - centre).max(), np.abs(lobe_cols - centre).max())) + 2
+    fine = np.linspace(-half_width, half_width, 32 * half_width + 1) * cell_rad  # radians
+    ev = np.exp(2j * np.pi * np.outer(fine, uv))
+    fine_psf = (ev @ weights @ ev.T).real / weights.sum()
+    fine_centre = len(fine) // 2
+    region = _connected_region(fine_psf >= 0.5, (fine_centre, fine_centre))
+    rows, cols = np.nonzero(region)
+    y = (rows - fine_centre) * (fine[1] - fine[0])  # towards north (m)
+    x = (cols - fine_centre) * (fine[1] - fine[0])  # towards east (l)
+    moments = np.cov(np.stack([x, y]), bias=True) + np.eye(2) * (fine[1] - fine[0]) ** 2 / 12.0
+    eigenvalues, eigenvectors = np.linalg.eigh(moments)
+    major_axis = eigenvectors[:, 1]
+
+    # Main lobe: down to the first null, but no further than twice the FWHM
+    # from the centre, so that a broad positive shelf (natural weighting of a
+    # dense core) counts as sidelobe
+    offsets = (np.arange(size) - centre) * cell_rad
+    x, y = -offsets[None, :], offsets[:, None]  # l (east, RA increasing to the left), m
+    inverse = np.linalg.inv(moments)
+    ellipse = inverse[0, 0] * x ** 2 + 2.0 * inverse[0, 1] * x * y + inverse[1, 1] * y ** 2 <= 64.0
+    main_lobe = _connected_region((psf > 0.0) & ellipse, (centre, centre))
+    sidelobes = psf[~main_lobe]
+    return {
+        "psf": psf,
+        "fwhm_major_arcsec": np.degrees(4.0 * np.sqrt(eigenvalues[1])) * 3600.0,
+        "fwhm_minor_arcsec": np.degrees(4.0 * np.sqrt(eigenvalues[0])) * 3600.0,
+        "position_angle_deg": float(np.degrees(np.arctan2(major_axis[0], major_axis[1])) % 180.0),
+        "max_sidelobe": float(sidelobes.max(initial=0.0)),
+        "min_sidelobe": float(sidelobes.min(initial=0.0)),
+        "rms_sidelobe": float(np.sqrt(np.mean(sidelobes ** 2))) if sidelobes.size else 0.0,
+    }
+
+
+def run_uv_preflight(run_specs, master_config: dict, project_root: Path) -> dict:
+    """
+    Computes the uv coverage (compute_uv_coverage()), the recommended
+    imaging/averaging parameters (recommend_imaging_parameters()) and the
+    PSF for each of preflight.psf_weightings (estimate_psf()) of every
+    distinct telescope model x phase centre x observation of the campaign,
+    prints a report and saves the coverage and PSFs as .npz files in
+    base_output_directory / preflight.output_directory. When PSFs are
+    estimated, the recommended pixel scale is the minor-axis FWHM of the
+    first weighting over preflight.pixels_per_beam. With
+    preflight.fill_wsclean_settings, each run's wsclean_settings with
+    image_size, scale (and weight, if PSFs were estimated) replaced by the
+    recommendation are written to wsclean_settings.yaml in the run's output
+    directory, headed by the matching WSClean arguments; nothing in this
+    workflow runs WSClean, so they are for the user to apply.
+
+    Returns:
+        Dict mapping run_id to {"coverage", "recommended", "psfs" (weighting ->
+        estimate_psf() result), "path"} (runs with the same telescope, phase
+        centre and observation share one entry).
+    """
+    preflight_cfg = master_config.get("preflight", {})
+    out_dir = Path(
+        master_config.get("output_config", {}).get("base_output_directory", "simulation_outputs_generated")
+    ) / preflight_cfg.get("output_directory", "preflight")
+    weightings = preflight_cfg.get("psf_weightings", ["briggs 0"]) or []
+    for weighting in weightings:
+        parse_weighting(weighting)
+    psf_size = int(preflight_cfg.get("psf_image_size", 1024))
+    pixels_per_beam = float(preflight_cfg.get("pixels_per_beam", 3))
+    print("\n=== Pre-flight uv Coverage ===")
+    results, by_key, names = {}, {}, {}
+    for spec in run_specs:
+        tel_cfg, pc_cfg = spec["tel_cfg"], spec["pc_cfg"]
+        observation = dict(spec.get("config", master_config).get("oskar_ini_defaults", {}).get("observation", {}))
+        observation["start_time_utc"] = pc_cfg["start_time_utc"]
+        tel_dir = (project_root / tel_cfg["oskar_input_directory"]).resolve()
+        key = compute_step_cache_key(
+            "uv_coverage", [str(tel_dir), pc_cfg["ra_deg"], pc_cfg["dec_deg"], observation]
+        )
+        if key not in by_key:
+            name = f"{tel_cfg.get('name', tel_dir.name)}_{pc_cfg.get('id', 'pc')}"
+            if names.get(name, key) != key:
+                name = f"{name}_{key[:8]}"
+            names[name] = key
+            start_time = time.monotonic()
+            try:
+                model = TelescopeModel.load(tel_dir)
+                ra0, dec0 = float(pc_cfg["ra_deg"]), float(pc_cfg["dec_deg"])
+                density_channels = int(preflight_cfg.get("density_channels", 16))
+                coverage = compute_uv_coverage(
+                    model,
+                    ra0,
+                    dec0,
+                    observation,
+                    int(preflight_cfg.get("grid_size", 512)),
+                    density_channels,
+                )
+                recommended = recommend_imaging_parameters(
+                    coverage,
+                    float(preflight_cfg.get("smearing_loss", 0.01)),
+                    pixels_per_beam,
+                    preflight_cfg.get("field_of_view_deg"),
+                )
+                psfs = {}
+                if weightings:
+                    # Grid at the resolution-based scale: fine enough to sample
+                    # the PSF and wide enough to hold every baseline
+                    cell_arcsec = recommended["pixel_scale_arcsec"]
+                    counts = grid_uv_samples(
+                        observation_baseline_uv(model, ra0, dec0, observation),
+                        coverage["frequencies_hz"],
+                        psf_size,
+                        1.0 / (psf_size * np.radians(cell_arcsec / 3600.0)),
+                        density_channels,
+                    )
+                    psfs = {w: estimate_psf(counts, cell_arcsec, w) for w in weightings}
+                    recommended["pixel_scale_arcsec"] = psfs[weightings[0]]["fwhm_minor_arcsec"] / pixels_per_beam
+                    recommended["image_size"] = _next_fft_size(
+                        recommended["field_of_view_deg"] * 3600.0 / recommended["pixel_scale_arcsec"]
+                    )
+                    recommended["psf_cell_arcsec"] = cell_arcsec
+                out_dir.mkdir(parents=True, exist_ok=True)
+                out_path = out_dir / f"{name}_uv_coverage.npz"
+                np.savez(out_path, **coverage, **{f"recommended_{k}": v for k, v in recommended.items()})
+                for weighting, psf in psfs.items():
+                    np.savez(
+                        out_dir / f"{name}_psf_{weighting.replace(' ', '')}.npz",
+                        cell_arcsec=recommended["psf_cell_arcsec"],
+                        **psf,
+                    )
+            except (OSError, ValueError, KeyError) as e:
+                print(f"  {name}: ERROR: {e}")
+                by_key[key] = None
+                continue
+            print(
+                f"  {name}: {coverage['n_baselines']} baselines x {coverage['n_times']} times x "
+                f"{coverage['n_channels']} channels in {time.monotonic() - start_time:.1f} s\n"
+                f"      baselines {coverage['min_baseline_m']:.1f}-{coverage['max_baseline_m']:.1f} m, "
+                f"max uv {coverage['max_uv_wavelengths']:.0f} lambda, resolution {coverage['resolution_arcsec']:.3g} asec"
+            )
+            for weighting, psf in psfs.items():
+                print(
+                    f"      PSF ({weighting}): FWHM {psf['fwhm_major_arcsec']:.3g} x {psf['fwhm_minor_arcsec']:.3g} asec, "
+                    f"PA {psf['position_angle_deg']:.0f} deg, sidelobes max {psf['max_sidelobe']:.3f} / "
+                    f"min {psf['min_sidelobe']:.3f} / rms {psf['rms_sidelobe']:.4f}"
+                )
+            wsclean_overrides = {
+                "image_size": int(recommended["image_size"]),
+                "scale": f"{recommended['pixel_scale_arcsec']:.3g}asec",
+            }
+            if psfs:
+                wsclean_overrides["weight"] = weightings[0]
+            wsclean_args = (
+                f"-size {wsclean_overrides['image_size']} {wsclean_overrides['image_size']} "
+                f"-scale {wsclean_overrides['scale']}"
+                + (f" -weight {wsclean_overrides['weight']}" if psfs else "")
+            )
+            print(
+                f"      recommended: scale {recommended['pixel_scale_arcsec']:.3g}asec, image_size "
+                f"{recommended['image_size']} (field {recommended['field_of_view_deg']:.3g} deg), "
+                f"time_average_sec <= {recommended['max_time_average_sec']:.3g}, "
+                f"channel width <= {recommended['max_channel_width_hz'] / 1e3:.4g} kHz\n"
+                f"      WSClean: {wsclean_args}\n"
+                f"      -> {out_path}"
+            )
+            by_key[key] = {
+                "coverage": coverage,
+                "recommended": recommended,
+                "psfs": psfs,
+                "path": out_path,
+                "wsclean_settings": wsclean_overrides,
+                "wsclean_args": wsclean_args,
+            }
+        entry = by_key[key]
+        if entry is None:
+            continue
+        results[spec["run_id"]] = entry
+        if preflight_cfg.get("fill_wsclean_settings", False):
+            wsclean_settings = {
+                **(spec.get("config", master_config).get("wsclean_settings") or {}),
+                **entry["wsclean_settings"],
+            }
+            settings_path = spec["output_dir"] / "wsclean_settings.yaml"
+            try:
+                spec["output_dir"].mkdir(parents=True, exist_ok=True)
+                with open(settings_path, "w", encoding="utf-8") as f:
+                    f.write(f"# Pre-flight recommendation ({entry['path'].name}); WSClean arguments:\n")
+                    f.write(f"#   {entry['wsclean_args']}\n")
+                    yaml.safe_dump({"wsclean_settings": wsclean_settings}, f, sort_keys=False)
+            except OSError as e:
+                print(f"  [Run {spec['run_id']}] ERROR: Could not write {settings_path}: {e}")
+    return results
+
+
+@dataclasses.dataclass
+class VisibilityBlock:
+    """A block of consecutive time steps of simulated cross-correlations."""
+
+    time_index: int  # Index of the block's first time step in the observation
+    times_mjd_sec: np.ndarray  # (T,) UTC MJD seconds
+    frequencies_hz: np.ndarray  # (C,)
+    antenna1: np.ndarray  # (B,)
+    antenna2: np.ndarray  # (B,)
+    uvw_m: np.ndarray  # (T, B, 3), antenna2 - antenna1
+    vis: np.ndarray  # (T, B, C, 4) complex, XX XY YX YY
+
+    @property
+    def stokes_i(self) -> np.ndarray:
+        return 0.5 * (self.vis[..., 0] + self.vis[..., 3])
+
+
+class VisibilityConsumer(abc.ABC):
+    """
+    Base class of the in-process consumers the interferometer step can stream
+    its visibilities to (streaming.consumers). consume() is called once per
+    block, in time order, and must keep only fixed-size accumulators;
+    finish() writes the products into out_dir and returns their paths.
+    """
+
+    def __init__(self, name: str, **options):
+        self.name = name
+        self.options = options
+
+    @abc.abstractmethod
+    def consume(self, block: VisibilityBlock) -> None:
+        """Accumulates one block of visibilities."""
+
+    @abc.abstractmethod
+    def finish(self, out_dir: Path) -> list:
+        """Writes the products into out_dir and returns their paths."""
+
+    def _save(self, out_dir: Path, **arrays) -> list:
+        out_path = Path(out_dir) / f"{self.name}.npz"
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = out_path.with_name(f".{out_path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, out_path)
+        return [out_path]
+
+
+class VisibilityStatistics(VisibilityConsumer):
+    """Per channel and correlation: number of visibilities, mean, rms and peak amplitude."""
+
+    def __init__(self, name, **options):
+        super().__init__(name, **options)
+        self.count = 0
+        self.frequencies_hz = None
+        self.sum = self.sum_sq = self.peak = None
+
+    def consume(self, block):
+        if self.sum is None:
+            shape = block.vis.shape[2:]
+            self.frequencies_hz = block.frequencies_hz
+            self.sum = np.zeros(shape, dtype=np.complex128)
+            self.sum_sq = np.zeros(shape)
+            self.peak = np.zeros(shape)
+        amplitude = np.abs(block.vis)
+        self.count += block.vis.shape[0] * block.vis.shape[1]
+        self.sum += block.vis.sum(axis=(0, 1))
+        self.sum_sq += (amplitude ** 2).sum(axis=(0, 1))
+        self.peak = np.maximum(self.peak, amplitude.max(axis=(0, 1), initial=0.0))
+
+    def finish(self, out_dir):
+        count = max(self.count, 1)
+        return self._save(
+            out_dir,
+            frequencies_hz=self.frequencies_hz,
+            count=self.count,
+            mean=self.sum / count,
+            rms=np.sqrt(self.sum_sq / count),
+            peak_amplitude=self.peak,
+        )
+
+
+class DelaySpectrumAccumulator(VisibilityConsumer):
+    """
+    Per-baseline delay power spectrum of Stokes I: |FFT over frequency of the
+    windowed (Blackman-Harris) visibilities|^2, averaged over time.
+    """
+
+    def __init__(self, name, **options):
+        super().__init__(name, **options)
+        self.power = None
+        self.n_times = 0
+
+    def consume(self, block):
+        n_chan = block.vis.shape[2]
+        if self.power is None:
+            self.antenna1, self.antenna2 = block.antenna1, block.antenna2
+            self.frequencies_hz = block.frequencies_hz
+            self.power = np.zeros((block.vis.shape[1], n_chan))
+            k = np.arange(n_chan) * 2.0 * np.pi / max(n_chan - 1, 1)
+            self.window = (
+                0.35875 - 0.48829 * np.cos(k) + 0.14128 * np.cos(2 * k) - 0.01168 * np.cos(3 * k)
+            )
+        spectrum = np.fft.fftshift(np.fft.fft(block.stokes_i * self.window, axis=-1), axes=-1)
+        self.power += (np.abs(spectrum) ** 2).sum(axis=0)
+        self.n_times += block.vis.shape[0]
+
+    def finish(self, out_dir):
+        n_chan = len(self.frequencies_hz)
+        df = self.frequencies_hz[1] - self.frequencies_hz[0] if n_chan > 1 else 1.0
+        return self._save(
+            out_dir,
+            antenna1=self.antenna1,
+            antenna2=self.antenna2,
+            delay_sec=np.fft.fftshift(np.fft.fftfreq(n_chan, df)),
+            power=self.power / max(self.n_times, 1),
+        )
+
+
+class ClosurePhaseAccumulator(VisibilityConsumer):
+    """
+    Closure phases of Stokes I for every triangle of the first max_stations
+    stations (default 8): the argument of the time-averaged unit bispectrum
+    V_pq V_qr conj(V_pr) per triangle and channel, plus its coherence
+    (|mean unit bispectrum|, 1 for a stable closure phase).
+    """
+
+    def __init__(self, name, **options):
+        super().__init__(name, **options)
+        self.sum = None
+        self.n_times = 0
+
+    def consume(self, block):
+        if self.sum is None:
+            n_stations = int(max(block.antenna1.max(initial=0), block.antenna2.max(initial=0))) + 1
+            n_use = min(n_stations, int(self.options.get("max_stations", 8)))
+            self.triangles = np.array(list(itertools.combinations(range(n_use), 3)), dtype=np.int64).reshape(-1, 3)
+            index = {(int(p), int(q)): b for b, (p, q) in enumerate(zip(block.antenna1, block.antenna2))}
+            self.legs = np.array(
+                [[index[(p, q)], index[(q, r)], index[(p, r)]] for p, q, r in self.triangles], dtype=np.int64
+            ).reshape(-1, 3)
+            self.sum = np.zeros((len(self.triangles), block.vis.shape[2]), dtype=np.complex128)
+        vis_i = block.stokes_i
+        bispectrum = vis_i[:, self.legs[:, 0]] * vis_i[:, self.legs[:, 1]] * np.conj(vis_i[:, self.legs[:, 2]])
+        amplitude = np.abs(bispectrum)
+        self.sum += np.divide(bispectrum, amplitude, out=np.zeros_like(bispectrum), where=amplitude > 0).sum(axis=0)
+        self.n_times += block.vis.shape[0]
+
+    def finish(self, out_dir):
+        mean = self.sum / max(self.n_times, 1)
+        return self._save(
+            out_dir,
+            triangles=self.triangles,
+            closure_phase_rad=np.angle(mean),
+            coherence=np.abs(mean),
+        )
+
+
+class UVGridder(VisibilityConsumer):
+    """
+    Grids Stokes I (and its Hermitian conjugate) with nearest-neighbour
+    assignment onto an npix x npix uv grid (default 256) matching an image of
+    cell_arcsec pixels (default 60) and writes the grid, the sample counts and
+    the naturally weighted dirty image.
+    """
+
+    def __init__(self, name, **options):
+        super().__init__(name, **options)
+        self.npix = int(options.get("npix", 256))
+        self.cell_rad = np.radians(float(options.get("cell_arcsec", 60.0)) / 3600.0)
+        self.grid = np.zeros((self.npix, self.npix), dtype=np.complex128)
+        self.weights = np.zeros((self.npix, self.npix))
+
+    def consume(self, block):
+        wavelengths = SPEED_OF_LIGHT_M_S / block.frequencies_hz
+        uv_cell = 1.0 / (self.npix * self.cell_rad)  # grid spacing in wavelengths
+        uu = block.uvw_m[:, :, None, 0] / wavelengths / uv_cell  # (T, B, C) in cells
+        vv = block.uvw_m[:, :, None, 1] / wavelengths / uv_cell
+        vis_i = block.stokes_i
+        for sign, values in ((1.0, vis_i), (-1.0, np.conj(vis_i))):
+            iu = np.rint(sign * uu).astype(np.int64) + self.npix // 2
+            iv = np.rint(sign * vv).astype(np.int64) + self.npix // 2
+            inside = (iu >= 0) & (iu < self.npix) & (iv >= 0) & (iv < self.npix)
+            np.add.at(self.grid, (iv[inside], iu[inside]), values[inside])
+            np.add.at(self.weights, (iv[inside], iu[inside]), 1.0)
+
+    def finish(self, out_dir):
+        image = np.fft.fftshift(np.fft.ifft2(np.fft.ifftshift(self.grid))).real * self.grid.size
+        return self._save(
+            out_dir,
+            grid=self.grid,
+            weights=self.weights,
+            dirty_image=image / max(self.weights.sum(), 1.0),
+            cell_arcsec=np.degrees(self.cell_rad) * 3600.0,
+        )
+
+
+VISIBILITY_CONSUMERS = {
+    "statistics": VisibilityStatistics,
+    "delay_spectrum": DelaySpectrumAccumulator,
+    "closure_phase": ClosurePhaseAccumulator,
+    "uv_grid": UVGridder,
+}
+
+
+def make_visibility_consumers(specs: list) -> list:
+    """
+    Instantiates the consumers listed in streaming.consumers; each spec is a
+    dict with "type" (a key of VISIBILITY_CONSUMERS), an optional "name"
+    (output file stem, default: the type) and type-specific options.
+
+    Raises:
+        ValueError: On an unknown type or a duplicate name.
+    """
+    consumers = []
+    for spec in specs or []:
+        options = dict(spec)
+        kind = options.pop("type", None)
+        if kind not in VISIBILITY_CONSUMERS:
+            raise ValueError(
+                f"Unknown visibility consumer type '{kind}' (expected one of {', '.join(VISIBILITY_CONSUMERS)})"
+            )
+        name = str(options.pop("name", kind))
+        if any(c.name == name for c in consumers):
+            raise ValueError(f"Duplicate visibility consumer name '{name}'")
+        consumers.append(VISIBILITY_CONSUMERS[kind](name, **options))
+    return consumers
+
+
+def feed_consumers_from_ms(ms_path: Path, consumers: list, chunk_rows: int = 20000) -> None:
+    """
+    Streams the cross-correlations of an OSKAR-style Measurement Set (time-major,
+    the same baselines at every time) to consumers in blocks of whole time
+    steps of about chunk_rows rows.
+
+    Raises:
+        ImportError: If python-casacore is not installed.
+        ValueError: If the rows are not a regular time x baseline grid.
+    """
+    import casacore.tables as pt
+
+    with pt.table(str(ms_path), ack=False) as ms:
+        with pt.table(str(Path(ms_path) / "SPECTRAL_WINDOW"), ack=False) as spw:
+            frequencies = spw.getcell("CHAN_FREQ", 0)
+        n_rows = ms.nrows()
+        if n_rows == 0:
+            return
+        times = ms.getcol("TIME")
+        n_baselines = int(np.count_nonzero(times == times[0]))
+        if n_rows % n_baselines:
+            raise ValueError(f"{ms_path}: {n_rows} rows are not a whole number of {n_baselines}-baseline time steps")
+        antenna1 = ms.getcol("ANTENNA1", 0, n_baselines)
+        antenna2 = ms.getcol("ANTENNA2", 0, n_baselines)
+        rows_per_block = max(1, chunk_rows // n_baselines) * n_baselines
+        for row0 in range(0, n_rows, rows_per_block):
+            nrow = min(rows_per_block, n_rows - row0)
+            n_times = nrow // n_baselines
+            vis = ms.getcol("DATA", row0, nrow)
+            if vis.shape[-1] == 1:  # scalar simulation: Stokes I only
+                vis = np.concatenate([vis, np.zeros_like(vis), np.zeros_like(vis), vis], axis=-1)
+            block = VisibilityBlock(
+                row0 // n_baselines,
+                times[row0:row0 + nrow:n_baselines],
+                frequencies,
+                antenna1,
+                antenna2,
+                ms.getcol("UVW", row0, nrow).reshape(n_times, n_baselines, 3),
+                vis.reshape(n_times, n_baselines, len(frequencies), -1),
+            )
+            for consumer in consumers:
+                consumer.consume(block)
+
+
+def finish_visibility_consumers(consumers: list, out_dir: Path, prefix: str = "") -> bool:
+    """Writes the products of all consumers into out_dir; returns True on success."""
+    try:
+        for consumer in consumers:
+            for path in consumer.finish(out_dir):
+                print(f"    {prefix} Wrote {consumer.name} product: {path}")
+    except (OSError, ValueError) as e:
+        print(f"    {prefix} ERROR: Writing visibility products failed: {e}")
+        return False
+    return True
+
+
+def link_shared_beam_outputs(
+    shared_dir: Path, run_dir: Path, beam_root: str, is_dry_run: bool, prefix: str = ""
+) -> bool:
+    """
+    Symlinks the beam pattern outputs ('<beam_root>*') of a shared beam
+    simulation directory into a run directory, replacing stale links/files.
+
+    Returns:
+        True if at least one output was linked (or would be, in dry-run mode).
+    """
+    if is_dry_run:
+        print(f"    {prefix} [DRY RUN] Would link beam outputs from {shared_dir}")
+        return True
+
+    outputs = sorted(Path(shared_dir).glob(f"{beam_root}*"))
+    if not outputs:
+        print(f"    {prefix} ERROR: No beam outputs '{beam_root}*' found in {shared_dir}")
+        return False
+
+    for src_path in outputs:
+        link_path = Path(run_dir) / src_path.name
+        if link_path.is_symlink() or link_path.is_file():
+            link_path.unlink()
+        elif link_path.exists():
+            shutil.rmtree(link_path)
+        link_path.symlink_to(os.path.relpath(src_path, run_dir))
+    print(f"    {prefix} Linked {len(outputs)} shared beam output(s) from {shared_dir}")
+    return True
+
+
+def build_beam_steps(run_specs, master_config: dict, project_root: Path):
+    """
+    Builds one beam simulation step per distinct beam configuration.
+
+    The beam pattern does not depend on the sky model, so runs whose resolved
+    beam INI settings (telescope, phase centre, observation, error settings)
+    are identical share a single simulation executed in
+    output_config.shared_beam_folder_pattern below the base output directory.
+    If run_settings.share_beam_sims is false every run simulates its own beam
+    in its run directory, as before.
+
+    Args:
+        run_specs: Iterable of entries produced by iter_run_specs() (consumed
+                   once, so a generator works).
+        master_config: The parsed master YAML configuration.
+        project_root: Path object to the project's root directory.
+
+    Returns:
+        A tuple (steps, beams_by_run) where steps are the beam Step objects and
+        beams_by_run maps each run_id to a dictionary with the keys "step_id",
+        "output_dir" and "root_path" of the beam step that run uses.
+    """
+    run_settings = master_config.get("run_settings", {})
+    output_cfg = master_config.get("output_config", {})
+    executables_cfg = master_config.get("executables", {})
+    is_dry_run = run_settings.get("dry_run", False)
+    echo_output = run_settings.get("stream_output_to_console", False)
+    use_cache = run_settings.get("use_step_cache", True)
+    share_beams = run_settings.get("share_beam_sims", True)
+    split_cfg = master_config.get("split_settings", {})
+    subband_pattern = split_cfg.get("subband_folder_pattern", "subband_{index:03d}")
+    concat_chunk_rows = int(split_cfg.get("concat_chunk_rows", 20000))
+    beam_exe = executables_cfg.get("oskar_sim_beam_pattern", "oskar_sim_beam_pattern")
+
+    base_output_dir = Path(
+        output_cfg.get("base_output_directory", "simulation_outputs_generated")
+    )
+    array_factor_cache_dir = base_output_dir / run_settings.get(
+        "array_factor_cache_directory", "beam_cache"
+    )
+    shared_folder_pattern = output_cfg.get(
+        "shared_beam_folder_pattern", "shared_beams/{tel_name}{error_suffix}_{pc_id}"
+    )
+    error_suffix = (
+        "_errors_on"
+        if run_settings.get("include_telescope_errors", False)
+        else "_errors_off"
+    )
+
+    beam_keys = {}  # beam directory -> cache key of its last beam sim, read by concat steps
+
+    def _make_action(beam_dir, oskar_defaults, tel_cfg, pc_cfg, prefix, observation=None):
+        beam_backend = tel_cfg.get("beam_backend", run_settings.get("beam_backend", "oskar"))
+        if beam_backend not in BEAM_BACKENDS:
+            raise ValueError(
+                f"Unknown beam_backend '{beam_backend}' (expected one of {', '.join(BEAM_BACKENDS)})"
+            )
+
+        def _beam_step():
+            print(f"  {prefix} Preparing Beam Simulation INI...")
+            beam_dir.mkdir(parents=True, exist_ok=True)
+            beam_ini_path = beam_dir / output_cfg.get("beam_ini_filename", "beam.ini")
+            beam_init_data = generate_beam_ini_data(
+                oskar_defaults,
+                tel_cfg,
+                pc_cfg,
+                run_settings,
+                output_cfg,
+                beam_dir,
+                project_root,
+            )
+            beam_init_data["observation"].update(observation or {})
+
+            def _execute():
+                write_ini_file_with_configparser(beam_init_data, beam_ini_path)
+                print(f"    {prefix} Generated beam INI: {beam_ini_path.resolve()}")
+                if beam_backend == "array-factor":
+                    return run_array_factor_beam(
+                        beam_init_data,
+                        beam_dir,
+                        array_factor_cache_dir,
+                        run_settings.get("array_factor_max_chunk_mb", 256),
+                        is_dry_run,
+                        prefix,
+                    )
+                return run_oskar_sim_beam(
+                    beam_exe, beam_ini_path, beam_dir, is_dry_run, echo_output
+                )
+
+            beam_root = beam_init_data["beam_pattern"]["root_path"]
+            success, beam_keys[beam_dir] = execute_with_step_cache(
+                beam_dir,
+                "beam",
+                lambda: {
+                    "ini": beam_init_data,
+                    "telescope_model": hash_directory_contents(
+                        project_root / tel_cfg["oskar_input_directory"]
+                    ),
+                    "executable": ARRAY_FACTOR_BEAM_VERSION
+                    if beam_backend == "array-factor"
+                    else get_executable_version(beam_exe),
+                },
+                _execute,
+                lambda: sorted(p.name for p in beam_dir.glob(f"{beam_root}*")),
+                use_cache,
+                is_dry_run,
+                prefix,
+            )
+            if success and not is_dry_run:
+                engine = "array-factor" if beam_backend == "array-factor" else "OSKAR"
+                print(f"    {prefix} Successfully finished {engine} beam sim")
+            return success
+
+        return _beam_step
+
+    def _make_concat_action(beam_dir, sub_dirs, prefix):
+        beam_root = output_cfg.get("beam_root_path_base", "beam_output_default")
+
+        def _concat_step():
+            names = sorted(p.name for p in sub_dirs[0].glob(f"{beam_root}*.fits"))
+            success, _ = execute_with_step_cache(
+                beam_dir,
+                "beam",
+                lambda: {
+                    "subbands": [
+                        beam_keys.get(d)
+                        or [path_stat_signature(d / name) for name in names]
+                        for d in sub_dirs
+                    ]
+                },
+                lambda: run_chunk_concat(
+                    sub_dirs, beam_dir, names, "frequency", concat_chunk_rows, is_dry_run, prefix
+                ),
+                lambda: names,
+                use_cache,
+                is_dry_run,
+                prefix,
+            )
+            return success
+
+        return _concat_step
+
+    steps = []
+    beams_by_run = {}
+    groups = {}  # beam content key -> beam info dict
+    folders = {}  # shared folder -> beam content key
+    for spec in run_specs:
+        tel_cfg, pc_cfg = spec["tel_cfg"], spec["pc_cfg"]
+        run_config = spec.get("config", master_config)  # with sweep overrides
+        oskar_defaults = run_config.get("oskar_ini_defaults", {})
+        if share_beams:
+            # Key on the INI content itself, resolved against a fixed directory,
+            # so any setting that changes the beam also separates the groups.
+            group_key = compute_step_cache_key(
+                "beam",
+                generate_beam_ini_data(
+                    oskar_defaults,
+                    tel_cfg,
+                    pc_cfg,
+                    run_settings,
+                    output_cfg,
+                    base_output_dir,
+                    project_root,
+                ),
+            )
+        else:
+            group_key = f"run:{spec['run_id']}"
+
+        if group_key not in groups:
+            if share_beams:
+                folder = shared_folder_pattern.format(
+                    tel_name=tel_cfg.get("name", "unknown_tel"),
+                    error_suffix=error_suffix,
+                    pc_id=pc_cfg.get("id", "unknown_pc"),
+                )
+                if folders.get(folder, group_key) != group_key:
+                    folder = f"{folder}_{group_key[:8]}"
+                folders[folder] = group_key
+                beam_dir = base_output_dir / folder
+                step_id = f"beam:{folder}"
+                prefix = f"[Beam {folder}]"
+            else:
+                beam_dir = spec["output_dir"]
+                step_id = f"{spec['run_id']}:beam"
+                prefix = f"[Run {spec['run_id']}]"
+
+            groups[group_key] = {
+                "step_id": step_id,
+                "output_dir": beam_dir,
+                "root_path": output_cfg.get("beam_root_path_base", "beam_output_default"),
+            }
+            beam_features = estimate_step_features(
+                tel_cfg, spec["sky_cfg"], run_config, project_root
+            )["beam"]
+            obs_defaults = oskar_defaults.get("observation", {})
+            subband_observations = plan_frequency_subbands(
+                obs_defaults.get("start_frequency_hz", 0.0),
+                obs_defaults.get("frequency_inc_hz", 0.0),
+                obs_defaults.get("num_channels", 1),
+                split_cfg.get("frequency_subbands", 1),
+            )
+            if len(subband_observations) == 1:
+                steps.append(
+                    Step(
+                        step_id=step_id,
+                        run_id=spec["run_id"],
+                        name="beam",
+                        action=_make_action(beam_dir, oskar_defaults, tel_cfg, pc_cfg, prefix),
+                        cost_features=beam_features,
+                        disk_bytes=beam_features["output_bytes"],
+                    )
+                )
+            else:
+                # One beam sim per sub-band, then a concatenation of the FITS
+                # cubes that takes the place of the beam step
+                sub_dirs = []
+                total_channels = sum(o["num_channels"] for o in subband_observations)
+                for index, observation in enumerate(subband_observations):
+                    sub_dir = beam_dir / subband_pattern.format(index=index)
+                    sub_dirs.append(sub_dir)
+                    fraction = observation["num_channels"] / total_channels
+                    sub_features = dict(beam_features)
+                    for feature in ("work", "output_bytes", "mem_units"):
+                        sub_features[feature] = beam_features[feature] * fraction
+                    steps.append(
+                        Step(
+                            step_id=f"{step_id}/{sub_dir.name}",
+                            run_id=spec["run_id"],
+                            name="beam",
+                            action=_make_action(
+                                sub_dir, oskar_defaults, tel_cfg, pc_cfg,
+                                f"{prefix}[{sub_dir.name}]", observation,
+                            ),
+                            cost_features=sub_features,
+                            disk_bytes=sub_features["output_bytes"],
+                        )
+                    )
+                steps.append(
+                    Step(
+                        step_id=step_id,
+                        run_id=spec["run_id"],
+                        name="concat",
+                        action=_make_concat_action(beam_dir, sub_dirs, prefix),
+                        deps=[f"{step_id}/{d.name}" for d in sub_dirs],
+                        cost_features={
+                            "work": beam_features["output_bytes"],
+                            "mem_units": 2 * beam_features["output_bytes"],
+                            "output_bytes": beam_features["output_bytes"],
+                        },
+                        disk_bytes=beam_features["output_bytes"],
+                    )
+                )
+        beams_by_run[spec["run_id"]] = groups[group_key]
+
+    return steps, beams_by_run
+
+
+def build_run_steps(
+    run_spec: dict,
+    master_config: dict,
+    project_root: Path,
+    shared_beam: dict = None,
+) -> list:
+    """
+    Builds the step graph nodes for a single run.
+
+    The INI files are generated lazily inside each step's action, so nothing is
+    written for a step that never gets scheduled. Unless
+    run_settings.use_step_cache is false, each step is keyed by a hash of its
+    fully resolved inputs and skipped if the run directory already holds a
+    completed record with the same key and existing outputs. Dependencies:
+        beam_link -> the (shared) beam step, see build_beam_steps()
+        interf    -> (none); when split_settings asks for frequency sub-bands or
+                     time chunks, "interf" is a concatenation depending on one
+                     sim per chunk (time chunks nested inside sub-bands), and
+                     with sky_settings.partitions each sim is the sum of one
+                     sim per sky model partition
+        products  -> interf (streaming consumers of a split run, fed from its final MS)
+        realise   -> interf (error realisations, if error_realisations.enabled)
+        calibrate -> interf (if the interferometer sim is part of this campaign)
+        plot      -> calibrate
+        apply     -> calibrate
+
+    Args:
+        run_spec: One entry produced by iter_run_specs().
+        master_config: The parsed master YAML configuration.
+        project_root: Path object to the project's root directory.
+        shared_beam: The beam step this run uses, as returned by build_beam_steps()
+                     (keys "step_id", "output_dir", "root_path"), or None if the
+                     beam sim is disabled. If the beam runs in a different
+                     directory, a beam_link step symlinks its outputs into this run.
+
+    Returns:
+        A list of Step objects, ordered so that dependencies come first.
+    """
+    master_config = run_spec.get("config", master_config)  # with sweep overrides
+    run_settings = master_config.get("run_settings", {})
+    output_cfg = master_config.get("output_config", {})
+    iter_params = master_config.get("iteration_parameters", {})
+    oskar_defaults = master_config.get("oskar_ini_defaults", {})
+    executables_cfg = master_config.get("executables", {})
+    hyperdrive_cfg = master_config.get("hyperdrive_settings")
+    sky_models_base_dir_str = iter_params.get("sky_models_base_dir", "sky_models")
+    is_dry_run = run_settings.get("dry_run", False)
+    echo_output = run_settings.get("stream_output_to_console", False)
+
+    run_id = run_spec["run_id"]
+    tel_cfg = run_spec["tel_cfg"]
+    sky_cfg = run_spec["sky_cfg"]
+    pc_cfg = run_spec["pc_cfg"]
+    current_run_output_dir = run_spec["output_dir"]
+    prefix = f"[Run {run_id}]"
+    hyperdrive_exe = executables_cfg.get("hyperdrive", "hyperdrive")
+
+    use_cache = run_settings.get("use_step_cache", True)
+    step_keys = {}  # step name -> cache key, read by downstream steps of this run
+    realisations_cfg = master_config.get("error_realisations", {})
+    use_realisations = realisations_enabled(master_config, pc_cfg)
+    if use_realisations and run_settings.get("run_hyperdrive"):
+        # The interferometer MS of such a run is error-free; calibrating it
+        # instead of the realisations would produce meaningless solutions.
+        raise ValueError(
+            "error_realisations is enabled, so the simulated MS carries no telescope errors: "
+            "disable run_settings.run_hyperdrive (hyperdrive cannot calibrate the realisations)"
+        )
+    split_cfg = master_config.get("split_settings", {})
+    subband_pattern = split_cfg.get("subband_folder_pattern", "subband_{index:03d}")
+    concat_chunk_rows = int(split_cfg.get("concat_chunk_rows", 20000))
+    obs_defaults = oskar_defaults.get("observation", {})
+    subband_observations = plan_frequency_subbands(
+        obs_defaults.get("start_frequency_hz", 0.0),
+        obs_defaults.get("frequency_inc_hz", 0.0),
+        obs_defaults.get("num_channels", 1),
+        split_cfg.get("frequency_subbands", 1),
+    )
+    sky_settings = master_config.get("sky_settings", {})
+    sky_prefilter = sky_settings.get("prefilter", False)
+    sky_cache_dir = Path(
+        output_cfg.get("base_output_directory", "simulation_outputs_generated")
+    ) / sky_settings.get("cache_directory", "sky_cache")
+    sky_partitions = max(1, int(sky_settings.get("partitions", 1)))
+    sky_partition_pattern = sky_settings.get("partition_folder_pattern", "skypart_{index:03d}")
+    time_chunk_pattern = split_cfg.get("time_chunk_folder_pattern", "timechunk_{index:03d}")
+    time_chunk_observations = plan_time_chunks(
+        pc_cfg.get("start_time_utc"),
+        obs_defaults.get("length"),
+        obs_defaults.get("num_time_steps", 1),
+        split_cfg.get("time_chunks", 1),
+    )
+
+    def _cached_execute(step_name, cache_inputs_fn, execute_fn, outputs_fn):
+        success, cache_key = execute_with_step_cache(
+            current_run_output_dir,
+            step_name,
+            cache_inputs_fn,
+            execute_fn,
+            outputs_fn,
+            use_cache,
+            is_dry_run,
+            prefix,
+        )
+        step_keys[step_name] = cache_key
+        return success
+
+    tel_input_dir = project_root / tel_cfg["oskar_input_directory"]
+    interf_exe = executables_cfg.get(
+        "oskar_sim_interferometer", "oskar_sim_interferometer"
+    )
+    interf_backend = tel_cfg.get("interf_backend", run_settings.get("interf_backend", "oskar"))
+    if interf_backend not in INTERF_BACKENDS:
+        raise ValueError(
+            f"Unknown interf_backend '{interf_backend}' (expected one of {', '.join(INTERF_BACKENDS)})"
+        )
+    ms_name = output_cfg.get("interf_ms_base_filename", "sim.ms")
+    sol_name = (hyperdrive_cfg or {}).get("sol_output", "hyperdrive_solutions.fits")
+    streaming_cfg = master_config.get("streaming", {})
+    consumer_specs = streaming_cfg.get("consumers") or []
+    products_dir = streaming_cfg.get("products_directory", "products")
+    product_names = [
+        str(Path(products_dir) / f"{c.name}.npz") for c in make_visibility_consumers(consumer_specs)
+    ]
+    write_ms = bool(streaming_cfg.get("write_ms", True))
+    # A split run (sub-bands, time chunks, sky partitions) only holds the
+    # whole observation in its final Measurement Set: the consumers read that
+    # back in a "products" step instead of seeing the blocks of each part.
+    split_run = len(subband_observations) > 1 or len(time_chunk_observations) > 1 or sky_partitions > 1
+    sim_consumer_specs = [] if split_run else consumer_specs
+    sim_product_names = [] if split_run else product_names
+    if not write_ms:
+        ms_users = [
+            label
+            for label, used in (
+                ("frequency sub-bands", len(subband_observations) > 1),
+                ("time chunks", len(time_chunk_observations) > 1),
+                ("sky partitions", sky_partitions > 1),
+                ("error realisations", use_realisations),
+                ("hyperdrive", run_settings.get("run_hyperdrive")),
+            )
+            if used
+        ]
+        if ms_users:
+            raise ValueError(
+                f"streaming.write_ms is false but the Measurement Set is needed for {', '.join(ms_users)}"
+            )
+
+    def _beam_link_step():
+        return link_shared_beam_outputs(
+            shared_beam["output_dir"],
+            current_run_output_dir,
+            shared_beam["root_path"],
+            is_dry_run,
+            prefix,
+        )
+
+    def _interf_engine_version():
+        if interf_backend == "dft":
+            return DFT_BACKEND_VERSION
+        if interf_backend == "oskar-python" and oskar_python_version():
+            return oskar_python_version()
+        return get_executable_version(interf_exe)
+
+    def _make_interf_step(
+        work_dir, observation=None, cache_slot="interf", step_prefix=prefix, sky_partition=None
+    ):
+        # Interferometer sim in work_dir: the run directory, or a sub-band /
+        # time chunk directory with the given [observation] settings
+        # overridden; with sky_partition, of that part of the sky model only.
+        def _interf_step():
+            print(f"  {step_prefix} Preparing Interferometer Simulation INI...")
+            work_dir.mkdir(parents=True, exist_ok=True)
+            interf_ini_data = generate_interf_ini_data(
+                oskar_defaults,
+                tel_cfg,
+                sky_cfg,
+                pc_cfg,
+                run_settings,
+                output_cfg,
+                sky_models_base_dir_str,
+                work_dir,
+                project_root,
+            )
+            interf_ini_data["observation"].update(observation or {})
+            interf_ini_path = work_dir / output_cfg.get(
+                "interf_ini_filename", "interf.ini"
+            )
+            if use_realisations:
+                # Simulate error-free visibilities; the errors are applied per
+                # realisation afterwards by the "realise" step.
+                element_cfg = interf_ini_data["telescope"]["aperture_array"]["array_pattern"]["element"]
+                for key in ("x_gain_error_time", "y_gain_error_time",
+                            "x_phase_error_time_deg", "y_phase_error_time_deg"):
+                    element_cfg[key] = "0.0"
+            sky_sec = interf_ini_data["sky"]["oskar_sky_model"]
+            try:
+                if sky_prefilter:
+                    # Hand OSKAR only the sources it would keep for this pointing
+                    filtered_sky = prefilter_sky_model(
+                        work_dir / sky_sec["file"],
+                        sky_cache_dir,
+                        interf_ini_data["observation"],
+                        sky_sec.get("filter", {}),
+                        TelescopeModel.load(tel_input_dir).position[:2]
+                        if sky_settings.get("horizon_cut", True)
+                        else None,
+                    )
+                    sky_sec["file"] = os.path.relpath(filtered_sky.resolve(), work_dir.resolve())
+                    if len(load_sky_model(filtered_sky)) == 0:
+                        print(
+                            f"    {step_prefix} Warning: No source of {sky_cfg.get('filename')} passes the "
+                            "sky filter / horizon cut for this pointing; simulating an empty sky"
+                        )
+                if sky_partition is not None:
+                    part_sky = partition_sky_model(
+                        work_dir / sky_sec["file"], sky_cache_dir, sky_partitions, sky_partition
+                    )
+                    sky_sec["file"] = os.path.relpath(part_sky.resolve(), work_dir.resolve())
+            except (OSError, ValueError) as e:
+                print(f"    {step_prefix} ERROR: Preparing the sky model failed: {e}")
+                return False
+
+            def _execute():
+                write_ini_file_with_configparser(interf_ini_data, interf_ini_path)
+                print(
+                    f"    {step_prefix} Generated Interferometer INI: {interf_ini_path.resolve()}"
+                )
+                consumers = make_visibility_consumers(sim_consumer_specs)
+
+                def run_subprocess():
+                    # oskar_sim_interferometer always writes the MS: consumers
+                    # read it back afterwards and, without write_ms, it is removed.
+                    success = run_oskar_sim_interf(
+                        interf_exe,
+                        interf_ini_path,
+                        work_dir,
+                        is_dry_run,
+                        echo_output,
+                    )
+                    if not success or not consumers or is_dry_run:
+                        return success
+                    ms_path = work_dir / interf_ini_data["interferometer"]["ms_filename"]
+                    try:
+                        feed_consumers_from_ms(
+                            ms_path,
+                            consumers,
+                            int(streaming_cfg.get("read_chunk_rows", 20000)),
+                        )
+                    except (ImportError, OSError, RuntimeError, ValueError) as e:
+                        print(f"    {step_prefix} ERROR: Streaming {ms_path} to the consumers failed: {e}")
+                        return False
+                    if not write_ms:
+                        shutil.rmtree(ms_path, ignore_errors=True)
+                    return True
+
+                if interf_backend == "dft":
+                    success = run_dft_interf(
+                        interf_ini_data,
+                        work_dir,
+                        run_settings.get("dft_max_chunk_mb", 256),
+                        is_dry_run,
+                        step_prefix,
+                        consumers,
+                        write_ms,
+                    )
+                elif interf_backend == "oskar-python":
+                    success = run_oskar_interf_in_process(
+                        interf_ini_data,
+                        work_dir,
+                        is_dry_run,
+                        run_subprocess,
+                        step_prefix,
+                        consumers,
+                        write_ms,
+                        int(run_settings.get("oskar_python_max_idle_telescopes", 2)),
+                    )
+                else:
+                    success = run_subprocess()
+                if success and consumers and not is_dry_run:
+                    success = finish_visibility_consumers(
+                        consumers, work_dir / products_dir, step_prefix
+                    )
+                return success
+
+            sky_file = work_dir / interf_ini_data["sky"]["oskar_sky_model"]["file"]
+
+            def _cache_inputs():
+                inputs = {
+                    "ini": interf_ini_data,
+                    "telescope_model": hash_directory_contents(tel_input_dir),
+                    "sky_model": hash_file_contents(sky_file),
+                    "executable": _interf_engine_version(),
+                }
+                if sim_consumer_specs or not write_ms:
+                    inputs["streaming"] = {"consumers": sim_consumer_specs, "write_ms": write_ms}
+                return inputs
+
+            success, step_keys[cache_slot] = execute_with_step_cache(
+                work_dir,
+                "interf",
+                _cache_inputs,
+                _execute,
+                lambda: ([interf_ini_data["interferometer"]["ms_filename"]] if write_ms else [])
+                + sim_product_names,
+                use_cache,
+                is_dry_run,
+                step_prefix,
+            )
+            if success and not is_dry_run:
+                engine = "DFT" if interf_backend == "dft" else "OSKAR"
+                print(f"    {step_prefix} Successfully finished {engine} sim")
+            return success
+
+        return _interf_step
+
+    def _make_concat_step(out_dir, parts, axis, cache_slot, step_prefix):
+        # Concatenates the Measurement Sets of parts [(step_keys slot, dir)]
+        # along axis ("frequency" or "time") into out_dir, or sums them ("sky").
+        def _concat_step():
+            success, step_keys[cache_slot] = execute_with_step_cache(
+                out_dir,
+                "interf",
+                lambda: {
+                    axis: [
+                        step_keys.get(slot) or path_stat_signature(part_dir / ms_name)
+                        for slot, part_dir in parts
+                    ],
+                },
+                lambda: run_chunk_concat(
+                    [part_dir for _, part_dir in parts],
+                    out_dir,
+                    [ms_name],
+                    axis,
+                    concat_chunk_rows,
+                    is_dry_run,
+                    step_prefix,
+                ),
+                lambda: [ms_name],
+                use_cache,
+                is_dry_run,
+                step_prefix,
+            )
+            return success
+
+        return _concat_step
+
+    def _realise_step():
+        realisation_count = int(realisations_cfg.get("count", 1))
+        pattern = realisations_cfg.get("ms_pattern", "realisations/sim_{index:04d}.ms")
+        gain_std = float(pc_cfg.get("gain_error_std", 0.0))
+        phase_std = float(pc_cfg.get("phase_error_std", 0.0))
+        upstream = step_keys.get("interf") or path_stat_signature(
+            current_run_output_dir / ms_name
+        )
+        return _cached_execute(
+            "realise",
+            lambda: {
+                "upstream": upstream,
+                "error_realisations": realisations_cfg,
+                "gain_error_std": gain_std,
+                "phase_error_std": phase_std,
+            },
+            lambda: run_error_realisations(
+                current_run_output_dir / ms_name,
+                current_run_output_dir,
+                realisations_cfg,
+                gain_std,
+                phase_std,
+                is_dry_run,
+                prefix,
+            ),
+            lambda: [pattern.format(index=i) for i in range(realisation_count)],
+        )
+
+    def _products_step():
+        # Streams the final (concatenated / summed) MS of a split run to the consumers
+        upstream = step_keys.get("interf") or path_stat_signature(
+            current_run_output_dir / ms_name
+        )
+
+        def _execute():
+            if is_dry_run:
+                print(f"    {prefix} [DRY RUN] Would stream {ms_name} to the visibility consumers")
+                return True
+            consumers = make_visibility_consumers(consumer_specs)
+            try:
+                feed_consumers_from_ms(
+                    current_run_output_dir / ms_name,
+                    consumers,
+                    int(streaming_cfg.get("read_chunk_rows", 20000)),
+                )
+            except (ImportError, OSError, RuntimeError, ValueError) as e:
+                print(f"    {prefix} ERROR: Streaming {ms_name} to the consumers failed: {e}")
+                return False
+            return finish_visibility_consumers(
+                consumers, current_run_output_dir / products_dir, prefix
+            )
+
+        return _cached_execute(
+            "products",
+            lambda: {"upstream": upstream, "consumers": consumer_specs},
+            _execute,
+            lambda: product_names,
+        )
+
+    def _hyperdrive_inputs(upstream_step):
+        # Prefer the upstream step's key; if that step is not part of this
+        # campaign, fall back to the on-disk state of its output.
+        upstream = step_keys.get(upstream_step)
+        if upstream is None:
+            upstream_output = ms_name if upstream_step == "interf" else sol_name
+            upstream = path_stat_signature(current_run_output_dir / upstream_output)
+        return {
+            "upstream": upstream,
+            "hyperdrive_settings": hyperdrive_cfg,
+            "ms": ms_name,
+            "executable": get_executable_version(hyperdrive_exe),
+        }
+
+    def _calibrate_step():
+        success = _cached_execute(
+            "calibrate",
+            lambda: _hyperdrive_inputs("interf"),
+            lambda: run_calibrate(
+                hyperdrive_exe,
+                hyperdrive_cfg,
+                output_cfg,
+                current_run_output_dir,
+                is_dry_run,
+                echo_output,
+            ),
+            lambda: [sol_name],
+        )
+        if success and not is_dry_run:
+            print(f"    {prefix} Successfully finished Hyperdrive di-calibrate")
+        return success
+
+    def _plot_step():
+        return _cached_execute(
+            "plot",
+            lambda: _hyperdrive_inputs("calibrate"),
+            lambda: run_plot(
+                hyperdrive_exe,
+                hyperdrive_cfg,
+                output_cfg,
+                current_run_output_dir,
+                is_dry_run,
+                echo_output,
+            ),
+            lambda: [],
+        )
+
+    def _apply_step():
+        return _cached_execute(
+            "apply",
+            lambda: _hyperdrive_inputs("calibrate"),
+            lambda: run_apply(
+                hyperdrive_exe,
+                hyperdrive_cfg,
+                output_cfg,
+                current_run_output_dir,
+                is_dry_run,
+                echo_output,
+            ),
+            lambda: [],
+        )
+
+    steps = []
+    features = estimate_step_features(tel_cfg, sky_cfg, master_config, project_root)
+
+    def _add(name, action, deps=(), cost_features=None, disk_bytes=0, key=None):
+        # key: the step's id within the run (defaults to its name)
+        step = Step(
+            step_id=f"{run_id}:{key or name}",
+            run_id=run_id,
+            name=name,
+            action=action,
+            deps=[f"{run_id}:{d}" for d in deps],
+            cost_features=cost_features or {},
+            disk_bytes=disk_bytes,
+        )
+        steps.append(step)
+
+    if shared_beam is not None and shared_beam["output_dir"] != current_run_output_dir:
+        _add("beam_link", _beam_link_step)
+        steps[-1].deps = [shared_beam["step_id"]]
+    def _interf_features(fraction, sky_fraction=1.0):
+        # fraction of the visibilities, computed from sky_fraction of the sources
+        scaled = dict(features["interf"])
+        for feature in ("ms_bytes", "output_bytes"):
+            scaled[feature] = features["interf"][feature] * fraction
+        if not write_ms:
+            scaled["output_bytes"] = 0
+        scaled["work"] = features["interf"]["work"] * fraction * sky_fraction
+        scaled["n_sources"] = int(np.ceil(features["interf"]["n_sources"] * sky_fraction))
+        return scaled
+
+    def _concat_features(fraction, n_inputs=1):
+        # n_inputs: how many full-size inputs are read (sky partitions), else
+        # the inputs together are the size of the output
+        ms_bytes = features["interf"]["ms_bytes"] * fraction
+        return {
+            "work": ms_bytes * n_inputs,
+            # One block of rows of every part plus the concatenated block
+            "mem_units": (n_inputs + 1) * concat_chunk_rows * features["interf"]["n_channels"] * 4 * MS_BYTES_PER_VIS,
+            "output_bytes": ms_bytes,
+        }
+
+    def _add_sim_steps(work_dir, observation, slot, step_prefix, fraction):
+        # Adds the interferometer sim leaving its Measurement Set in work_dir
+        # as step `slot`: one OSKAR job, or one per sky partition (run
+        # concurrently) followed by the sum of their visibilities.
+        if sky_partitions == 1:
+            _add(
+                "interf",
+                _make_interf_step(work_dir, observation, slot, step_prefix),
+                cost_features=_interf_features(fraction),
+                disk_bytes=_interf_features(fraction)["output_bytes"],
+                key=slot,
+            )
+            return
+        parts = []
+        for index in range(sky_partitions):
+            part_dir = work_dir / sky_partition_pattern.format(index=index)
+            part_slot = f"{slot}:{part_dir.name}"
+            parts.append((part_slot, part_dir))
+            _add(
+                "interf",
+                _make_interf_step(
+                    part_dir, observation, part_slot, f"{step_prefix}[{part_dir.name}]", index
+                ),
+                cost_features=_interf_features(fraction, 1.0 / sky_partitions),
+                disk_bytes=_interf_features(fraction)["output_bytes"],
+                key=part_slot,
+            )
+        _add(
+            "concat",
+            _make_concat_step(work_dir, parts, "sky", slot, step_prefix),
+            [part_slot for part_slot, _ in parts],
+            _concat_features(fraction, sky_partitions),
+            _concat_features(fraction)["output_bytes"],
+            key=slot,
+        )
+
+    def _add_interf_steps(work_dir, observation, slot, step_prefix, fraction):
+        # Adds the steps leaving the Measurement Set (a fraction of the full
+        # one) in work_dir; the last of them has the id `slot`. With time
+        # chunks that is a concatenation of one sim per chunk, so a failed
+        # chunk is re-run on its own while the others are cache hits.
+        if len(time_chunk_observations) == 1:
+            _add_sim_steps(work_dir, observation, slot, step_prefix, fraction)
+            return
+        total_steps = sum(o["num_time_steps"] for o in time_chunk_observations)
+        parts = []
+        for index, chunk_observation in enumerate(time_chunk_observations):
+            chunk_dir = work_dir / time_chunk_pattern.format(index=index)
+            chunk_slot = f"{slot}:{chunk_dir.name}"
+            parts.append((chunk_slot, chunk_dir))
+            _add_sim_steps(
+                chunk_dir,
+                dict(observation or {}, **chunk_observation),
+                chunk_slot,
+                f"{step_prefix}[{chunk_dir.name}]",
+                fraction * chunk_observation["num_time_steps"] / total_steps,
+            )
+        _add(
+            "concat",
+            _make_concat_step(work_dir, parts, "time", slot, step_prefix),
+            [chunk_slot for chunk_slot, _ in parts],
+            _concat_features(fraction),
+            _concat_features(fraction)["output_bytes"],
+            key=slot,
+        )
+
+    if run_settings.get("run_interf_sim") and len(subband_observations) > 1:
+        # One interferometer sim per sub-band, then a concatenation that takes
+        # the place of the "interf" step for everything downstream
+        total_channels = sum(o["num_channels"] for o in subband_observations)
+        parts = []
+        for index, observation in enumerate(subband_observations):
+            sub_dir = current_run_output_dir / subband_pattern.format(index=index)
+            slot = f"interf:{sub_dir.name}"
+            parts.append((slot, sub_dir))
+            _add_interf_steps(
+                sub_dir,
+                observation,
+                slot,
+                f"{prefix}[{sub_dir.name}]",
+                observation["num_channels"] / total_channels,
+            )
+        _add(
+            "concat",
+            _make_concat_step(current_run_output_dir, parts, "frequency", "interf", prefix),
+            [slot for slot, _ in parts],
+            _concat_features(1.0),
+            _concat_features(1.0)["output_bytes"],
+            key="interf",
+        )
+    elif run_settings.get("run_interf_sim"):
+        _add_interf_steps(current_run_output_dir, None, "interf", prefix, 1.0)
+    if split_run and consumer_specs and run_settings.get("run_interf_sim"):
+        # Reads the whole MS once, one block of rows at a time
+        _add(
+            "products",
+            _products_step,
+            ["interf"],
+            {
+                "work": features["interf"]["ms_bytes"],
+                "mem_units": int(streaming_cfg.get("read_chunk_rows", 20000))
+                * features["interf"]["n_channels"] * 4 * MS_BYTES_PER_VIS,
+            },
+        )
+    if use_realisations:
+        # Each realisation copies the MS and rewrites its DATA column in blocks
+        realisations_bytes = int(realisations_cfg.get("count", 1)) * features["interf"]["ms_bytes"]
+        block_bytes = (
+            int(realisations_cfg.get("chunk_rows", 50000))
+            * int(realisations_cfg.get("chunk_channels", 64))
+            * 4 * 8
+        )
+        _add(
+            "realise",
+            _realise_step,
+            ["interf"] if run_settings.get("run_interf_sim") else [],
+            {"work": realisations_bytes, "mem_units": block_bytes, "output_bytes": realisations_bytes},
+            realisations_bytes,
+        )
+    if run_settings.get("run_hyperdrive"):
+        _add(
+            "calibrate",
+            _calibrate_step,
+            ["interf"] if run_settings.get("run_interf_sim") else [],
+            features["hyperdrive"],
+        )
+        # The solutions only exist after a real calibration, so plotting and
+        # applying them is skipped in dry-run mode.
+        if not is_dry_run:
+            _add("plot", _plot_step, ["calibrate"], features["hyperdrive"])
+            # Applying the solutions writes a calibrated copy of the visibilities
+            _add(
+                "apply",
+                _apply_step,
+                ["calibrate"],
+                features["hyperdrive"],
+                features["hyperdrive"]["ms_bytes"],
+            )
+    return steps
+
+
+def _validate_step_graph(steps: list) -> None:
+    """
+    Checks that every dependency refers to a known step and that the graph is
+    acyclic. Raises ValueError otherwise.
+    """
+    by_id = {s.step_id: s for s in steps}
+    for s in steps:
+        for d in s.deps:
+            if d not in by_id:
+                raise ValueError(f"Step '{s.step_id}' depends on unknown step '{d}'")
+
+    # Kahn's algorithm: if not every node can be ordered there is a cycle
+    indegree = {s.step_id: len(s.deps) for s in steps}
+    dependants = {s.step_id: [] for s in steps}
+    for s in steps:
+        for d in s.deps:
+            dependants[d].append(s.step_id)
+    queue = [sid for sid, n in indegree.items() if n == 0]
+    ordered = 0
+    while queue:
+        sid = queue.pop()
+        ordered += 1
+        for child in dependants[sid]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                queue.append(child)
+    if ordered != len(steps):
+        raise ValueError("Step dependency graph contains a cycle")
+
+
+class DiskSpaceGate:
+    """
+    Admission control that holds back steps whose expected output would push
+    the free space of the output volume below a reserve.
+
+    A step is admitted if
+        free space - bytes reserved by running steps - step.disk_bytes >= reserve
+    Its reservation is released when it finishes (its output then shows up in
+    the real free space instead). Held steps are retried by the scheduler; when
+    no step is running (so no reservation can be freed), held steps are failed
+    once hold_timeout_sec has passed without space being freed externally.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        reserve_bytes: float,
+        poll_interval_sec: float = 60.0,
+        hold_timeout_sec: float = 0.0,
+    ):
+        self.path = Path(path)
+        self.reserve_bytes = reserve_bytes
+        self.poll_interval_sec = poll_interval_sec
+        self.hold_timeout_sec = hold_timeout_sec
+        self._reserved = {}
+        self._held_reported = set()
+
+    def try_admit(self, step: Step) -> bool:
+        if step.disk_bytes <= 0:
+            return True
+        free = shutil.disk_usage(self.path).free
+        available = free - sum(self._reserved.values()) - self.reserve_bytes
+        if step.disk_bytes > available:
+            if step.step_id not in self._held_reported:
+                self._held_reported.add(step.step_id)
+                print(
+                    f"    Holding step {step.step_id}: needs ~{_format_bytes(step.disk_bytes)}, "
+                    f"{_format_bytes(free)} free under {self.path} with "
+                    f"{_format_bytes(sum(self._reserved.values()))} reserved by running steps "
+                    f"and a {_format_bytes(self.reserve_bytes)} reserve"
+                )
+            return False
+        if step.step_id in self._held_reported:
+            self._held_reported.discard(step.step_id)
+            print(f"    Resuming held step {step.step_id}: enough disk space is available")
+        self._reserved[step.step_id] = step.disk_bytes
+        return True
+
+    def release(self, step: Step) -> None:
+        self._reserved.pop(step.step_id, None)
+
+    def reject(self, step: Step) -> None:
+        """Gives up on a held step that can never be admitted."""
+        self._held_reported.discard(step.step_id)
+        print(
+            f"    ERROR: Step {step.step_id} needs ~{_format_bytes(step.disk_bytes)} but only "
+            f"{_format_bytes(shutil.disk_usage(self.path).free)} is free under {self.path} "
+            f"(reserve {_format_bytes(self.reserve_bytes)}) and no running step can free any; failing it"
+        )
+
+
+def run_step_graph(
+    steps: list,
+    max_workers: int = 1,
+    on_step_start: Optional[Callable[[Step], None]] = None,
+    on_step_finish: Optional[Callable[[Step], None]] = None,
+    admission=None,
+) -> list:
+    """
+    Executes a step dependency graph with up to max_workers steps in flight.
+
+    A step becomes ready as soon as all its dependencies have succeeded; ready
+    steps are started in (run_id, insertion) order, so the beam sim of run N
+    overlaps with its interferometer sim and with the calibration of run N-1
+    instead of waiting for run N-1 to finish completely. Steps whose
+    dependencies failed (or were skipped) are marked as skipped.
+
+    Args:
+        steps: List of Step objects (see build_run_steps()).
+        max_workers: Maximum number of concurrently executing steps.
+        on_step_start: Optional callback invoked (in the scheduling thread)
+                       right before a step is started.
+        on_step_finish: Optional callback invoked (in the scheduling thread)
+                        once a step has succeeded, failed or been skipped.
+        admission: Optional admission controller (e.g. DiskSpaceGate) with
+                   try_admit(step) -> bool, release(step) and reject(step)
+                   methods, and poll_interval_sec and hold_timeout_sec
+                   attributes. Ready steps it does not admit are held back
+                   (other steps may overtake them) and retried every
+                   poll_interval_sec or whenever a step finishes. If no step
+                   is running, held steps are failed (via reject()) once they
+                   have waited hold_timeout_sec, so that their dependants are
+                   skipped instead of the campaign waiting forever.
+
+    Returns:
+        The same list of steps with their final status set.
+    """
+    _validate_step_graph(steps)
+    by_id = {s.step_id: s for s in steps}
+    # Steps that are already final (e.g. restored from the campaign journal)
+    # are not scheduled but still satisfy/propagate to their dependants.
+    pending = sorted(
+        (s for s in steps if s.status == "pending"), key=lambda s: s.run_id
+    )  # stable: keeps step order per run
+    running = {}
+    idle_hold_since = None
+
+    def _run(step):
+        _step_context.step = step
+        try:
+            return bool(step.action())
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"    ERROR: Step {step.step_id} raised an unexpected error: {e}")
+            return False
+        finally:
+            step.end_time = datetime.datetime.now()
+            _step_context.step = None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while pending or running:
+            # Propagate failures to every (transitive) dependant first
+            changed = True
+            while changed:
+                changed = False
+                for step in list(pending):
+                    if any(by_id[d].status in ("failed", "skipped") for d in step.deps):
+                        step.status = "skipped"
+                        pending.remove(step)
+                        changed = True
+                        print(f"    Skipping step {step.step_id}: a dependency did not succeed")
+                        if on_step_finish is not None:
+                            on_step_finish(step)
+
+            held = []
+            for step in list(pending):
+                if len(running) >= max_workers:
+                    break
+                if all(by_id[d].status == "succeeded" for d in step.deps):
+                    if admission is not None and not admission.try_admit(step):
+                        held.append(step)
+                        continue
+                    pending.remove(step)
+                    step.status = "running"
+                    step.start_time = datetime.datetime.now()
+                    if on_step_start is not None:
+                        on_step_start(step)
+                    running[pool.submit(_run, step)] = step
+
+            poll_timeout = admission.poll_interval_sec if held else None
+            if not running:
+                if held:
+                    # Nothing in flight can free a reservation: only resources
+                    # freed outside this campaign can help, so wait for at most
+                    # hold_timeout_sec before failing the held steps.
+                    now = time.monotonic()
+                    if idle_hold_since is None:
+                        idle_hold_since = now
+                    waited = now - idle_hold_since
+                    hold_timeout = float(getattr(admission, "hold_timeout_sec", 0.0) or 0.0)
+                    if waited >= hold_timeout:
+                        for step in held:
+                            admission.reject(step)
+                            pending.remove(step)
+                            step.status = "failed"
+                            step.end_time = datetime.datetime.now()
+                            if on_step_finish is not None:
+                                on_step_finish(step)
+                        idle_hold_since = None
+                    else:
+                        time.sleep(min(poll_timeout, hold_timeout - waited))
+                    continue
+                # Nothing in flight and nothing could be started: only possible
+                # when everything left is blocked, which validation rules out.
+                break
+
+            idle_hold_since = None
+            done, _ = concurrent.futures.wait(
+                running,
+                timeout=poll_timeout,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                step = running.pop(future)
+                step.status = "succeeded" if future.result() else "failed"
+                if admission is not None:
+                    admission.release(step)
+                if on_step_finish is not None:
+                    on_step_finish(step)
+
+    return steps
+
+
+def collect_run_results(run_specs: list, steps: list) -> list:
+    """
+    Folds the final step statuses back into one result dictionary per run.
+
+    Returns:
+        A list of dictionaries with the run id, label, output directory, overall
+        success flag and the list of steps that failed or were skipped.
+    """
+    results = {
+        spec["run_id"]: {
+            "run_id": spec["run_id"],
+            "label": spec["label"],
+            "output_dir": spec["output_dir"],
+            "success": True,
+            "failed_steps": [],
+        }
+        for spec in run_specs
+    }
+    for step in steps:
+        if step.status == "succeeded":
+            continue
+        result = results[step.run_id]
+        result["success"] = False
+        # Run-local step id, e.g. "interf:subband_001:timechunk_002" for split runs
+        run_prefix = f"{step.run_id}:"
+        label = step.step_id[len(run_prefix):] if step.step_id.startswith(run_prefix) else step.name
+        result["failed_steps"].append(
+            label if step.status == "failed" else f"{label} ({step.status})"
+        )
+    return [results[k] for k in sorted(results)]
+
+
+def _format_duration(seconds: float) -> str:
+    return str(datetime.timedelta(seconds=int(max(0, seconds))))
+
+
+class CampaignProgressReporter:
+    """
+    Periodically prints the progress of running steps and a campaign ETA.
+
+    Progress comes from the OSKAR progress lines parsed while the steps'
+    output is streamed (see parse_progress_line()). The ETA uses the observed
+    throughput: the mean wall time of completed (non-cached) steps of each
+    kind predicts the remaining pending steps, the progress rate of running
+    steps predicts their remainder, and the total is spread over the number
+    of parallel jobs. Running steps that produced no output for stall_after_sec
+    are reported as stalled.
+    """
+
+    def __init__(
+        self,
+        steps: list,
+        jobs: int,
+        interval_sec: float = 60.0,
+        stall_after_sec: float = 900.0,
+    ):
+        self.steps = steps
+        self.jobs = max(1, jobs)
+        self.interval_sec = interval_sec
+        self.stall_after_sec = stall_after_sec
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _mean_durations(self) -> dict:
+        durations = collections.defaultdict(list)
+        for s in self.steps:
+            if s.status == "succeeded" and not s.cached and s.start_time and s.end_time:
+                durations[s.name].append((s.end_time - s.start_time).total_seconds())
+        return {name: sum(d) / len(d) for name, d in durations.items()}
+
+    def estimate_remaining_seconds(self, now: datetime.datetime) -> Optional[float]:
+        """
+        Returns the estimated wall time until the campaign finishes, or None if
+        there is not enough history yet to estimate some remaining step.
+        """
+        means = self._mean_durations()
+        remaining = 0.0
+        for s in self.steps:
+            if s.status == "running":
+                elapsed = (now - s.start_time).total_seconds() if s.start_time else 0.0
+                if s.progress:
+                    remaining += elapsed * (1.0 - s.progress) / s.progress
+                elif s.name in means:
+                    remaining += max(0.0, means[s.name] - elapsed)
+                else:
+                    return None
+            elif s.status == "pending":
+                if s.name not in means:
+                    return None
+                remaining += means[s.name]
+        return remaining / self.jobs
+
+    def format_report(self) -> str:
+        now = datetime.datetime.now()
+        counts = collections.Counter(s.status for s in self.steps)
+        finished = counts["succeeded"] + counts["failed"] + counts["skipped"]
+        eta = self.estimate_remaining_seconds(now)
+        eta_text = (
+            f"ETA {_format_duration(eta)} (~{(now + datetime.timedelta(seconds=eta)).strftime('%Y-%m-%d %H:%M')})"
+            if eta is not None
+            else "ETA unknown (no completed steps of every kind yet)"
+        )
+        lines = [
+            f"=== Progress at {now.strftime('%H:%M:%S')}: {finished}/{len(self.steps)} steps done, "
+            f"{counts['running']} running, {counts['failed']} failed; {eta_text} ==="
+        ]
+        for s in self.steps:
+            if s.status != "running" or s.start_time is None:
+                continue
+            elapsed = (now - s.start_time).total_seconds()
+            last_activity = s.last_output_time or s.start_time
+            silent_for = (now - last_activity).total_seconds()
+            progress_text = f"{s.progress * 100:5.1f}%" if s.progress is not None else "  ?  "
+            line = f"  [{s.step_id}] {progress_text} elapsed {_format_duration(elapsed)}"
+            if s.progress:
+                line += f", ETA {_format_duration(elapsed * (1.0 - s.progress) / s.progress)}"
+            if silent_for >= self.stall_after_sec:
+                line += f"  STALLED? no output for {_format_duration(silent_for)}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval_sec):
+            print("\n" + self.format_report() + "\n")
+
+    def start(self) -> None:
+        if self.interval_sec and self.interval_sec > 0:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class CampaignJournal:
+    """
+    SQLite journal recording the state of every run and step of a campaign.
+
+    Every status change is written in its own transaction, so after a crash the
+    journal reflects exactly which steps completed. With --resume, steps
+    recorded as succeeded are not executed again.
+
+    Tables:
+        campaign: single row with the hash of the master config.
+        runs:     run_id, label, output_dir, status, updated.
+        steps:    step_id, run_id, name, status, start_time, end_time,
+                  exit_code, outputs (JSON list of paths).
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS campaign ("
+                "id INTEGER PRIMARY KEY CHECK (id = 1), config_hash TEXT, "
+                "created TEXT, updated TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id INTEGER PRIMARY KEY, label TEXT, output_dir TEXT, "
+                "status TEXT, updated TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS steps ("
+                "step_id TEXT PRIMARY KEY, run_id INTEGER, name TEXT, status TEXT, "
+                "start_time TEXT, end_time TEXT, exit_code INTEGER, outputs TEXT)"
+            )
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.datetime.now().isoformat(timespec="seconds")
+
+    def start_campaign(self, config_hash: str, resume: bool) -> bool:
+        """
+        Starts (or resumes) the campaign recorded in this journal.
+
+        A fresh start clears any previous state. Resuming requires the journal
+        to belong to the same master config; returns False if it does not.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT config_hash FROM campaign WHERE id = 1"
+            ).fetchone()
+            if resume and row is not None:
+                if row[0] != config_hash:
+                    return False
+                self._conn.execute(
+                    "UPDATE campaign SET updated = ? WHERE id = 1", (self._now(),)
+                )
+                return True
+
+            self._conn.execute("DELETE FROM steps")
+            self._conn.execute("DELETE FROM runs")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO campaign (id, config_hash, created, updated) "
+                "VALUES (1, ?, ?, ?)",
+                (config_hash, self._now(), self._now()),
+            )
+            return True
+
+    def register(self, run_specs: list, steps: list) -> None:
+        """Inserts all runs and steps not yet known to the journal as pending."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO runs (run_id, label, output_dir, status, updated) "
+                "VALUES (?, ?, ?, 'pending', ?)",
+                [
+                    (s["run_id"], s["label"], str(s["output_dir"]), self._now())
+                    for s in run_specs
+                ],
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO steps (step_id, run_id, name, status) "
+                "VALUES (?, ?, ?, 'pending')",
+                [(s.step_id, s.run_id, s.name) for s in steps],
+            )
+
+    def completed_step_ids(self) -> set:
+        """Returns the ids of all steps recorded as succeeded."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT step_id FROM steps WHERE status = 'succeeded'"
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def record_step(self, step: Step) -> None:
+        """Writes the current state of a step and refreshes its run's status."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE steps SET status = ?, start_time = ?, end_time = ?, "
+                "exit_code = ?, outputs = ? WHERE step_id = ?",
+                (
+                    step.status,
+                    step.start_time.isoformat(timespec="seconds")
+                    if step.start_time
+                    else None,
+                    step.end_time.isoformat(timespec="seconds")
+                    if step.end_time
+                    else None,
+                    step.exit_code,
+                    json.dumps(step.outputs),
+                    step.step_id,
+                ),
+            )
+            statuses = [
+                r[0]
+                for r in self._conn.execute(
+                    "SELECT status FROM steps WHERE run_id = ?", (step.run_id,)
+                )
+            ]
+            if any(s in ("failed", "skipped") for s in statuses):
+                run_status = "failed"
+            elif all(s == "succeeded" for s in statuses):
+                run_status = "succeeded"
+            else:
+                run_status = "running"
+            self._conn.execute(
+                "UPDATE runs SET status = ?, updated = ? WHERE run_id = ?",
+                (run_status, self._now(), step.run_id),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def print_cost_plan(run_specs: list, steps: list, cost_model: CostModel, jobs: int) -> None:
+    """
+    Prints the predicted wall time, peak memory and Measurement Set size of
+    every planned run, and campaign totals for the given number of jobs.
+    """
+    print("\n=== Cost Plan ===")
+    if cost_model.calibrated:
+        print(f"  Calibrated from history for: {', '.join(sorted(cost_model.calibrated))}")
+    else:
+        print("  No usable history found; using default coefficients (uncalibrated)")
+
+    steps_by_run = collections.defaultdict(list)
+    for step in steps:
+        steps_by_run[step.run_id].append(step)
+
+    total_wall = 0.0
+    max_rss = 0.0
+    total_ms_bytes = 0
+    for spec in run_specs:
+        run_steps = [s for s in steps_by_run.get(spec["run_id"], []) if s.cost_features]
+        f = next((s.cost_features for s in run_steps if "n_stations" in s.cost_features), None)
+        if f is None:
+            continue
+        print(
+            f"  Run {spec['run_id']} ({spec['label']}): {f['n_stations']} stations, "
+            f"{f['n_baselines']} baselines, {f['n_channels']} ch x {f['n_times']} time step(s)"
+        )
+        for step in run_steps:
+            prediction = cost_model.predict(step.name, step.cost_features)
+            total_wall += prediction["wall_sec"]
+            max_rss = max(max_rss, prediction["peak_rss_bytes"])
+            line = (
+                f"      {step.name:<10} ~{_format_duration(prediction['wall_sec'])} wall, "
+                f"~{_format_bytes(prediction['peak_rss_bytes'])} peak RSS"
+            )
+            if step.name == "interf":
+                total_ms_bytes += step.cost_features["ms_bytes"]
+                line += (
+                    f", {step.cost_features['n_sources']} sources, "
+                    f"MS ~{_format_bytes(step.cost_features['ms_bytes'])}"
+                )
+            if step.name == "realise":
+                total_ms_bytes += step.cost_features["output_bytes"]
+                line += f", realisations ~{_format_bytes(step.cost_features['output_bytes'])}"
+            if not prediction["calibrated"]:
+                line += " (uncalibrated)"
+            print(line)
+
+    print(
+        f"  Total: ~{_format_duration(total_wall)} serial wall time, "
+        f"~{_format_duration(total_wall / max(1, jobs))} with {jobs} job(s); "
+        f"largest step ~{_format_bytes(max_rss)} peak RSS; "
+        f"~{_format_bytes(total_ms_bytes)} of Measurement Sets"
+    )
+
+
+def print_run_summary(results: list) -> None:
+    """Prints a final summary of successful and failed runs."""
+    succeeded = [r for r in results if r["success"]]
+    failed = [r for r in results if not r["success"]]
+
+    print("\n=== Run Summary ===")
+    print(f"  Succeeded: {len(succeeded)}/{len(results)}")
+    print(f"  Failed:    {len(failed)}/{len(results)}")
+    for r in failed:
+        # Only steps running a child process (OSKAR, hyperdrive) write run.log;
+        # in-process steps (DFT / array-factor backends, sky preparation)
+        # report their errors on the console only.
+        log_path = r["output_dir"] / "run.log"
+        hint = f"see {log_path}" if log_path.is_file() else "see the errors printed above"
+        print(
+            f"    - Run {r['run_id']} ({r['label']}): failed step(s) "
+            f"{', '.join(r['failed_steps'])} -> {hint}"
+        )
+
+
+def main(
+    config_file_path,
+    jobs: int = 1,
+    use_cache: bool = True,
+    resume: bool = False,
+    preflight_only: bool = False,
+):
+    """
+    Reads the master YAML config, iterates through combinations,
+    and generates OSKAR INI files in their respective directories.
+
+    Args:
+        config_file_path: Path to the master YAML configuration file.
+        jobs: Maximum number of steps (beam sim, interferometer sim, hyperdrive,
+              ...) executing concurrently across all runs. Steps are scheduled
+              from a dependency graph; the heavy lifting happens in the child
+              processes, so a thread pool is sufficient.
+        use_cache: If False, ignore existing step cache records and re-execute
+                   every step (overrides run_settings.use_step_cache).
+        resume: If True, continue the campaign recorded in the campaign journal,
+                skipping every step it records as succeeded.
+        preflight_only: If True, only run the pre-flight uv coverage stage
+                        (see run_uv_preflight()) and return.
+    """
+    try:
+        with open(config_file_path, "r") as f:
+            master_config = yaml.safe_load(f)
+    except FileNotFoundError:
+        print(f"ERROR: Configuration file not found at {config_file_path}")
+        return
+    except yaml.YAMLError as e:
+        print(f"ERROR: Could not parse YAML configuration file: {e}")
+        return
+
+    # Fingerprint the config before any command-line overrides are applied
+    config_hash = compute_step_cache_key("campaign", master_config)
+    if not use_cache:
+        master_config.setdefault("run_settings", {})["use_step_cache"] = False
+
+    project_root = Path(".").resolve()
+    try:
+        resolve_telescope_configs(master_config, project_root)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: Could not prepare telescope models: {e}")
+        return
+    if master_config.get("run_settings", {}).get("validate_telescope_models", True):
+        if not validate_telescope_configs(master_config, project_root):
+            print(
+                "ERROR: Telescope model validation failed, no simulation was started. Fix the models above "
+                "(or set run_settings.validate_telescope_models: false to skip this check)."
+            )
+            return
+
+    output_cfg = master_config.get("output_config", {})
+    base_output_dir = Path(
+        output_cfg.get("base_output_directory", "simulation_outputs_generated")
+    )
+
+    # iter_run_specs() is deterministic, so each pass below re-generates the
+    # run specs lazily instead of sharing one materialised list. Memory still
+    # grows linearly with the number of runs: seen_dirs and run_specs hold a
+    # small entry per run, and the steps of build_run_steps() keep each run's
+    # telescope / sky / phase centre configs and its overridden config alive
+    # (apply_config_overrides() copies only the overridden sections; the rest
+    # is shared with master_config).
+    #
+    # Two runs sharing an output directory would also share a run.log and
+    # overwrite each other's INI/MS files, so refuse to start in that case.
+    seen_dirs = {}
+    try:
+        for spec in iter_run_specs(master_config):
+            out_dir = spec["output_dir"]
+            if out_dir in seen_dirs:
+                print(
+                    f"ERROR: Runs {seen_dirs[out_dir]} and {spec['run_id']} both map to output directory {out_dir}. "
+                    "Adjust output_config.images_folder_pattern so every run is unique."
+                )
+                return
+            seen_dirs[out_dir] = spec["run_id"]
+    except ValueError as e:
+        print(f"ERROR: Invalid sweep configuration: {e}")
+        return
+    num_runs = len(seen_dirs)
+    if not num_runs:
+        print(
+            "Warning: One or more iteration parameter lists (telescopes, skies, phase_centres) are empty. No INI files will be generated."
+        )
+        return
+
+    if preflight_only or master_config.get("preflight", {}).get("uv_coverage", False):
+        run_uv_preflight(iter_run_specs(master_config), master_config, project_root)
+        if preflight_only:
+            return
+
+    jobs = max(1, int(jobs))
+    print(f"Executing {num_runs} runs with up to {jobs} concurrent step(s)")
+
+    steps = []
+    beams_by_run = {}
+    if master_config.get("run_settings", {}).get("run_beam_sim"):
+        beam_steps, beams_by_run = build_beam_steps(
+            iter_run_specs(master_config), master_config, project_root
+        )
+        steps.extend(beam_steps)
+        print(
+            f"Beam simulations: {len({b['step_id'] for b in beams_by_run.values()})} distinct beam "
+            f"configuration(s) for {num_runs} runs"
+        )
+
+    run_specs = []  # {"run_id", "label", "output_dir"} of every run
+    for spec in iter_run_specs(master_config):
+        run_specs.append({key: spec[key] for key in ("run_id", "label", "output_dir")})
+        print(f"\n--- Preparing Config for Run {spec['run_id']} ---")
+        print(f"  {spec['label']}")
+        try:
+            spec["output_dir"].mkdir(parents=True, exist_ok=True)
+            run_steps = build_run_steps(
+                spec, master_config, project_root, beams_by_run.get(spec["run_id"])
+            )
+        except (OSError, ValueError) as e:
+            print(f"  ERROR: Could not set up run: {e}")
+            steps.append(
+                Step(
+                    step_id=f"{spec['run_id']}:setup",
+                    run_id=spec["run_id"],
+                    name="setup",
+                    action=lambda: False,
+                    status="failed",
+                )
+            )
+            continue
+        print(f"  Output Directory: {spec['output_dir'].resolve()}")
+        steps.extend(run_steps)
+
+    journal = None
+    if master_config.get("run_settings", {}).get("dry_run", False):
+        print_cost_plan(
+            run_specs, steps, CostModel.from_history(base_output_dir), jobs
+        )
+        if resume:
+            print("Note: --resume has no effect in dry-run mode.")
+    else:
+        journal = CampaignJournal(
+            base_output_dir
+            / output_cfg.get("campaign_db_filename", "campaign_journal.sqlite")
+        )
+        if not journal.start_campaign(config_hash, resume):
+            print(
+                f"ERROR: Campaign journal {journal.db_path} belongs to a different configuration; "
+                "refusing to resume. Run without --resume to start a new campaign."
+            )
+            journal.close()
+            return
+        journal.register(run_specs, steps)
+        if resume:
+            completed = journal.completed_step_ids()
+            restored = 0
+            for step in steps:
+                if step.status == "pending" and step.step_id in completed:
+                    step.status = "succeeded"
+                    restored += 1
+            print(f"Resuming campaign: {restored}/{len(steps)} step(s) already completed")
+
+    run_settings = master_config.get("run_settings", {})
+    disk_gate = None
+    reserve_gb = output_cfg.get("disk_reserve_gb", 0)
+    if reserve_gb and not run_settings.get("dry_run", False):
+        disk_gate = DiskSpaceGate(
+            base_output_dir,
+            float(reserve_gb) * 1024**3,
+            poll_interval_sec=output_cfg.get("disk_poll_interval_sec", 60),
+            hold_timeout_sec=output_cfg.get("disk_hold_timeout_sec", 600),
+        )
+    reporter = CampaignProgressReporter(
+        steps,
+        jobs,
+        interval_sec=0
+        if run_settings.get("dry_run", False)
+        else run_settings.get("progress_report_interval_sec", 60),
+        stall_after_sec=run_settings.get("stall_warning_sec", 900),
+    )
+    reporter.start()
+    try:
+        run_step_graph(
+            steps,
+            max_workers=jobs,
+            on_step_start=journal.record_step if journal else None,
+            on_step_finish=journal.record_step if journal else None,
+            admission=disk_gate,
+        )
+    finally:
+        reporter.stop()
+        if journal is not None:
+            # Steps that never got to run (e.g. setup failures) are final too
+            for step in steps:
+                if step.status == "failed" and step.start_time is None:
+                    journal.record_step(step)
+            journal.close()
+    results = collect_run_results(run_specs, steps)
+
+    print(
+        f"\nGenerated configuration for {num_runs} runs in base directory: {base_output_dir.resolve()}"
+    )
+    print_run_summary(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate and run OSKAR/hyperdrive simulations from a master YAML config."
+    )
+    parser.add_argument(
+        "config",
+        nargs="?",
+        default="config.yaml",
+        help="Path to the master YAML configuration file (default: config.yaml)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Maximum number of simulation steps to execute concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Re-execute every step even if its inputs are unchanged since the last successful run",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the campaign recorded in the campaign journal, skipping completed steps",
+    )
+    parser.add_argument(
+        "--preflight",
+        action="store_true",
+        help="Only compute the uv coverage and recommended imaging/averaging parameters of every "
+        "telescope x phase centre (the preflight stage) and exit",
+    )
+    parser.add_argument(
+        "--compare-ms",
+        nargs=2,
+        metavar=("REFERENCE_MS", "TEST_MS"),
+        help="Compare the DATA columns of two Measurement Sets (e.g. OSKAR vs the DFT backend) and exit",
+    )
+    parser.add_argument(
+        "--rtol",
+        type=float,
+        default=1e-3,
+        help="--compare-ms tolerance on the largest difference, relative to the peak reference amplitude (default: 1e-3)",
+    )
+    parser.add_argument(
+        "--station-beam",
+        nargs=5,
+        metavar=("TELESCOPE_DIR", "RA_DEG", "DEC_DEG", "UTC", "FREQ_HZ"),
+        help="Print the array-factor Stokes I amplitude of a station beam pointed at (RA, DEC) at UTC and "
+        "FREQ_HZ towards the sources of --beam-sources (default: the pointing itself) and exit",
+    )
+    parser.add_argument(
+        "--beam-sources",
+        metavar="SKY_MODEL",
+        help="--station-beam: OSKAR sky model whose source positions to evaluate the beam at",
+    )
+    parser.add_argument(
+        "--station",
+        type=int,
+        default=0,
+        help="--station-beam: station index in the telescope model (default: 0)",
+    )
+    args = parser.parse_args()
+
+    if args.compare_ms:
+        report = compare_ms_visibilities(*args.compare_ms)
+        relative = report["max_abs_diff"] / (report["max_abs_ref"] or 1.0)
+        print(
+            f"{report['rows']} rows: max |dV| = {report['max_abs_diff']:.4g} "
+            f"({relative:.3g} of peak {report['max_abs_ref']:.4g}), rms |dV| = {report['rms_diff']:.4g}, "
+            f"max |dUVW| = {report['max_uvw_diff_m']:.3g} m"
+        )
+        sys.exit(0 if relative <= args.rtol else 1)
+
+    if args.station_beam:
+        tel_dir, ra0, dec0, utc, freq = args.station_beam
+        model = TelescopeModel.load(Path(tel_dir))
+        if not 0 <= args.station < model.n_stations:
+            parser.error(f"--station {args.station} out of range for {model.n_stations} stations")
+        if args.beam_sources:
+            sources = load_sky_model(Path(args.beam_sources))
+            ra, dec = sources["ra_deg"], sources["dec_deg"]
+        else:
+            ra, dec = np.array([float(ra0)]), np.array([float(dec0)])
+        beam = evaluate_station_beam(
+            model,
+            args.station,
+            ra,
+            dec,
+            float(ra0),
+            float(dec0),
+            [local_sidereal_time_deg(utc, float(model.position[0]))],
+            [float(freq)],
+        )[0, 0]
+        for ra_deg, dec_deg, amplitude in zip(ra, dec, beam):
+            print(f"{ra_deg:.6f} {dec_deg:.6f} {amplitude:.6g}")
+        sys.exit(0)
+
+    config_file_to_use = args.config
+
+    if Path(config_file_to_use).exists():
+        main(
+            config_file_to_use,
+            jobs=args.jobs,
+            use_cache=not args.no_cache,
+            resume=args.resume,
+            preflight_only=args.preflight,
+        )
     else:
         print(f"Please ensure '{config_file_to_use}' exists before running the script.")
@@ -0,0 +1,31 @@
+import numpy as np
+
+import main
+
+
+def test_write_sky_model_without_sources(tmp_path):
+    sources = np.empty(0, dtype=[(name, np.float64) for name in main.SKY_MODEL_COLUMNS[:3]])
+    out_path = tmp_path / "empty.osm"
+    main.write_sky_model(sources, out_path, header="0 of 1 sources")
+    assert out_path.read_text() == "# 0 of 1 sources\n"
+    assert len(main.load_sky_model(out_path)) == 0
+
+
+def test_prefilter_sky_model_keeps_no_sources(tmp_path):
+    # A single northern source never rises above the horizon of a site at -27 deg
+    sky_file = tmp_path / "north.osm"
+    sky_file.write_text("180.0 80.0 1.0\n")
+    filtered = main.prefilter_sky_model(
+        sky_file,
+        tmp_path / "cache",
+        {
+            "phase_centre_ra_deg": 0.0,
+            "phase_centre_dec_deg": -27.0,
+            "start_time_utc": "2025-01-01 00:00:00.000",
+            "length": "00:10:00.000",
+        },
+        {"radius_outer_deg": "90.0"},
+        (116.7, -26.8),
+    )
+    assert filtered.is_file()
+    assert len(main.load_sky_model(filtered)) == 0